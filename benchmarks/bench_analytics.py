@@ -0,0 +1,156 @@
+"""SLA and agent report generation over years of history: ORM row by row vs core.analytics.
+
+Seeds --weeks of history with --tickets tickets and about --responses
+responses spread over them and --agents agents, then times:
+
+  orm     first response and time to close per ticket by walking ORM objects
+          and their responses, over the newest --orm-weeks only (extrapolated
+          to the full span in orm_full_s_estimate)
+  cold    core.analytics SLA (by priority and by agent) and agent reports over
+          every week with an empty window cache
+  warm    the same reports again, with the settled weeks cached
+  after_new_tickets
+          the reports after --new-tickets new tickets, which land in the open newest window
+
+    python benchmarks/bench_analytics.py --tickets 300000 --responses 1000000 --weeks 156
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(engine, args, rng):
+    from sqlalchemy import insert
+    import models
+    from core import analytics
+    now = datetime.now()
+    first = analytics.week_start(now) - analytics.WEEK * (args.weeks - 1)
+    span = (now - first).total_seconds()
+    agents = list(range(2, args.agents + 2))
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": 1, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+            *({"id": i, "name": f"Agent {i}", "email": f"agent{i}@example.com", "password_hash": "x", "role": models.UserRole.support_agent} for i in agents),
+        ])
+    per_ticket = args.responses / args.tickets
+    response_id = 1
+    for start in range(1, args.tickets + 1, 10000):
+        tickets, responses = [], []
+        for i in range(start, min(start + 10000, args.tickets + 1)):
+            created = first + timedelta(seconds=span * (i - 1) / args.tickets)
+            closed = created + timedelta(hours=rng.lognormvariate(3, 1.2)) if rng.random() < 0.9 else None
+            if closed and closed > now:
+                closed = None
+            agent = rng.choice(agents)
+            tickets.append({"id": i, "user_id": 1, "subject": "Ticket", "description": "Seeded", "priority": rng.choice(["low", "medium", "high"]),
+                            "status": models.TicketStatus.closed if closed else models.TicketStatus.open, "created_at": created,
+                            "queue_due_at": created, "closed_at": closed, "assignee_id": agent})
+            sent = created
+            for _ in range(int(per_ticket) + (rng.random() < per_ticket % 1)):
+                sent += timedelta(hours=rng.lognormvariate(1, 1.5))
+                if sent > now:
+                    break
+                responses.append({"id": response_id, "ticket_id": i, "responder_id": rng.choice([agent, agent, 1, rng.choice(agents)]),
+                                  "message": "Reply", "timestamp": sent})
+                response_id += 1
+        with engine.begin() as conn:
+            conn.execute(insert(models.Ticket.__table__), tickets)
+            if responses:
+                conn.execute(insert(models.TicketResponse.__table__), responses)
+    return response_id - 1
+
+def orm_reports(db, since):
+    # The straightforward version: ORM objects with their responses eager-loaded, one ticket at a time
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    import models
+    first_response, to_close = {}, {}
+    tickets = db.scalars(
+        select(models.Ticket).where(models.Ticket.created_at >= since)
+        .options(selectinload(models.Ticket.responses).selectinload(models.TicketResponse.responder))
+    )
+    count = 0
+    for ticket in tickets:
+        count += 1
+        replies = sorted((r for r in ticket.responses if r.responder.role == models.UserRole.support_agent), key=lambda r: r.timestamp)
+        if replies:
+            first_response.setdefault(ticket.priority, []).append((replies[0].timestamp - ticket.created_at).total_seconds())
+        if ticket.closed_at:
+            to_close.setdefault(ticket.priority, []).append((ticket.closed_at - ticket.created_at).total_seconds())
+    return count
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return round(time.perf_counter() - started, 3)
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    from core import analytics
+    setup_database(engine)
+    started = time.perf_counter()
+    responses = seed(engine, args, random.Random(args.seed))
+    seed_s = time.perf_counter() - started
+    starts = analytics.week_starts(args.weeks)
+
+    def reports():
+        with SessionLocal() as db:
+            analytics.sla_report(db, starts, "priority")
+            analytics.sla_report(db, starts, "agent")
+            analytics.agent_report(db, starts)
+
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        orm_tickets = orm_reports(db, starts[-args.orm_weeks])
+        orm_s = time.perf_counter() - started
+    cold_s = timed(reports)
+    warm_s = timed(reports)
+    with SessionLocal() as db:
+        import crud
+        for _ in range(args.new_tickets):
+            crud.create_ticket(db, 1, "New", "Fresh ticket", "high")
+    day_s = timed(reports)
+    print(json.dumps({
+        "tickets": args.tickets,
+        "responses": responses,
+        "weeks": args.weeks,
+        "seed_s": round(seed_s, 1),
+        "orm_weeks": args.orm_weeks,
+        "orm_tickets": orm_tickets,
+        "orm_s": round(orm_s, 3),
+        "orm_full_s_estimate": round(orm_s * args.tickets / max(orm_tickets, 1), 1),
+        "cold_s": cold_s,
+        "warm_s": warm_s,
+        "after_new_tickets_s": day_s,
+        "windows_cached": analytics.stats.snapshot()["windows_cached"],
+    }, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=300000)
+    parser.add_argument("--responses", type=int, default=1000000)
+    parser.add_argument("--weeks", type=int, default=156)
+    parser.add_argument("--agents", type=int, default=40)
+    parser.add_argument("--orm-weeks", type=int, default=8)
+    parser.add_argument("--new-tickets", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", COUNTER_RECONCILE_INTERVAL="0", ARCHIVE_INTERVAL="0", JOB_WORKERS="0")
+        subprocess.run([sys.executable, __file__, "--worker", *sys.argv[1:]], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
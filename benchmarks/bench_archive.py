@@ -0,0 +1,134 @@
+"""Hot-query latency as closed-ticket history grows, before and after archiving.
+
+For each --history size, seeds a fresh database with that many tickets closed
+long ago plus a fixed set of --active tickets, times the listing queries the
+dashboards and /get_tickets issue, runs the archive mover (core.archive), and
+times the same queries again. Archived history should leave the hot latencies
+flat however large it gets; the report also gives the mover's throughput.
+
+    python benchmarks/bench_archive.py --history 10000,100000,500000
+    python benchmarks/bench_archive.py --database-url postgresql://... --history 100000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CUSTOMERS = 500
+
+def seed(engine, history, active, rng):
+    from sqlalchemy import insert
+    import models
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": i, "name": f"Customer {i}", "email": f"customer{i}@example.com", "password_hash": "x",
+             "role": models.UserRole.support_agent if i == 1 else models.UserRole.customer}
+            for i in range(1, CUSTOMERS + 1)
+        ])
+    # History first, so the active tickets hold the newest ids
+    for first in range(1, history + active + 1, 10000):
+        tickets, responses = [], []
+        for i in range(first, min(first + 10000, history + active + 1)):
+            closed = i <= history
+            created_at = now - timedelta(days=rng.randint(200, 2000)) if closed else now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+            tickets.append({"id": i, "user_id": rng.randint(2, CUSTOMERS), "subject": f"Ticket {i}", "description": "Seeded",
+                            "priority": rng.choice(["low", "medium", "high"]),
+                            "status": models.TicketStatus.closed if closed else rng.choice([models.TicketStatus.open, models.TicketStatus.in_progress]),
+                            "created_at": created_at, "queue_due_at": created_at, "closed_at": created_at + timedelta(days=3) if closed else None})
+            responses.append({"ticket_id": i, "responder_id": 1, "message": "Reply", "timestamp": created_at})
+        with engine.begin() as conn:
+            conn.execute(insert(models.Ticket.__table__), tickets)
+            conn.execute(insert(models.TicketResponse.__table__), responses)
+
+def hot_queries(rng):
+    import crud, models
+    customer = rng.randint(2, CUSTOMERS)
+    return {
+        "customer_tickets": lambda db: crud.list_customer_tickets(db, customer),
+        "agent_tickets_open": lambda db: crud.list_agent_tickets(db, status="open"),
+        "get_tickets_page": lambda db: crud.get_ticket_page(db, 100),
+        "get_tickets_page_open": lambda db: crud.get_ticket_page(db, 100, status=models.TicketStatus.open),
+        "dashboard": lambda db: crud.list_dashboard_tickets(db),
+    }
+
+def time_queries(session_factory, queries, repeat):
+    timings = {}
+    for name, query in queries.items():
+        samples = []
+        for _ in range(repeat):
+            with session_factory() as db:
+                started = time.perf_counter()
+                query(db)
+                samples.append(time.perf_counter() - started)
+        samples.sort()
+        timings[name] = round(samples[len(samples) // 2] * 1000, 3)
+    return timings
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+    from setup_db import setup_database
+    from core import archive
+    results = []
+    for size in (int(value) for value in args.history.split(",")):
+        url = args.database_url or f"sqlite:///{args.tmp}/history_{size}.db"
+        engine = create_engine(url)
+        if engine.dialect.name == "postgresql":
+            # The URL must point at a scratch database
+            with engine.begin() as conn:
+                conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        setup_database(engine)
+        seed(engine, size, args.active, random.Random(args.seed))
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+        queries = hot_queries(random.Random(args.seed))
+        before = time_queries(session_factory, queries, args.repeat)
+        started = time.perf_counter()
+        with session_factory() as db:
+            moved = archive.archive_closed(db, days=args.days, batch_size=args.batch_size)
+        archive_s = time.perf_counter() - started
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        after = time_queries(session_factory, queries, args.repeat)
+        results.append({
+            "history": size,
+            "active": args.active,
+            "archived": moved,
+            "archive_s": round(archive_s, 3),
+            "archived_per_s": round(moved / archive_s, 1) if archive_s else None,
+            "p50_ms_before": before,
+            "p50_ms_after": after,
+        })
+        engine.dispose()
+    print(json.dumps({"dialect": engine.dialect.name, "results": results}, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", default="10000,100000", help="comma-separated counts of long-closed tickets")
+    parser.add_argument("--active", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=90, help="archive tickets closed more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", help="scratch Postgres database (wiped per size); defaults to fresh SQLite files")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--tmp", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/app.db", COUNTER_RECONCILE_INTERVAL="0", ARCHIVE_INTERVAL="0", JOB_WORKERS="0")
+        subprocess.run([sys.executable, __file__, "--worker", "--tmp", tmp, *sys.argv[1:]], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Stylesheet bytes and requests per page view: /static as-is vs the fingerprinted, precompressed build.
+
+Renders each page with ASSET_PIPELINE off (before) and on (after) and fetches
+the local stylesheets it links the way a browser would, counting:
+
+  first_visit    requests and bytes on the wire with an empty browser cache
+  repeat_visit   requests for the same page again with a warm cache: /static
+                 files carry only validators, so each is revalidated (a 304);
+                 immutable /assets files aren't requested at all
+
+    python benchmarks/bench_assets.py --accept-encoding "gzip, deflate, br"
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {
+    "login": "/login",
+    "customer_dashboard": "/customer_dashboard?user_email=customer@example.com",
+    "support_agent_tickets": "/support_agent_tickets?user_email=agent@example.com",
+}
+STYLESHEET = re.compile(r'<link[^>]+rel\s*=\s*"stylesheet"[^>]+href="(/[^"]+)"')
+
+def wire_size(response):
+    # TestClient undoes Content-Encoding; Content-Length is what was sent
+    return int(response.headers.get("content-length", len(response.content)))
+
+def visit(client, path, accept_encoding, cache):
+    page = client.get(path, headers={"Accept-Encoding": accept_encoding})
+    stats = {"requests": 1, "html_bytes": wire_size(page), "asset_requests": 0, "asset_bytes": 0, "revalidated": 0}
+    for url in STYLESHEET.findall(page.text):
+        cached = cache.get(url)
+        if cached is not None and "immutable" in cached.get("cache-control", ""):
+            continue
+        headers = {"Accept-Encoding": accept_encoding}
+        if cached is not None and "etag" in cached:
+            headers["If-None-Match"] = cached["etag"]
+        response = client.get(url, headers=headers)
+        stats["requests"] += 1
+        stats["asset_requests"] += 1
+        if response.status_code == 304:
+            stats["revalidated"] += 1
+        else:
+            stats["asset_bytes"] += wire_size(response)
+            cache[url] = dict(response.headers)
+    return stats
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert
+    from database import engine
+    from setup_db import setup_database
+    import models
+    from main import app
+    setup_database(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+            {"name": "Agent", "email": "agent@example.com", "password_hash": "x", "role": models.UserRole.support_agent},
+        ])
+    results = {}
+    with TestClient(app) as client:
+        for name, path in PAGES.items():
+            cache = {}
+            results[name] = {
+                "first_visit": visit(client, path, args.accept_encoding, cache),
+                "repeat_visit": visit(client, path, args.accept_encoding, cache),
+            }
+    print(json.dumps(results))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accept-encoding", default="gzip, deflate, br")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    report = {}
+    for label, pipeline in (("before", "false"), ("after", "true")):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", COUNTER_RECONCILE_INTERVAL="0", ARCHIVE_INTERVAL="0",
+                JOB_WORKERS="0", DUPLICATE_INDEX_PATH=os.path.join(tmp, "duplicates.npz"),
+                ASSET_PIPELINE=pipeline, ASSET_BUILD_DIR=os.path.join(tmp, "assets"),
+            )
+            out = subprocess.run([sys.executable, __file__, "--worker", *sys.argv[1:]], env=env, check=True, capture_output=True, text=True)
+            report[label] = json.loads(out.stdout.strip().splitlines()[-1])
+    for name in PAGES:
+        before, after = report["before"][name], report["after"][name]
+        report.setdefault("change", {})[name] = {
+            "first_visit_asset_bytes": f"{before['first_visit']['asset_bytes']} -> {after['first_visit']['asset_bytes']}",
+            "repeat_visit_requests": f"{before['repeat_visit']['requests']} -> {after['repeat_visit']['requests']}",
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
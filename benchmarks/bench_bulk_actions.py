@@ -0,0 +1,108 @@
+"""Closing and replying to many tickets: one request per ticket vs the bulk endpoints.
+
+Seeds --tickets open tickets (plus --background unrelated ones), then times,
+through the ASGI app:
+
+  per_ticket  POST /add_ticket_response/{id}/responses then
+              POST /update_ticket_status/{id} for each ticket, as the
+              dashboard forms do
+  bulk        POST /bulk/tickets/responses with the same reply and status,
+              --batch-size tickets per request
+
+Each path runs on its own fresh set of tickets; both report tickets per
+second and the statements run per ticket.
+
+    python benchmarks/bench_bulk_actions.py --tickets 500 --batch-size 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(engine, count, background):
+    from sqlalchemy import insert
+    import models
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": 1, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+            {"id": 2, "name": "Agent", "email": "agent@example.com", "password_hash": "x", "role": models.UserRole.support_agent},
+        ])
+        conn.execute(insert(models.Ticket.__table__), [
+            {"id": i, "user_id": 1, "subject": f"Outage {i}", "description": "Nothing loads", "priority": "high" if i <= 2 * count else "low",
+             "status": models.TicketStatus.open, "created_at": start + timedelta(seconds=i), "queue_due_at": start + timedelta(seconds=i)}
+            for i in range(1, 2 * count + background + 1)
+        ])
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from core import counters
+    import main
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    setup_database(engine)
+    seed(engine, args.tickets, args.background)
+    with SessionLocal() as db:
+        counters.reconcile(db)
+    statements = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*_):
+        statements[0] += 1
+
+    client = TestClient(main.app)
+    auth = {"email_query": "agent@example.com"}
+    message = "The outage is over; sorry for the trouble."
+
+    def per_ticket(ids):
+        for ticket_id in ids:
+            client.post(f"/add_ticket_response/{ticket_id}/responses", data={"message": message, "email": "agent@example.com"}, follow_redirects=False)
+            client.post(f"/update_ticket_status/{ticket_id}", data={"status": "closed", "email": "agent@example.com"}, follow_redirects=False)
+
+    def bulk(ids):
+        for first in range(0, len(ids), args.batch_size):
+            response = client.post("/bulk/tickets/responses", params=auth,
+                                   json={"ticket_ids": ids[first:first + args.batch_size], "message": message, "status": "closed"})
+            response.raise_for_status()
+
+    results = {"tickets": args.tickets, "batch_size": args.batch_size}
+    for name, fn, ids in (("per_ticket", per_ticket, list(range(1, args.tickets + 1))),
+                          ("bulk", bulk, list(range(args.tickets + 1, 2 * args.tickets + 1)))):
+        statements[0] = 0
+        started = time.perf_counter()
+        fn(ids)
+        elapsed = time.perf_counter() - started
+        results[f"{name}_s"] = round(elapsed, 3)
+        results[f"{name}_per_s"] = round(len(ids) / elapsed, 1)
+        results[f"{name}_statements_per_ticket"] = round(statements[0] / len(ids), 2)
+    results["speedup"] = round(results["per_ticket_s"] / results["bulk_s"], 1)
+    with SessionLocal() as db:
+        # Both paths keep the maintained counters exact
+        results["counter_drift"] = {name: delta for name, delta in counters.reconcile(db).items() if delta}
+    print(json.dumps(results, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--background", type=int, default=20000, help="other tickets in the table")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", DUPLICATE_INDEX_PATH=f"{tmp}/duplicate_index.npz",
+                   COUNTER_RECONCILE_INTERVAL="0", ARCHIVE_INTERVAL="0", JOB_WORKERS="0")
+        subprocess.run([sys.executable, __file__, "--worker", *sys.argv[1:]], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare DB_MODE=sync and DB_MODE=async under concurrent load.
+
+Each mode runs in its own interpreter (DB_MODE is read at import time) against
+a freshly seeded SQLite database and drives the ASGI app in-process.
+
+    python benchmarks/bench_db_modes.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = [
+    "/support_agent_dashboard?user_email=agent@example.com",
+    "/get_tickets?email_query=agent@example.com&limit=50",
+]
+
+def seed(engine, tickets):
+    from sqlalchemy import insert
+    import models
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": 1, "name": "Agent", "email": "agent@example.com", "password_hash": "x", "role": models.UserRole.support_agent},
+            {"id": 2, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+        ])
+        conn.execute(insert(models.Ticket), [
+            {"user_id": 2, "subject": f"Ticket {i}", "description": "Details", "priority": "medium", "status": models.TicketStatus.open}
+            for i in range(tickets)
+        ])
+
+async def drive(app, total, concurrency):
+    import httpx
+    latencies = []
+    queue = iter(range(total))
+
+    async def client_loop(client):
+        for i in queue:
+            started = time.perf_counter()
+            response = await client.get(PATHS[i % len(PATHS)])
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from main import app
+    from database import engine, async_engine
+    from setup_db import setup_database
+    setup_database(engine)
+    seed(engine, args.tickets)
+
+    async def run():
+        try:
+            return await drive(app, args.requests, args.concurrency)
+        finally:
+            # aiosqlite connections own non-daemon threads; close them before exit
+            if async_engine is not None:
+                await async_engine.dispose()
+
+    print(json.dumps(asyncio.run(run())))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    for mode in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_MODE=mode, DATABASE_URL=f"sqlite:///{tmp}/bench.db")
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", "--requests", str(args.requests),
+                 "--concurrency", str(args.concurrency), "--tickets", str(args.tickets)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            print(f"{mode:>5}: {out.strip().splitlines()[-1]}")
+
+if __name__ == "__main__":
+    main()
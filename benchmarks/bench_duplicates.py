@@ -0,0 +1,183 @@
+"""Near-duplicate detection: recall, precision, check latency and index load time.
+
+Seeds --tickets synthetic tickets (words drawn from a Zipf distribution over
+--vocabulary words) and --duplicates near-copies of random earlier ones, each
+with --edit-rate of its words replaced, dropped or inserted. Then reports:
+
+  build      indexing every ticket from the database (catch_up on an empty index)
+  check      find_duplicate for each near-copy, as create_ticket runs it; recall
+             counts copies linked to their source, precision the links that are
+             right; p50/p99 latency of the whole call and of the index lookup
+             alone (signature + LSH candidates + verification, no catch-up query)
+  unrelated  find_duplicate for fresh tickets with no source: false links and latency
+  scan       verifying a signature against every indexed one, what the LSH bands avoid
+  save/load  the index file, as at shutdown and startup
+  cluster    python -m core.duplicates cluster over the whole backlog
+
+    python benchmarks/bench_duplicates.py --tickets 200000 --duplicates 2000 --edit-rate 0.1
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def words(vocabulary, rng, count):
+    # Zipf: the k-th most common word turns up in proportion to 1/k
+    return rng.choices(vocabulary[0], cum_weights=vocabulary[1], k=count)
+
+def edit(text, rng, rate):
+    out = []
+    for word in text:
+        roll = rng.random()
+        if roll < rate / 3:
+            continue
+        out.append(f"w{rng.randrange(10 ** 6)}" if roll < rate * 2 / 3 else word)
+        if roll > 1 - rate / 3:
+            out.append(f"w{rng.randrange(10 ** 6)}")
+    return out
+
+def seed(engine, args, rng):
+    from sqlalchemy import insert
+    import models
+    from itertools import accumulate
+    vocabulary = ([f"w{i}" for i in range(args.vocabulary)], list(accumulate(1 / k for k in range(1, args.vocabulary + 1))))
+    texts = [words(vocabulary, rng, rng.randint(15, 80)) for _ in range(args.tickets)]
+    sources = {}
+    for copy_id in range(args.tickets + 1, args.tickets + args.duplicates + 1):
+        source = rng.randrange(1, args.tickets + 1)
+        sources[copy_id] = source
+        texts.append(edit(texts[source - 1], rng, args.edit_rate))
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": 1, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+        ])
+    for first in range(0, args.tickets, 10000):
+        with engine.begin() as conn:
+            conn.execute(insert(models.Ticket.__table__), [
+                {"id": i + 1, "user_id": 1, "subject": " ".join(text[:6]), "description": " ".join(text[6:]), "priority": "low",
+                 "status": models.TicketStatus.open, "created_at": start + timedelta(seconds=i), "queue_due_at": start + timedelta(seconds=i)}
+                for i, text in enumerate(texts[first:min(first + 10000, args.tickets)], start=first)
+            ])
+    return vocabulary, texts, sources
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(int(len(values) * q / 100), len(values) - 1)] * 1000, 3)
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import numpy as np
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    from core import duplicates
+    setup_database(engine)
+    rng = random.Random(args.seed)
+    vocabulary, texts, sources = seed(engine, args, rng)
+    index = duplicates.index
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        index.catch_up(db)
+        build_s = time.perf_counter() - started
+
+        lookups = []
+
+        def check(text):
+            subject, description = " ".join(text[:6]), " ".join(text[6:])
+            started = time.perf_counter()
+            found = duplicates.find_duplicate(db, subject, description)
+            elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+            index.similar(index.sign([duplicates.ticket_text(subject, description)])[0], limit=1)
+            lookups.append(time.perf_counter() - started)
+            return found, elapsed
+
+        # Copies are checked but not added, so each one can only match its source
+        linked, right, latencies = 0, 0, []
+        for copy_id, source in sources.items():
+            found, elapsed = check(texts[copy_id - 1])
+            latencies.append(elapsed)
+            linked += found is not None
+            right += found == source
+        false_links, fresh_latencies = 0, []
+        for _ in range(args.duplicates):
+            found, elapsed = check(words(vocabulary, rng, rng.randint(15, 80)))
+            fresh_latencies.append(elapsed)
+            false_links += found is not None
+    signature = index.sign([" ".join(texts[0])])[0]
+    started = time.perf_counter()
+    for _ in range(20):
+        (index.signatures[:index.count] == signature).mean(axis=1) >= index.threshold
+    scan_s = (time.perf_counter() - started) / 20
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.npz")
+        started = time.perf_counter()
+        index.save(path)
+        save_s = time.perf_counter() - started
+        loads = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            duplicates.DuplicateIndex().load(path)
+            loads.append(time.perf_counter() - started)
+        index_bytes = os.path.getsize(path)
+    with engine.begin() as conn:
+        from sqlalchemy import insert
+        import models
+        conn.execute(insert(models.Ticket.__table__), [
+            {"id": copy_id, "user_id": 1, "subject": " ".join(texts[copy_id - 1][:6]), "description": " ".join(texts[copy_id - 1][6:]),
+             "priority": "low", "status": models.TicketStatus.open, "created_at": datetime(2025, 1, 1), "queue_due_at": datetime(2025, 1, 1)}
+            for copy_id in sources
+        ])
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        clustered = duplicates.cluster(db)
+        cluster_s = time.perf_counter() - started
+    print(json.dumps({
+        "tickets": args.tickets,
+        "duplicates": args.duplicates,
+        "edit_rate": args.edit_rate,
+        "build_s": round(build_s, 2),
+        "recall": round(linked / len(sources), 4),
+        "precision": round(right / max(linked, 1), 4),
+        "check_p50_ms": percentile(latencies, 50),
+        "check_p99_ms": percentile(latencies, 99),
+        "lookup_p50_ms": percentile(lookups, 50),
+        "lookup_p99_ms": percentile(lookups, 99),
+        "unrelated_false_links": false_links,
+        "unrelated_p50_ms": percentile(fresh_latencies, 50),
+        "unrelated_p99_ms": percentile(fresh_latencies, 99),
+        "scan_ms": round(scan_s * 1000, 3),
+        "index_bytes": index_bytes,
+        "save_s": round(save_s, 3),
+        "load_ms": round(sorted(loads)[len(loads) // 2] * 1000, 2),
+        "cluster_s": round(cluster_s, 2),
+        "cluster": clustered,
+    }, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=100000)
+    parser.add_argument("--duplicates", type=int, default=1000)
+    parser.add_argument("--edit-rate", type=float, default=0.1, help="share of each copy's words changed")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5, help="index loads to time")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", DUPLICATE_INDEX_PATH=f"{tmp}/duplicate_index.npz",
+                   COUNTER_RECONCILE_INTERVAL="0", ARCHIVE_INTERVAL="0", JOB_WORKERS="0")
+        subprocess.run([sys.executable, __file__, "--worker", *sys.argv[1:]], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Load test of the main web flows, with results kept for comparison between commits.
+
+Seeds a database at the requested scale, then drives the real app from main.py
+in-process with concurrent clients running a weighted mix of flows: login,
+both dashboards, /get_tickets, create ticket, add response and status update.
+Reports throughput, latency percentiles and SQL statements per request for
+each flow, appends the run to benchmarks/results/history.jsonl and prints the
+change against the previous run with the same settings.
+
+    python benchmarks/bench_endpoints.py --tickets 20000 --requests 2000 --concurrency 32
+    python benchmarks/bench_endpoints.py --database-url postgresql://... --db-mode async
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(ROOT, "benchmarks", "results", "history.jsonl")
+PASSWORD = "benchpassword"
+# Relative frequency of each flow in the request mix
+FLOWS = {
+    "login": 1,
+    "customer_dashboard": 3,
+    "support_agent_dashboard": 2,
+    "get_tickets": 3,
+    "create_ticket": 1,
+    "add_response": 1,
+    "update_status": 1,
+}
+# Settings that make two runs comparable
+CONFIG_KEYS = ("users", "tickets", "responses", "requests", "concurrency", "db_mode", "dialect", "bcrypt_rounds")
+
+current_flow = contextvars.ContextVar("current_flow", default=None)
+
+def seed(engine, users, tickets, responses, rng):
+    from sqlalchemy import insert
+    from core import security
+    import models
+    password_hash = security.get_password_hash(PASSWORD)
+    start = datetime.now() - timedelta(days=365)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": i, "name": f"User {i}", "email": f"user{i}@example.com", "password_hash": password_hash,
+             "role": models.UserRole.support_agent if i % 10 == 0 else models.UserRole.customer}
+            for i in range(1, users + 1)
+        ])
+    customers = [i for i in range(1, users + 1) if i % 10]
+    for first in range(1, tickets + 1, 10000):
+        ids = range(first, min(first + 10000, tickets + 1))
+        with engine.begin() as conn:
+            conn.execute(insert(models.Ticket.__table__), [
+                {"id": i, "user_id": rng.choice(customers), "subject": f"Ticket {i}", "description": "Seeded ticket body",
+                 "priority": rng.choice(["low", "medium", "high"]), "status": rng.choice(list(models.TicketStatus)),
+                 "created_at": start + timedelta(seconds=i * 365 * 86400 // max(tickets, 1))}
+                for i in ids
+            ])
+    for first in range(0, responses, 10000):
+        with engine.begin() as conn:
+            conn.execute(insert(models.TicketResponse.__table__), [
+                {"ticket_id": rng.randint(1, tickets), "responder_id": rng.choice([10, customers[0]]), "message": "Seeded reply"}
+                for _ in range(first, min(first + 10000, responses))
+            ])
+    return customers, [i for i in range(10, users + 1, 10)]
+
+def count_statements(engine, counts):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        flow = current_flow.get()
+        if flow is not None:
+            counts[flow] += 1
+
+def percentile(samples, pct):
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct / 100))] * 1000, 2)
+
+async def drive(app, args, customers, agents, tokens, statements):
+    import httpx
+    rng = random.Random(args.seed)
+    names, weights = zip(*FLOWS.items())
+    plan = iter(rng.choices(names, weights, k=args.requests))
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    def request_for(flow, rng):
+        customer, agent = rng.choice(customers), rng.choice(agents)
+        ticket_id = rng.randint(1, args.tickets)
+        if flow == "login":
+            return "POST", "/login", None, {"email": f"user{customer}@example.com", "password": PASSWORD, "role": "customer"}
+        if flow == "customer_dashboard":
+            return "GET", "/customer_dashboard", customer, None
+        if flow == "support_agent_dashboard":
+            return "GET", "/support_agent_dashboard", agent, None
+        if flow == "get_tickets":
+            return "GET", "/get_tickets?limit=50", rng.choice([customer, agent]), None
+        if flow == "create_ticket":
+            return "POST", "/create_ticket", customer, {"subject": "Load test", "description": "Created under load", "priority": "medium"}
+        if flow == "add_response":
+            return "POST", f"/add_ticket_response/{ticket_id}/responses", agent, {"message": "Load test reply"}
+        return "POST", f"/update_ticket_status/{ticket_id}", agent, {"status": rng.choice(["open", "in_progress", "closed"])}
+
+    async def client_loop(client, worker_id):
+        local_rng = random.Random(args.seed + worker_id)
+        for flow in plan:
+            method, path, user, form = request_for(flow, local_rng)
+            cookies = {"session": tokens[user]} if user else None
+            token = current_flow.set(flow)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, data=form, cookies=cookies)
+                if response.status_code >= 400:
+                    errors[flow] += 1
+            finally:
+                current_flow.reset(token)
+            latencies[flow].append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", follow_redirects=False) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    flows = {}
+    for flow, samples in sorted(latencies.items()):
+        samples.sort()
+        flows[flow] = {
+            "requests": len(samples),
+            "errors": errors[flow],
+            "p50_ms": percentile(samples, 50),
+            "p95_ms": percentile(samples, 95),
+            "p99_ms": percentile(samples, 99),
+            "max_ms": round(samples[-1] * 1000, 2),
+            "queries_per_request": round(statements[flow] / len(samples), 2),
+        }
+    return {"throughput_rps": round(args.requests / elapsed, 1), "elapsed_s": round(elapsed, 2), "flows": flows}
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from sqlalchemy import text
+    from main import app
+    from database import engine, async_engine, SessionLocal
+    from core import counters, sessions
+    from core.identity import UserIdentity
+    from core.security import password_hasher
+    import models
+    if engine.dialect.name == "postgresql":
+        # Postgres runs start from an empty schema; the URL must point at a scratch database
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+    from setup_db import setup_database
+    setup_database(engine)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    customers, agents = seed(engine, args.users, args.tickets, args.responses, rng)
+    with SessionLocal() as db:
+        counters.reconcile(db)
+        tokens = {user.id: sessions.create_session_token(UserIdentity.from_user(user)) for user in db.query(models.User)}
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    seed_s = round(time.perf_counter() - started, 2)
+    statements = defaultdict(int)
+    count_statements(async_engine.sync_engine if async_engine is not None else engine, statements)
+    password_hasher.warm_up()
+
+    async def run():
+        try:
+            return await drive(app, args, customers, agents, tokens, statements)
+        finally:
+            if async_engine is not None:
+                await async_engine.dispose()
+
+    try:
+        result = asyncio.run(run())
+    finally:
+        password_hasher.shutdown()
+    result["seed_s"] = seed_s
+    result["dialect"] = engine.dialect.name
+    print(json.dumps(result))
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def previous_run(config):
+    if not os.path.exists(HISTORY):
+        return None
+    with open(HISTORY) as history:
+        runs = [json.loads(line) for line in history if line.strip()]
+    matching = [run for run in runs if run["config"] == config]
+    return matching[-1] if matching else None
+
+def compare(current, previous):
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+    print(f"vs {previous['commit']} ({previous['timestamp']}): throughput {change(current['throughput_rps'], previous['throughput_rps'])}")
+    for flow, stats in current["flows"].items():
+        old = previous["flows"].get(flow)
+        if old:
+            print(f"  {flow:>24}: p50 {change(stats['p50_ms'], old['p50_ms'])}, p99 {change(stats['p99_ms'], old['p99_ms'])}, "
+                  f"queries {stats['queries_per_request']} (was {old['queries_per_request']})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--responses", type=int, default=40000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--db-mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--database-url", help="scratch Postgres database (wiped); defaults to a fresh SQLite file")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="low by default so logins don't dominate the mix")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to the history")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.users < 10:
+        parser.error("--users must be at least 10 (every tenth user is a support agent)")
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DB_MODE=args.db_mode, BCRYPT_ROUNDS=str(args.bcrypt_rounds),
+                   DATABASE_URL=args.database_url or f"sqlite:///{tmp}/bench.db", COUNTER_RECONCILE_INTERVAL="0")
+        worker_args = [arg for arg in sys.argv[1:] if arg != "--no-save"]
+        out = subprocess.run([sys.executable, __file__, "--worker", *worker_args], env=env, capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    config = {key: getattr(args, key, None) for key in CONFIG_KEYS}
+    config["dialect"] = result.pop("dialect")
+    run = {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(), "config": config, **result}
+    print(json.dumps(run, indent=2))
+    previous = previous_run(config)
+    if previous:
+        compare(run, previous)
+    if not args.no_save:
+        os.makedirs(os.path.dirname(HISTORY), exist_ok=True)
+        with open(HISTORY, "a") as history:
+            history.write(json.dumps(run) + "\n")
+
+if __name__ == "__main__":
+    main()
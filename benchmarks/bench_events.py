@@ -0,0 +1,108 @@
+"""Fan-out benchmark for the ticket event broker behind /events.
+
+Opens many idle SSE subscribers, each consuming core.events.stream() like the
+endpoint does, then publishes ticket events from a writer thread (where
+after_commit runs under run_db) and measures publish-to-delivery latency,
+delivery throughput and memory per idle subscriber.
+
+    python benchmarks/bench_events.py --subscribers 5000 --events 200
+    python benchmarks/bench_events.py --subscribers 20000 --agents 0.05 --rate 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples, pct):
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct / 100))] * 1000, 3)
+
+async def consume(subscription, stream, latencies, remaining, done):
+    async for chunk in stream(subscription, heartbeat=3600):
+        if not chunk.startswith("event: "):
+            continue
+        event = json.loads(chunk.split("data: ", 1)[1])
+        latencies.append(time.perf_counter() - event["sent_at"])
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            done.set()
+
+async def run(args):
+    from core import events
+    rng = random.Random(args.seed)
+    customers = max(1, int(args.subscribers * (1 - args.agents)))
+    customer_ids = [rng.randint(1, args.customer_pool) for _ in range(customers)]
+    broker = events.EventBroker(events.LocalBus(), max_subscribers=args.subscribers)
+    # stream() unsubscribes from the module broker; point it at this one
+    events.broker = broker
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [broker.subscribe() for _ in range(args.subscribers - customers)]
+    subscriptions += [broker.subscribe(customer_id) for customer_id in customer_ids]
+    latencies, remaining, done = [], [0], asyncio.Event()
+    tasks = [asyncio.create_task(consume(s, events.stream, latencies, remaining, done)) for s in subscriptions]
+    await asyncio.sleep(0.1)
+    per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / args.subscribers
+    tracemalloc.stop()
+
+    targets = [rng.randint(1, args.customer_pool) for _ in range(args.events)]
+    agents = args.subscribers - customers
+    remaining[0] = sum(agents + customer_ids.count(target) for target in targets)
+    if remaining[0] == 0:
+        done.set()
+
+    def writer():
+        for i, target in enumerate(targets):
+            broker.publish({"type": "ticket_status", "ticket_id": i, "customer_id": target, "status": "closed", "sent_at": time.perf_counter()})
+            if args.rate:
+                time.sleep(1 / args.rate)
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=writer)
+    thread.start()
+    await asyncio.wait_for(done.wait(), args.timeout)
+    elapsed = time.perf_counter() - started
+    thread.join()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    latencies.sort()
+    return {
+        "subscribers": args.subscribers,
+        "agent_subscribers": agents,
+        "events": args.events,
+        "deliveries": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "deliveries_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_p50_ms": percentile(latencies, 50) if latencies else None,
+        "latency_p99_ms": percentile(latencies, 99) if latencies else None,
+        "latency_max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+        "idle_bytes_per_subscriber": round(per_subscriber),
+        "remaining_subscribers": broker.stats()["subscribers"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--agents", type=float, default=0.1, help="share of subscribers that are agents (receive every event)")
+    parser.add_argument("--customer-pool", type=int, default=2000, help="distinct customers events are spread over")
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=0, help="events per second from the writer thread; 0 publishes flat out")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    # The broker needs no database; keep the import of models away from a real one
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.gettempdir()}/bench_events.db"
+    sys.path.insert(0, ROOT)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
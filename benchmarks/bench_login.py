@@ -0,0 +1,102 @@
+"""Login latency under concurrent load, bcrypt inline vs. in the process pool.
+
+"inline" (PASSWORD_HASH_WORKERS=0) hashes on the request threadpool as before;
+"pool" uses the bounded worker processes. Alongside the logins, a stream of
+cheap page requests measures how much the hashing stalls everything else.
+
+    python benchmarks/bench_login.py --logins 200 --concurrency 32 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return round(samples[max(0, int(len(samples) * pct / 100) - 1)] * 1000, 2)
+
+async def drive(app, logins, concurrency):
+    import httpx
+    login_latencies, page_latencies = [], []
+    pending = iter(range(logins))
+    done = asyncio.Event()
+
+    async def login_loop(client):
+        for _ in pending:
+            started = time.perf_counter()
+            response = await client.post("/login", data={"email": "bench@example.com", "password": "benchpassword", "role": "customer"})
+            assert response.status_code == 302, response.status_code
+            login_latencies.append(time.perf_counter() - started)
+
+    async def page_loop(client):
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/login")
+            page_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        pages = asyncio.create_task(page_loop(client))
+        started = time.perf_counter()
+        await asyncio.gather(*(login_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await pages
+    return {
+        "logins_per_s": round(logins / elapsed, 1),
+        "login_p50_ms": percentile(login_latencies, 50),
+        "login_p99_ms": percentile(login_latencies, 99),
+        "page_p50_ms": percentile(page_latencies, 50),
+        "page_p99_ms": percentile(page_latencies, 99),
+    }
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from main import app
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    from core import security
+    import models
+    setup_database(engine)
+    with SessionLocal() as db:
+        db.add(models.User(name="Bench", email="bench@example.com", role=models.UserRole.customer,
+                           password_hash=security.get_password_hash("benchpassword")))
+        db.commit()
+    security.password_hasher.warm_up()
+    try:
+        result = asyncio.run(drive(app, args.logins, args.concurrency))
+        result["hashing"] = security.password_hasher.stats()
+    finally:
+        security.password_hasher.shutdown()
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    for label, workers in (("inline", 0), ("pool", args.workers)):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS=str(args.rounds),
+                       PASSWORD_HASH_WORKERS=str(workers), PASSWORD_HASH_MAX_PENDING=str(args.logins))
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", "--logins", str(args.logins), "--concurrency", str(args.concurrency)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            print(f"{label:>6}: {out.strip().splitlines()[-1]}")
+
+if __name__ == "__main__":
+    main()
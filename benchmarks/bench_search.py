@@ -0,0 +1,101 @@
+"""Full-text ticket search over a synthetic corpus, against a LIKE scan baseline.
+
+Seeds tickets and responses from a small vocabulary (the search triggers index
+them as they are inserted), then times ranked searches through
+crud.search_tickets and the equivalent unindexed LIKE query.
+
+    python benchmarks/bench_search.py --tickets 1000000
+    python benchmarks/bench_search.py --database-url postgresql://... --tickets 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = (
+    "invoice refund charge payment card login password reset email account locked upgrade plan "
+    "cancel subscription export report dashboard slow error timeout crash mobile app sync delete "
+    "profile address shipping delivery order tracking damaged missing receipt discount coupon"
+).split()
+# Common words match a large share of the corpus, so ranking dominates; the
+# sku codes match ~10 tickets each, where a LIKE scan still reads every row
+QUERIES = ["refund", "password reset", "invoice coupon discount", "sku123", "refund sku4567"]
+CHUNK = 10000
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def seed(engine, tickets, seed_value=42):
+    from sqlalchemy import insert
+    import models
+    rng = random.Random(seed_value)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": 1, "name": "Agent", "email": "agent@example.com", "password_hash": "x", "role": models.UserRole.support_agent},
+            {"id": 2, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+        ])
+    started = time.perf_counter()
+    for first in range(1, tickets + 1, CHUNK):
+        ids = range(first, min(first + CHUNK, tickets + 1))
+        with engine.begin() as conn:
+            conn.execute(insert(models.Ticket), [
+                {"id": i, "user_id": 2, "subject": f"{sentence(rng, 4)} sku{rng.randrange(max(1, tickets // 10))}",
+                 "description": sentence(rng, 25),
+                 "priority": rng.choice(["low", "medium", "high"]), "status": models.TicketStatus.open}
+                for i in ids
+            ])
+            conn.execute(insert(models.TicketResponse), [
+                {"ticket_id": i, "responder_id": 1, "message": sentence(rng, 12)} for i in ids if i % 2
+            ])
+    return round(tickets / (time.perf_counter() - started), 1)
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(sorted(samples)[len(samples) // 2] * 1000, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file; a Postgres URL is wiped first")
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/search.db"
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from sqlalchemy import select, or_, text
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    import crud, models
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+    setup_database(engine)
+    results = {"tickets": args.tickets, "dialect": engine.dialect.name, "insert_tickets_per_s": seed(engine, args.tickets)}
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    with SessionLocal() as db:
+        for query in QUERIES:
+            terms = query.split()
+            like = select(models.Ticket.id).outerjoin(models.TicketResponse).where(*(
+                or_(models.Ticket.subject.ilike(f"%{term}%"), models.Ticket.description.ilike(f"%{term}%"),
+                    models.TicketResponse.message.ilike(f"%{term}%"))
+                for term in terms
+            )).distinct().order_by(models.Ticket.id.desc()).limit(20)
+            results[query] = {
+                "fts_page_ms": timed(lambda: crud.search_tickets(db, query, 20), args.repeat),
+                "fts_offset_200_ms": timed(lambda: crud.search_tickets(db, query, 20, offset=200), args.repeat),
+                "like_scan_ms": timed(lambda: db.execute(like).all(), args.repeat),
+            }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Serialization cost of /get_tickets per 10k tickets: pydantic path vs fast path.
+
+Seeds --tickets tickets with --responses responses each, then times both ways
+of turning a page into a response body:
+
+  pydantic  ORM objects with selectinload'ed responses, validated through
+            List[schemas.TicketResponseOut] and dumped with json, as
+            FastAPI's response_model handling does
+  fast      column rows from crud.get_ticket_payload_page encoded by
+            core.serialization (orjson when installed)
+
+Each path is split into load (query and object/dict building) and encode
+(validation and JSON encoding), and the bodies are checked to be identical.
+
+    python benchmarks/bench_serialization.py --tickets 10000 --responses 3
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(engine, tickets, responses, rng):
+    from sqlalchemy import insert
+    import models
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": 1, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+            {"id": 2, "name": "Agent", "email": "agent@example.com", "password_hash": "x", "role": models.UserRole.support_agent},
+        ])
+        conn.execute(insert(models.Ticket.__table__), [
+            {"id": i, "user_id": 1, "subject": f"Ticket {i}", "description": "Something broke " * rng.randint(1, 20),
+             "priority": rng.choice(["low", "medium", "high", None]), "status": rng.choice(list(models.TicketStatus)),
+             "created_at": start + timedelta(seconds=i, microseconds=rng.randint(0, 999999))}
+            for i in range(1, tickets + 1)
+        ])
+        if responses:
+            conn.execute(insert(models.TicketResponse.__table__), [
+                {"ticket_id": i, "responder_id": rng.choice([1, 2]), "message": "We're on it", "timestamp": start + timedelta(seconds=i + n)}
+                for i in range(1, tickets + 1) for n in range(responses)
+            ])
+
+def pydantic_path(db, limit):
+    from typing import List
+    from pydantic import TypeAdapter
+    import crud, schemas
+    started = time.perf_counter()
+    tickets, _ = crud.get_ticket_page(db, limit)
+    loaded = time.perf_counter()
+    adapter = TypeAdapter(List[schemas.TicketResponseOut])
+    body = json.dumps(adapter.dump_python(adapter.validate_python(tickets, from_attributes=True), mode="json"),
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, loaded - started, time.perf_counter() - loaded
+
+def fast_path(db, limit):
+    import crud
+    from core import serialization
+    started = time.perf_counter()
+    tickets, _ = crud.get_ticket_payload_page(db, limit)
+    loaded = time.perf_counter()
+    body = serialization.dumps(tickets)
+    return body, loaded - started, time.perf_counter() - loaded
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    from core import serialization
+    setup_database(engine)
+    seed(engine, args.tickets, args.responses, random.Random(args.seed))
+    per_10k = 10000 / args.tickets
+    results, bodies = {}, {}
+    for name, path in (("pydantic", pydantic_path), ("fast", fast_path)):
+        loads, encodes = [], []
+        for _ in range(args.repeat):
+            with SessionLocal() as db:
+                body, load_s, encode_s = path(db, args.tickets)
+            loads.append(load_s)
+            encodes.append(encode_s)
+        bodies[name] = body
+        load_s, encode_s = sorted(loads)[len(loads) // 2], sorted(encodes)[len(encodes) // 2]
+        results[name] = {
+            "load_ms_per_10k": round(load_s * per_10k * 1000, 1),
+            "encode_ms_per_10k": round(encode_s * per_10k * 1000, 1),
+            "total_ms_per_10k": round((load_s + encode_s) * per_10k * 1000, 1),
+        }
+    print(json.dumps({
+        "tickets": args.tickets,
+        "responses_per_ticket": args.responses,
+        "encoder": "orjson" if serialization.orjson else "json",
+        "body_bytes": len(bodies["fast"]),
+        "identical_bodies": bodies["fast"] == bodies["pydantic"],
+        **results,
+        "speedup": round(results["pydantic"]["total_ms_per_10k"] / results["fast"]["total_ms_per_10k"], 2),
+    }, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--responses", type=int, default=2, help="responses per ticket")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", COUNTER_RECONCILE_INTERVAL="0")
+        subprocess.run([sys.executable, __file__, "--worker", *sys.argv[1:]], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
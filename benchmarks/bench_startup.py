@@ -0,0 +1,110 @@
+"""Cold start and first-request latency of a new app process, before and after startup warm-up.
+
+Each run is a fresh Python process, as when an instance is added on scale-out.
+It times importing main (import_s), the lifespan startup up to taking traffic
+(startup_s) and the first and second request to each page, with:
+
+  before  schema checked in the startup hook, templates compiled on first use,
+          connections and hashing workers started by the first requests
+  after   schema left to the release step (SCHEMA_SETUP=skip), templates from a
+          bytecode cache filled by `python -m core.templating compile`, and
+          STARTUP_WARMUP loading templates, connections and workers up front
+
+Reports medians over --runs processes. The agent tickets page's first request
+also renders every ticket card into the render cache, which no warm-up saves.
+
+    python benchmarks/bench_startup.py --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {
+    "login": "/login",
+    "customer_dashboard": "/customer_dashboard?user_email=customer@example.com",
+    "support_agent_tickets": "/support_agent_tickets?user_email=agent@example.com",
+}
+MODES = {
+    "before": {"SCHEMA_SETUP": "startup", "STARTUP_WARMUP": "false", "TEMPLATE_CACHE_DIR": ""},
+    "after": {"SCHEMA_SETUP": "skip", "STARTUP_WARMUP": "true"},
+}
+
+def seed(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from datetime import datetime
+    from sqlalchemy import insert
+    from database import engine
+    from setup_db import setup_database
+    import models
+    setup_database(engine)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": 1, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+            {"id": 2, "name": "Agent", "email": "agent@example.com", "password_hash": "x", "role": models.UserRole.support_agent},
+        ])
+        conn.execute(insert(models.Ticket.__table__), [
+            {"id": i, "user_id": 1, "subject": f"Ticket {i}", "description": "Seeded", "priority": "medium",
+             "status": models.TicketStatus.open, "created_at": now, "queue_due_at": now}
+            for i in range(1, args.tickets + 1)
+        ])
+
+def worker(args):
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import main
+    from fastapi.testclient import TestClient
+    result = {"import_s": time.perf_counter() - started}
+    client = TestClient(main.app)
+    started = time.perf_counter()
+    with client:
+        result["startup_s"] = time.perf_counter() - started
+        for name, path in PAGES.items():
+            for attempt in ("first", "second"):
+                started = time.perf_counter()
+                client.get(path).raise_for_status()
+                result[f"{name}_{attempt}_ms"] = (time.perf_counter() - started) * 1000
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--worker", choices=["seed", "run"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker == "seed":
+        return seed(args)
+    if args.worker == "run":
+        return worker(args)
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", COUNTER_RECONCILE_INTERVAL="0", ARCHIVE_INTERVAL="0",
+            JOB_WORKERS="0", DUPLICATE_INDEX_PATH=os.path.join(tmp, "duplicates.npz"),
+            ASSET_BUILD_DIR=os.path.join(tmp, "assets"), TEMPLATE_CACHE_DIR=os.path.join(tmp, "jinja"),
+        )
+        subprocess.run([sys.executable, __file__, "--worker", "seed", *sys.argv[1:]], env=env, check=True, capture_output=True)
+        # The release step: everything a new instance can be handed ready-made
+        for step in (["core.assets", "build"], ["core.templating", "compile"]):
+            subprocess.run([sys.executable, "-m", *step], env=env, cwd=ROOT, check=True, capture_output=True)
+        for mode, settings in MODES.items():
+            runs = []
+            for _ in range(args.runs):
+                out = subprocess.run([sys.executable, __file__, "--worker", "run", *sys.argv[1:]], env=dict(env, **settings),
+                                     check=True, capture_output=True, text=True)
+                runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            report[mode] = {key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]}
+            report[mode]["ready_to_first_page_s"] = round(
+                report[mode]["import_s"] + report[mode]["startup_s"] + report[mode]["login_first_ms"] / 1000, 3)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Triage throughput: model training, model load time and tickets scored per second.
+
+Seeds --tickets synthetic tickets (subject + description drawn from a few
+categories' vocabularies plus filler, priorities to match), then reports:
+
+  train     python -m core.triage train on that history
+  load      reading the saved model file, as each process does on first use
+  predict   TriageModel.predict alone, per --batch-size batch
+  rescore   core.triage.rescore end to end: read, score, write back, commit
+
+    python benchmarks/bench_triage.py --tickets 100000 --batch-size 5000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPICS = {
+    "billing": ("invoice refund charged VAT payment card subscription receipt", "medium"),
+    "account": ("login password reset locked account verification username", "medium"),
+    "bug": ("error crash broken exception fails page blank button", "high"),
+    "performance": ("slow timeout loading lag dashboard report export", "high"),
+    "feature_request": ("idea suggestion feature dark mode export integration", "low"),
+}
+FILLER = "hi team we noticed that since yesterday the app our users customers again still today please help thanks".split()
+
+def seed(engine, tickets, rng):
+    from sqlalchemy import insert
+    import models
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": 1, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+        ])
+    for first in range(1, tickets + 1, 10000):
+        rows = []
+        for i in range(first, min(first + 10000, tickets + 1)):
+            words, priority = TOPICS[rng.choice(list(TOPICS))]
+            words = words.split()
+            body = rng.sample(words, 3) + rng.choices(FILLER, k=rng.randint(8, 30))
+            rng.shuffle(body)
+            rows.append({"id": i, "user_id": 1, "subject": " ".join(rng.sample(words, 2)).capitalize(), "description": " ".join(body),
+                         "priority": priority if rng.random() < 0.8 else rng.choice(["low", "medium", "high"]),
+                         "status": models.TicketStatus.open, "created_at": start + timedelta(seconds=i),
+                         "queue_due_at": start + timedelta(seconds=i)})
+        with engine.begin() as conn:
+            conn.execute(insert(models.Ticket.__table__), rows)
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    from core import triage
+    setup_database(engine)
+    seed(engine, args.tickets, random.Random(args.seed))
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        texts, priorities = triage.training_set(db, args.tickets)
+        model = triage.train(texts, priorities)
+        train_s = time.perf_counter() - started
+    model.save(triage.TRIAGE_MODEL_PATH)
+    loads = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        triage.TriageModel.load(triage.TRIAGE_MODEL_PATH)
+        loads.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    for first in range(0, len(texts), args.batch_size):
+        model.predict(texts[first:first + args.batch_size])
+    predict_s = time.perf_counter() - started
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        rescored = triage.rescore(db, args.batch_size)
+        rescore_s = time.perf_counter() - started
+    print(json.dumps({
+        "tickets": args.tickets,
+        "batch_size": args.batch_size,
+        "vocabulary": len(model.vocabulary),
+        "categories": model.categories,
+        "train_s": round(train_s, 3),
+        "model_bytes": os.path.getsize(triage.TRIAGE_MODEL_PATH),
+        "model_load_ms": round(sorted(loads)[len(loads) // 2] * 1000, 2),
+        "predict_per_s": round(len(texts) / predict_s, 1),
+        "rescore_per_s": round(rescored / rescore_s, 1),
+    }, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5, help="model loads to time")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", TRIAGE_MODEL_PATH=f"{tmp}/triage_model.npz",
+                   COUNTER_RECONCILE_INTERVAL="0", ARCHIVE_INTERVAL="0", JOB_WORKERS="0")
+        subprocess.run([sys.executable, __file__, "--worker", *sys.argv[1:]], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Contention benchmark for the agent work queue: N simulated agents claiming at once.
+
+Seeds a backlog of open tickets, then runs --agents threads that each claim
+tickets until the queue is empty, pausing --work-ms per ticket to stand in
+for handling it. Reports claim throughput, claim latency percentiles, and
+how many tickets were handed to more than one agent. --strategy naive reads
+the head of the queue and assigns it without locking, the race the queue
+replaces, for comparison.
+
+    python benchmarks/bench_work_queue.py --agents 32 --tickets 5000
+    python benchmarks/bench_work_queue.py --database-url postgresql://... --strategy naive
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(engine, tickets, rng):
+    from sqlalchemy import insert
+    from core import work_queue
+    import models
+    start = datetime.now() - timedelta(days=30)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": 1, "name": "Customer", "email": "customer@example.com", "password_hash": "x", "role": models.UserRole.customer},
+            {"id": 2, "name": "Agent", "email": "agent@example.com", "password_hash": "x", "role": models.UserRole.support_agent},
+        ])
+    for first in range(1, tickets + 1, 10000):
+        rows = []
+        for i in range(first, min(first + 10000, tickets + 1)):
+            created_at = start + timedelta(seconds=rng.randint(0, 30 * 86400))
+            priority = rng.choice(["low", "medium", "high"])
+            rows.append({"id": i, "user_id": 1, "subject": f"Ticket {i}", "description": "Seeded", "priority": priority,
+                         "status": models.TicketStatus.open, "created_at": created_at, "queue_due_at": work_queue.due_at(created_at, priority)})
+        with engine.begin() as conn:
+            conn.execute(insert(models.Ticket.__table__), rows)
+
+def naive_claim(db, agent_id):
+    # The pre-queue behaviour: everyone reads the same head and takes it
+    from core import work_queue
+    import models
+    ticket = db.scalars(work_queue.queue_query().limit(1)).first()
+    if ticket is None:
+        db.rollback()
+        return None
+    ticket.assignee_id = agent_id
+    ticket.status = models.TicketStatus.in_progress
+    db.commit()
+    return ticket
+
+def percentile(samples, pct):
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct / 100))] * 1000, 3)
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from sqlalchemy import text
+    from database import engine, SessionLocal
+    from setup_db import setup_database
+    from core import work_queue
+    if engine.dialect.name == "postgresql":
+        # The URL must point at a scratch database
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+    setup_database(engine)
+    seed(engine, args.tickets, random.Random(args.seed))
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    claim = naive_claim if args.strategy == "naive" else work_queue.claim_next
+    claims, latencies, errors = [], [], Counter()
+    lock = threading.Lock()
+
+    def agent(agent_id):
+        mine, timings = [], []
+        with SessionLocal() as db:
+            while True:
+                started = time.perf_counter()
+                try:
+                    ticket = claim(db, agent_id)
+                except Exception as exc:
+                    db.rollback()
+                    with lock:
+                        errors[type(exc).__name__] += 1
+                    continue
+                if ticket is None:
+                    break
+                timings.append(time.perf_counter() - started)
+                mine.append(ticket.id)
+                if args.work_ms:
+                    time.sleep(args.work_ms / 1000)
+        with lock:
+            claims.extend(mine)
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=agent, args=(2,)) for _ in range(args.agents)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    handed_out = Counter(claims)
+    print(json.dumps({
+        "dialect": engine.dialect.name,
+        "strategy": args.strategy,
+        "agents": args.agents,
+        "tickets": args.tickets,
+        "claims": len(claims),
+        "tickets_claimed": len(handed_out),
+        "double_handled": sum(1 for count in handed_out.values() if count > 1),
+        "errors": dict(errors),
+        "elapsed_s": round(elapsed, 3),
+        "claims_per_s": round(len(claims) / elapsed, 1) if elapsed else None,
+        "claim_p50_ms": percentile(latencies, 50) if latencies else None,
+        "claim_p99_ms": percentile(latencies, 99) if latencies else None,
+    }, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=16)
+    parser.add_argument("--tickets", type=int, default=2000)
+    parser.add_argument("--work-ms", type=float, default=0, help="time each agent spends per claimed ticket")
+    parser.add_argument("--strategy", choices=["claim", "naive"], default="claim")
+    parser.add_argument("--database-url", help="scratch Postgres database (wiped); defaults to a fresh SQLite file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=args.database_url or f"sqlite:///{tmp}/bench.db", COUNTER_RECONCILE_INTERVAL="0")
+        subprocess.run([sys.executable, __file__, "--worker", *sys.argv[1:]], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
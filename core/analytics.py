@@ -0,0 +1,390 @@
+"""SLA and agent-performance reports over columnar extracts, computed with numpy.
+
+Reports are assembled from weekly windows (Monday to Monday):
+
+- a ticket window covers the tickets created that week: how many there were,
+  how many are unanswered or open, and histograms of first agent response
+  time and time to close, by priority and by agent (first responder for
+  responses, assignee for closes)
+- a response window counts each agent's responses sent that week
+
+A window is extracted as a few columns per table, active and archived, and
+reduced with numpy: a lexsort and np.unique find first responses, bincount
+builds every group's histogram at once. Durations fall into 160 log-spaced
+buckets (about 12% wide, 1 second to 3 years). Bucket counts merge by
+addition, so a report over any weeks sums their windows' histograms and
+reads percentiles off the total, to within a bucket.
+
+Settled windows are cached in analytics_windows and never computed again:
+response windows a day after the week ends, ticket windows once
+ANALYTICS_SETTLE_DAYS more have passed for late replies and closes. A later
+change to a ticket in a settled window (a reply, a close, a reopen, or an
+import backdated into it) drops that window from the cache in the same
+transaction. Only unsettled weeks are recomputed per report, so each report
+processes the recent data and reads the rest.
+
+    python -m core.analytics warm --weeks 156    # fill the cache before the first report
+    python -m core.analytics clear
+"""
+import argparse
+import json
+import math
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import delete, event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import models
+from core.triage import normalize_priority
+
+ANALYTICS_SETTLE_DAYS = int(os.getenv("ANALYTICS_SETTLE_DAYS", "30"))
+ANALYTICS_DEFAULT_WEEKS = int(os.getenv("ANALYTICS_DEFAULT_WEEKS", "12"))
+ANALYTICS_MAX_WEEKS = int(os.getenv("ANALYTICS_MAX_WEEKS", "520"))
+ANALYTICS_CHUNK_SIZE = int(os.getenv("ANALYTICS_CHUNK_SIZE", "50000"))
+
+WEEK = timedelta(days=7)
+# Bucket i holds durations in [EDGES[i], EDGES[i + 1]) seconds
+EDGES = np.logspace(0, 8, 161)
+BUCKETS = len(EDGES) - 1
+MIDPOINTS = np.sqrt(EDGES[:-1] * EDGES[1:])
+REPORT_BUCKETS = [("<1h", 3600), ("1-4h", 4 * 3600), ("4-24h", 86400), ("1-3d", 3 * 86400), ("3-7d", 7 * 86400), (">7d", math.inf)]
+PERCENTILES = (50, 90, 95, 99)
+PRIORITIES = ["high", "medium", "low", "unspecified"]
+PRIORITY_CODES = {name: code for code, name in enumerate(PRIORITIES)}
+
+windows_table = models.AnalyticsWindow.__table__
+users = models.User.__table__
+SOURCES = [
+    (models.Ticket.__table__, models.TicketResponse.__table__),
+    (models.ArchivedTicket.__table__, models.ArchivedTicketResponse.__table__),
+]
+
+def week_start(value) -> datetime:
+    day = value.date() if isinstance(value, datetime) else value
+    return datetime.combine(day - timedelta(days=day.weekday()), time.min)
+
+def week_starts(weeks: int, until: Optional[date] = None) -> List[datetime]:
+    """The weeks-long run of windows ending with the one containing until (default today)."""
+    last = week_start(until or datetime.now())
+    return [last - WEEK * n for n in range(weeks - 1, -1, -1)]
+
+def is_settled(kind: str, start: datetime, now: datetime) -> bool:
+    grace = timedelta(days=ANALYTICS_SETTLE_DAYS) if kind == "tickets" else timedelta(days=1)
+    return start + WEEK + grace <= now
+
+def seconds(values) -> np.ndarray:
+    # Naive datetimes as float seconds since the epoch, nan for NULL
+    stamps = np.array(values, dtype="datetime64[us]")
+    result = stamps.astype(np.int64) / 1e6
+    result[np.isnat(stamps)] = np.nan
+    return result
+
+def extract(db: Session, query) -> List[list]:
+    """Runs query a chunk of rows at a time into one list per column."""
+    columns = [[] for _ in query.selected_columns]
+    result = db.execute(query.execution_options(yield_per=ANALYTICS_CHUNK_SIZE))
+    for chunk in result.partitions():
+        for column, values in zip(columns, zip(*chunk)):
+            column.extend(values)
+    return columns
+
+def histograms(durations: np.ndarray, groups: np.ndarray, group_count: int):
+    """Bucket counts per group (group_count x BUCKETS) and the groups' total seconds."""
+    buckets = np.clip(np.searchsorted(EDGES, np.maximum(durations, 1), side="right") - 1, 0, BUCKETS - 1)
+    counts = np.bincount(groups * BUCKETS + buckets, minlength=group_count * BUCKETS).reshape(group_count, BUCKETS)
+    return counts, np.bincount(groups, weights=durations, minlength=group_count)
+
+def pack(counts: np.ndarray, total: float) -> dict:
+    nonzero = np.flatnonzero(counts)
+    return {"n": int(counts.sum()), "sum": float(total), "b": nonzero.tolist(), "c": counts[nonzero].tolist()}
+
+def pack_groups(keys, counts: np.ndarray, totals: np.ndarray) -> Dict[str, dict]:
+    return {str(key): pack(counts[i], totals[i]) for i, key in enumerate(keys) if counts[i].any()}
+
+class Distribution:
+    """Merged histograms of one group of durations."""
+
+    def __init__(self):
+        self.counts = np.zeros(BUCKETS, dtype=np.int64)
+        self.total = 0.0
+
+    def add(self, packed: dict):
+        np.add.at(self.counts, packed["b"], packed["c"])
+        self.total += packed["sum"]
+
+    def summary(self) -> dict:
+        n = int(self.counts.sum())
+        if not n:
+            return {"count": 0}
+        cumulative = np.cumsum(self.counts)
+        result = {"count": n, "mean_hours": round(self.total / n / 3600, 3)}
+        for q in PERCENTILES:
+            rank = q / 100 * n
+            i = int(np.searchsorted(cumulative, rank))
+            # Geometric interpolation within the bucket, matching its log spacing
+            fraction = (rank - (cumulative[i] - self.counts[i])) / self.counts[i]
+            result[f"p{q}_hours"] = round(EDGES[i] * (EDGES[i + 1] / EDGES[i]) ** fraction / 3600, 3)
+        lower = 0
+        result["histogram"] = {}
+        for label, upper in REPORT_BUCKETS:
+            result["histogram"][label] = int(self.counts[(MIDPOINTS >= lower) & (MIDPOINTS < upper)].sum())
+            lower = upper
+        return result
+
+def compute_ticket_window(db: Session, start: datetime, end: datetime) -> dict:
+    tickets, responses = [[] for _ in range(5)], [[] for _ in range(3)]
+    for ticket_table, response_table in SOURCES:
+        in_window = (ticket_table.c.created_at >= start, ticket_table.c.created_at < end)
+        for column, values in zip(tickets, extract(db, select(
+            ticket_table.c.id, ticket_table.c.created_at, ticket_table.c.closed_at, ticket_table.c.priority, ticket_table.c.assignee_id
+        ).where(*in_window))):
+            column.extend(values)
+        for column, values in zip(responses, extract(db, select(
+            response_table.c.ticket_id, response_table.c.responder_id, response_table.c.timestamp
+        ).join(ticket_table, ticket_table.c.id == response_table.c.ticket_id).join(users, users.c.id == response_table.c.responder_id).where(
+            *in_window, users.c.role == models.UserRole.support_agent
+        ))):
+            column.extend(values)
+    ids = np.array(tickets[0], dtype=np.int64)
+    order = np.argsort(ids)
+    ids = ids[order]
+    created = seconds(tickets[1])[order]
+    closed = seconds(tickets[2])[order]
+    priority = np.array([PRIORITY_CODES[normalize_priority(p) or "unspecified"] for p in tickets[3]], dtype=np.int64)[order]
+    assignee = np.array([a if a is not None else -1 for a in tickets[4]], dtype=np.int64)[order]
+
+    # First agent response per ticket: sort by ticket then time, keep each ticket's first row
+    ticket_ids = np.array(responses[0], dtype=np.int64)
+    responders = np.array(responses[1], dtype=np.int64)
+    sent = seconds(responses[2])
+    by_ticket = np.lexsort((sent, ticket_ids))
+    _, firsts = np.unique(ticket_ids[by_ticket], return_index=True)
+    firsts = by_ticket[firsts]
+    positions = np.searchsorted(ids, ticket_ids[firsts])
+    first_response = np.maximum(sent[firsts] - created[positions], 0)
+    first_responder = responders[firsts]
+    answered = np.zeros(len(ids), dtype=bool)
+    answered[positions] = True
+    is_closed = ~np.isnan(closed)
+    to_close = np.maximum(closed[is_closed] - created[is_closed], 0)
+    closer = assignee[is_closed]
+
+    def by_priority(mask):
+        return {PRIORITIES[code]: int(n) for code, n in enumerate(np.bincount(priority[mask], minlength=len(PRIORITIES))) if n}
+
+    def by_agent(durations, agents):
+        keys, codes = np.unique(agents, return_inverse=True)
+        return pack_groups(keys.tolist(), *histograms(durations, codes.reshape(-1), len(keys)))
+
+    assigned = closer >= 0
+    return {
+        "created": by_priority(np.ones(len(ids), dtype=bool)),
+        "unanswered": by_priority(~answered),
+        "open": by_priority(~is_closed),
+        "first_response": {
+            "priority": pack_groups(PRIORITIES, *histograms(first_response, priority[positions], len(PRIORITIES))),
+            "agent": by_agent(first_response, first_responder),
+        },
+        "time_to_close": {
+            "priority": pack_groups(PRIORITIES, *histograms(to_close, priority[is_closed], len(PRIORITIES))),
+            "agent": by_agent(to_close[assigned], closer[assigned]),
+        },
+    }
+
+def compute_response_window(db: Session, start: datetime, end: datetime) -> dict:
+    responders = []
+    for _, response_table in SOURCES:
+        responders += extract(db, select(response_table.c.responder_id).join(users, users.c.id == response_table.c.responder_id).where(
+            response_table.c.timestamp >= start, response_table.c.timestamp < end, users.c.role == models.UserRole.support_agent
+        ))[0]
+    agents, counts = np.unique(np.array(responders, dtype=np.int64), return_counts=True)
+    return {"responses": {str(agent): int(n) for agent, n in zip(agents.tolist(), counts.tolist())}}
+
+COMPUTE = {"tickets": compute_ticket_window, "responses": compute_response_window}
+
+class ReportStats:
+    """Reports built by this process, their windows read from the cache or computed, and the time spent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reports = 0
+        self.windows_cached = 0
+        self.windows_computed = 0
+        self.seconds = 0.0
+
+    def record_windows(self, cached: int, computed: int):
+        with self._lock:
+            self.windows_cached += cached
+            self.windows_computed += computed
+
+    def record_report(self, elapsed: float):
+        with self._lock:
+            self.reports += 1
+            self.seconds += elapsed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"reports": self.reports, "windows_cached": self.windows_cached,
+                    "windows_computed": self.windows_computed, "seconds": round(self.seconds, 6)}
+
+stats = ReportStats()
+
+def store_window(db: Session, kind: str, start: datetime, payload: dict) -> None:
+    # Upsert: two reports may compute the same window at once
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(windows_table).values(kind=kind, window_start=start, payload=json.dumps(payload), computed_at=datetime.now())
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[windows_table.c.kind, windows_table.c.window_start],
+        set_={"payload": stmt.excluded.payload, "computed_at": stmt.excluded.computed_at}
+    ))
+
+def windows(db: Session, kind: str, starts: List[datetime]) -> Tuple[Dict[datetime, dict], int]:
+    """The payload of each window, and how many of them had to be computed."""
+    cached = {
+        row.window_start: json.loads(row.payload) for row in db.execute(
+            select(windows_table.c.window_start, windows_table.c.payload).where(windows_table.c.kind == kind, windows_table.c.window_start.in_(starts))
+        )
+    }
+    now = datetime.now()
+    result = {}
+    for start in starts:
+        if start in cached:
+            result[start] = cached[start]
+            continue
+        result[start] = COMPUTE[kind](db, start, start + WEEK)
+        if is_settled(kind, start, now):
+            store_window(db, kind, start, result[start])
+    db.commit()
+    stats.record_windows(len(cached), len(starts) - len(cached))
+    return result, len(starts) - len(cached)
+
+def add_counts(target: dict, counts: dict):
+    for key, n in counts.items():
+        target[key] = target.get(key, 0) + n
+
+def agent_names(db: Session, agent_ids: Iterable) -> Dict[str, str]:
+    ids = [int(agent_id) for agent_id in agent_ids]
+    if not ids:
+        return {}
+    return {str(row.id): row.name for row in db.execute(select(users.c.id, users.c.name).where(users.c.id.in_(ids)))}
+
+def sla_report(db: Session, starts: List[datetime], group_by: str = "priority") -> dict:
+    """First-response and time-to-close distributions by priority, week or agent."""
+    started = perf_counter()
+    ticket_windows, computed = windows(db, "tickets", starts)
+    groups = {}
+
+    def group(key):
+        return groups.setdefault(key, {"key": key, "created": 0, "unanswered": 0, "open": 0,
+                                       "first_response": Distribution(), "time_to_close": Distribution()})
+
+    for start, payload in ticket_windows.items():
+        if group_by == "agent":
+            for metric in ("first_response", "time_to_close"):
+                for agent, packed in payload[metric]["agent"].items():
+                    group(agent)[metric].add(packed)
+            continue
+        for priority in PRIORITIES:
+            entry = group(start.date().isoformat() if group_by == "week" else priority)
+            for metric in ("created", "unanswered", "open"):
+                entry[metric] += payload[metric].get(priority, 0)
+            for metric in ("first_response", "time_to_close"):
+                if priority in payload[metric]["priority"]:
+                    entry[metric].add(payload[metric]["priority"][priority])
+    names = agent_names(db, groups) if group_by == "agent" else {}
+    rows = []
+    for key, entry in groups.items():
+        row = {"key": key, "first_response": entry["first_response"].summary(), "time_to_close": entry["time_to_close"].summary()}
+        if group_by == "agent":
+            row["name"] = names.get(key)
+        else:
+            row.update(tickets=entry["created"], unanswered=entry["unanswered"], open=entry["open"])
+        if group_by != "priority" or row["tickets"]:
+            rows.append(row)
+    if group_by == "agent":
+        rows.sort(key=lambda row: -row["first_response"]["count"])
+    return report_envelope(starts, computed, started, group_by=group_by, groups=rows)
+
+def agent_report(db: Session, starts: List[datetime]) -> dict:
+    """Per agent: responses per week, first responses and closes, with their distributions."""
+    started = perf_counter()
+    ticket_windows, computed_tickets = windows(db, "tickets", starts)
+    response_windows, computed_responses = windows(db, "responses", starts)
+    agents = {}
+
+    def agent(key):
+        return agents.setdefault(key, {"responses": 0, "responses_by_week": {}, "first_response": Distribution(), "time_to_close": Distribution()})
+
+    for start, payload in response_windows.items():
+        for key, n in payload["responses"].items():
+            agent(key)["responses"] += n
+            agent(key)["responses_by_week"][start.date().isoformat()] = n
+    for payload in ticket_windows.values():
+        for metric in ("first_response", "time_to_close"):
+            for key, packed in payload[metric]["agent"].items():
+                agent(key)[metric].add(packed)
+    names = agent_names(db, agents)
+    rows = [{
+        "agent_id": int(key),
+        "name": names.get(key),
+        "responses": entry["responses"],
+        "responses_per_week": round(entry["responses"] / len(starts), 2),
+        "responses_by_week": entry["responses_by_week"],
+        "first_responses": int(entry["first_response"].counts.sum()),
+        "first_response": entry["first_response"].summary(),
+        "closed": int(entry["time_to_close"].counts.sum()),
+        "time_to_close": entry["time_to_close"].summary(),
+    } for key, entry in agents.items()]
+    rows.sort(key=lambda row: -row["responses"])
+    return report_envelope(starts, computed_tickets + computed_responses, started, agents=rows)
+
+def report_envelope(starts: List[datetime], computed: int, started: float, **body) -> dict:
+    elapsed = perf_counter() - started
+    stats.record_report(elapsed)
+    return {"start": starts[0].date().isoformat(), "end": (starts[-1] + WEEK).date().isoformat(), "weeks": len(starts),
+            "windows_computed": computed, "elapsed_ms": round(elapsed * 1000, 1), **body}
+
+def forget_windows(db: Session, created_at: Iterable[Optional[datetime]]) -> None:
+    """Drops the cached settled ticket windows holding tickets created at these times."""
+    now = datetime.now()
+    starts = {week_start(value) for value in created_at if value is not None}
+    starts = [start for start in starts if is_settled("tickets", start, now)]
+    if starts:
+        # On the connection: this also runs inside flushes, where the session can't autoflush
+        db.connection().execute(delete(windows_table).where(windows_table.c.kind == "tickets", windows_table.c.window_start.in_(starts)))
+
+@event.listens_for(Session, "after_flush")
+def _forget_changed_windows(session, flush_context):
+    changed = []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, models.TicketResponse):
+            obj = session.get(models.Ticket, obj.ticket_id)
+        if isinstance(obj, models.Ticket):
+            changed.append(obj.created_at)
+    # New tickets and replies to recent ones are in open windows, with nothing cached
+    settling = datetime.now() - timedelta(days=ANALYTICS_SETTLE_DAYS)
+    changed = [value for value in changed if value is not None and value < settling]
+    if changed:
+        forget_windows(session, changed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SLA and agent analytics window cache")
+    parser.add_argument("command", choices=["warm", "clear"])
+    parser.add_argument("--weeks", type=int, default=ANALYTICS_MAX_WEEKS)
+    args = parser.parse_args()
+    from database import SessionLocal
+    with SessionLocal() as db:
+        if args.command == "clear":
+            deleted = db.execute(delete(windows_table)).rowcount
+            db.commit()
+            print(f"Cleared {deleted} cached windows")
+        else:
+            started = perf_counter()
+            starts = week_starts(args.weeks)
+            for kind in COMPUTE:
+                windows(db, kind, starts)
+            print(f"Warmed {args.weeks} weeks in {perf_counter() - started:.1f}s")
@@ -0,0 +1,114 @@
+"""Moves long-closed tickets out of the hot tables into the archive tables.
+
+Tickets closed more than ARCHIVE_AFTER_DAYS ago are copied, with their
+responses, into archived_tickets / archived_ticket_responses and deleted from
+tickets / ticket_responses, one batch per transaction. Listings, dashboards
+and the work queue then only touch active history; /get_tickets?archived=true
+and the customer history's archived view read the archive tables on demand.
+Ticket counters keep counting archived tickets (see core.counters), and
+archived tickets keep their ids. Archived tickets drop out of full-text search.
+
+Archive tables were chosen over Postgres range partitioning on created_at:
+they work the same on SQLite, and a partitioned tickets table would need the
+partition key in its primary key and the search triggers rebuilt per partition.
+
+    python -m core.archive --days 90    # e.g. nightly from cron
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, false, insert, literal, literal_column, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import models
+from core import render_cache
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Seconds between archive runs in the app process; 0 disables them
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+
+tickets = models.Ticket.__table__
+responses = models.TicketResponse.__table__
+archived_tickets = models.ArchivedTicket.__table__
+archived_responses = models.ArchivedTicketResponse.__table__
+
+TICKET_COLUMNS = ["id", "user_id", "subject", "description", "priority", "status", "created_at", "assignee_id", "assigned_at", "closed_at", "category", "suggested_priority", "duplicate_of_id"]
+RESPONSE_COLUMNS = ["id", "ticket_id", "responder_id", "message", "timestamp"]
+
+@event.listens_for(models.Ticket.status, "set")
+def _track_closed_at(ticket, value, oldvalue, initiator):
+    closed = value in (models.TicketStatus.closed, models.TicketStatus.closed.value)
+    if closed and ticket.closed_at is None:
+        ticket.closed_at = datetime.now()
+    elif not closed:
+        ticket.closed_at = None
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archives up to batch_size tickets closed before cutoff; returns how many."""
+    query = select(tickets.c.id, tickets.c.user_id).where(
+        tickets.c.status == literal_column("'closed'"),
+        tickets.c.closed_at < cutoff
+    ).order_by(tickets.c.closed_at, tickets.c.id).limit(batch_size)
+    if db.get_bind().dialect.name == "postgresql":
+        # Concurrent archivers take different batches; a ticket being reopened waits
+        query = query.with_for_update(skip_locked=True)
+    else:
+        # Any write statement takes SQLite's RESERVED lock, even one matching no rows
+        db.execute(update(tickets).where(false()).values(id=tickets.c.id))
+    rows = db.execute(query).all()
+    if not rows:
+        db.rollback()
+        return 0
+    ids = [row.id for row in rows]
+    now = datetime.now()
+    db.execute(insert(archived_tickets).from_select(
+        TICKET_COLUMNS + ["archived_at"],
+        select(*(tickets.c[name] for name in TICKET_COLUMNS), literal(now, archived_tickets.c.archived_at.type)).where(tickets.c.id.in_(ids))
+    ))
+    db.execute(insert(archived_responses).from_select(
+        RESPONSE_COLUMNS,
+        select(*(responses.c[name] for name in RESPONSE_COLUMNS)).where(responses.c.ticket_id.in_(ids))
+    ))
+    db.execute(delete(responses).where(responses.c.ticket_id.in_(ids)))
+    db.execute(delete(tickets).where(tickets.c.id.in_(ids)))
+    # Core statements bypass the flush hooks, so name the pages that changed
+    scopes = {"all"} | {f"customer:{row.user_id}" for row in rows} | {f"ticket:{ticket_id}" for ticket_id in ids}
+    render_cache.mark_changed(db, *scopes)
+    db.commit()
+    return len(ids)
+
+def archive_closed(db: Session, days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archives every ticket closed more than days ago, batch by batch."""
+    cutoff = datetime.now() - timedelta(days=days)
+    total = 0
+    while (moved := archive_batch(db, cutoff, batch_size)):
+        total += moved
+    if total:
+        logger.info("Archived %d tickets closed before %s", total, cutoff.isoformat(sep=" ", timespec="seconds"))
+    return total
+
+def archive_with(session_factory) -> int:
+    with session_factory() as db:
+        return archive_closed(db)
+
+async def archive_periodically(session_factory, interval: int = ARCHIVE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(archive_with, session_factory)
+        except Exception:
+            logger.exception("Ticket archiving failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move long-closed tickets to the archive tables")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    from database import SessionLocal
+    with SessionLocal() as db:
+        print(f"Archived {archive_closed(db, args.days, args.batch_size)} tickets")
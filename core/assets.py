@@ -0,0 +1,220 @@
+"""Fingerprinted, precompressed copies of static/ for long-lived browser caching.
+
+The build minifies CSS, names every file after a hash of its content
+(style.css -> style.3f2a1b9c0d.css), writes .gz (and .br, with the brotli
+package installed) next to compressible files, and records the names in
+manifest.json under ASSET_BUILD_DIR. Templates link assets through
+asset_url("style.css"); AssetFiles serves the build at /assets with
+`immutable` cache headers and the smallest encoding the client accepts.
+A changed file gets a new name, so nothing is ever revalidated.
+
+The app builds at startup when the manifest is missing or static/ has changed
+since (ASSET_BUILD_ON_STARTUP); deploys can build ahead instead:
+
+    python -m core.assets build [--prune]
+
+Old fingerprinted files stay until --prune, so pages rendered before a deploy
+keep working. With ASSET_PIPELINE=false, asset_url() points at /static.
+"""
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSET_PIPELINE = os.getenv("ASSET_PIPELINE", "true").lower() == "true"
+ASSET_SOURCE_DIR = os.getenv("ASSET_SOURCE_DIR", os.path.join(ROOT, "static"))
+ASSET_BUILD_DIR = os.getenv("ASSET_BUILD_DIR", os.path.join(ROOT, "build", "static"))
+ASSET_BUILD_ON_STARTUP = os.getenv("ASSET_BUILD_ON_STARTUP", "true").lower() == "true"
+ASSET_URL_PREFIX = "/assets/"
+MANIFEST = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Leftovers that aren't assets: hidden files, patches and merge debris
+ASSET_IGNORE = [p for p in os.getenv("ASSET_IGNORE", ".*,*.patch,*.orig,*.rej,*.partial").split(",") if p]
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".xml", ".map"}
+# Preferred first when the client accepts both equally
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+CSS_TOKENS = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|/\*.*?\*/', re.S)
+
+def minify_css(text: str) -> str:
+    """Drops comments and redundant whitespace, leaving strings alone."""
+    out, last = [], 0
+
+    def squeeze(part):
+        part = re.sub(r"\s+", " ", part)
+        part = re.sub(r" ?([{};,>]) ?", r"\1", part)
+        return part.replace(": ", ":")
+
+    pending = ""
+    for match in CSS_TOKENS.finditer(text):
+        pending += text[last:match.start()]
+        last = match.end()
+        if match.group(1):
+            out += [squeeze(pending), match.group(1)]
+            pending = ""
+    out.append(squeeze(pending + text[last:]))
+    return "".join(out).replace(";}", "}").strip()
+
+MINIFIERS = {".css": minify_css}
+
+def compressors():
+    yield "gzip", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield "br", lambda data: brotli.compress(data, quality=11)
+
+def source_files(source: str, ignore: List[str] = ASSET_IGNORE) -> List[str]:
+    return sorted(
+        os.path.relpath(os.path.join(root, name), source).replace(os.sep, "/")
+        for root, _, names in os.walk(source) for name in names
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in ignore)
+    )
+
+def source_digest(source: str = ASSET_SOURCE_DIR) -> str:
+    digest = hashlib.sha256()
+    for name in source_files(source):
+        with open(os.path.join(source, name), "rb") as f:
+            digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()[:16]
+
+def write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Same content under the same name whoever writes it, so concurrent builds can't tear a file
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+
+def build(source: str = ASSET_SOURCE_DIR, target: str = ASSET_BUILD_DIR) -> dict:
+    files, encodings, sizes = {}, {}, {}
+    for name in source_files(source):
+        with open(os.path.join(source, name), "rb") as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        if ext in MINIFIERS:
+            data = MINIFIERS[ext](data.decode("utf-8")).encode("utf-8")
+        built = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+        files[name], encodings[built], sizes[built] = built, [], {"identity": len(data)}
+        if not os.path.exists(os.path.join(target, built)):
+            write_atomic(os.path.join(target, built), data)
+        if ext not in COMPRESSIBLE:
+            continue
+        for encoding, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                write_atomic(os.path.join(target, built + dict(ENCODINGS)[encoding]), compressed)
+                encodings[built].append(encoding)
+                sizes[built][encoding] = len(compressed)
+    manifest = {"source_digest": source_digest(source), "files": files, "encodings": encodings, "sizes": sizes}
+    write_atomic(os.path.join(target, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+def prune(manifest: dict, target: str = ASSET_BUILD_DIR) -> int:
+    """Deletes built files the manifest no longer names; returns how many."""
+    keep = {MANIFEST} | {built + suffix for built in manifest["encodings"] for suffix in [""] + [s for _, s in ENCODINGS]}
+    removed = 0
+    for name in source_files(target, ignore=[]):
+        if name not in keep:
+            os.remove(os.path.join(target, name))
+            removed += 1
+    return removed
+
+def read_manifest(target: str = ASSET_BUILD_DIR) -> Optional[dict]:
+    try:
+        with open(os.path.join(target, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+manifest: Optional[dict] = None
+
+def setup(source: str = ASSET_SOURCE_DIR, target: str = ASSET_BUILD_DIR, build_missing: bool = ASSET_BUILD_ON_STARTUP) -> bool:
+    """Loads the manifest, building first if it's missing or stale; False leaves asset_url() on /static."""
+    global manifest
+    current = read_manifest(target)
+    if build_missing and (current is None or current["source_digest"] != source_digest(source)):
+        try:
+            current = build(source, target)
+        except OSError:
+            logger.exception("Building static assets into %s failed; serving /static", target)
+            current = None
+    elif current is not None and current["source_digest"] != source_digest(source):
+        logger.warning("%s is out of date with %s; run python -m core.assets build", target, source)
+    manifest = current
+    return manifest is not None
+
+def asset_url(name: str) -> str:
+    name = name.lstrip("/")
+    if manifest is not None and name in manifest["files"]:
+        return ASSET_URL_PREFIX + manifest["files"][name]
+    return f"/static/{name}"
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token.strip().lower()] = quality
+    return accepted
+
+def choose_encoding(header: Optional[str], available: List[str]) -> Optional[str]:
+    """The best of the available encodings the Accept-Encoding header allows, or None for identity."""
+    if not header or not available:
+        return None
+    accepted = accepted_encodings(header)
+    best, best_quality = None, 0.0
+    for encoding, _ in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in available and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class AssetFiles(StaticFiles):
+    """Serves the build: precompressed variants by Accept-Encoding, cached for a year."""
+
+    async def get_response(self, path: str, scope: Scope):
+        name = path.replace(os.sep, "/").lstrip("/")
+        available = manifest["encodings"].get(name) if manifest is not None else None
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"), available or [])
+        response = await super().get_response(path + dict(ENCODINGS)[encoding] if encoding else path, scope)
+        if response.status_code in (200, 304) and available is not None:
+            response.headers["Cache-Control"] = IMMUTABLE
+            if available:
+                response.headers["Vary"] = "Accept-Encoding"
+            if encoding:
+                # The variant's Content-Type is already the original's: mimetypes reads x.css.gz as text/css + gzip
+                response.headers["Content-Encoding"] = encoding
+        return response
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprinted, precompressed static assets")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--prune", action="store_true", help="delete files from earlier builds")
+    args = parser.parse_args()
+    built = build()
+    total = {encoding: sum(sizes.get(encoding, sizes["identity"]) for sizes in built["sizes"].values()) for encoding in ("identity", "gzip", "br")}
+    print(f"Built {len(built['files'])} files into {ASSET_BUILD_DIR}: {total['identity']} bytes, {total['gzip']} gzipped, {total['br']} brotli")
+    if args.prune:
+        print(f"Pruned {prune(built)} files from earlier builds")
@@ -0,0 +1,232 @@
+"""Streaming bulk import and export of tickets, in bounded memory.
+
+Imports read CSV or NDJSON a chunk at a time, validate each row against
+schemas.TicketImport and insert the chunk in one statement (COPY on Postgres,
+executemany elsewhere). A named job commits its checkpoint with every chunk,
+so rerunning the same job resumes after the last committed row.
+
+    python -m core.bulk import tickets.csv --job legacy-crm
+    python -m core.bulk export tickets.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+import models, schemas, crud
+from core import analytics, counters, events, render_cache, work_queue
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "5000"))
+# Reports carry the first errors only; the counts cover every rejected row
+MAX_REPORTED_ERRORS = 100
+
+TICKET_COLUMNS = ["user_id", "subject", "description", "priority", "status", "created_at", "queue_due_at", "closed_at"]
+EXPORT_COLUMNS = ["id", "user_id", "subject", "description", "priority", "status", "created_at", "category", "suggested_priority", "duplicate_of_id", "responses"]
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+def format_for(filename: Optional[str]) -> str:
+    fmt = FORMATS.get(os.path.splitext(filename or "")[1].lower())
+    if fmt is None:
+        raise ValueError(f"can't tell the format of {filename!r}; use csv or ndjson")
+    return fmt
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[object]:
+    """Yields one dict per data row, or the exception for a row that can't be parsed."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            # Empty cells mean "not given"; cells past the header are ignored
+            yield {key: value for key, value in row.items() if key is not None and value not in ("", None)}
+    elif fmt == "ndjson":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield ValueError(f"invalid JSON: {exc}")
+    else:
+        raise ValueError(f"unsupported format {fmt!r}; use csv or ndjson")
+
+def row_error(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in exc.errors())
+    return str(exc)
+
+def validate_chunk(db: Session, raw_rows: List[object], first_row: int) -> Tuple[List[dict], List[dict]]:
+    parsed, errors = [], []
+    for row_number, raw in enumerate(raw_rows, start=first_row):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            parsed.append((row_number, schemas.TicketImport.model_validate(raw)))
+        except (ValidationError, ValueError) as exc:
+            errors.append({"row": row_number, "error": row_error(exc)})
+    # One query per chunk resolves every customer reference
+    emails = {ticket.customer_email for _, ticket in parsed if ticket.user_id is None}
+    ids = {ticket.user_id for _, ticket in parsed if ticket.user_id is not None}
+    by_email = dict(db.execute(select(models.User.email, models.User.id).where(models.User.email.in_(emails))).all()) if emails else {}
+    known_ids = set(db.scalars(select(models.User.id).where(models.User.id.in_(ids)))) if ids else set()
+    now = datetime.now()
+    rows = []
+    for row_number, ticket in parsed:
+        user_id = ticket.user_id if ticket.user_id is not None else by_email.get(ticket.customer_email)
+        if user_id is None or (ticket.user_id is not None and user_id not in known_ids):
+            errors.append({"row": row_number, "error": "unknown customer"})
+            continue
+        rows.append({
+            "user_id": user_id,
+            "subject": ticket.subject,
+            "description": ticket.description,
+            "priority": ticket.priority,
+            "status": models.TicketStatus(ticket.status.value),
+            "created_at": ticket.created_at or now,
+            "queue_due_at": work_queue.due_at(ticket.created_at or now, ticket.priority),
+            # Imported closed tickets have no close time; as in migration 0008 use created_at
+            "closed_at": (ticket.created_at or now) if ticket.status.value == "closed" else None,
+        })
+    return rows, sorted(errors, key=lambda error: error["row"])
+
+def copy_tickets(db: Session, rows: List[dict]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row["user_id"], row["subject"], row["description"], row["priority"], row["status"].name, row["created_at"].isoformat(sep=" "), row["queue_due_at"].isoformat(sep=" "), row["closed_at"].isoformat(sep=" ") if row["closed_at"] else None])
+    buffer.seek(0)
+    # The session's own DBAPI connection, so the COPY joins the chunk's transaction
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY tickets ({', '.join(TICKET_COLUMNS)}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (subject, description))",
+        buffer
+    )
+
+def insert_tickets(db: Session, rows: List[dict]) -> None:
+    if db.get_bind().dialect.name == "postgresql":
+        copy_tickets(db, rows)
+    else:
+        db.execute(insert(models.Ticket.__table__), rows)
+    deltas = Counter()
+    for row in rows:
+        deltas.update(counters.created_deltas(SimpleNamespace(**row)))
+    counters.bump(db, deltas)
+    render_cache.mark_changed(db, "all", *{f"customer:{row['user_id']}" for row in rows})
+    # Backdated rows change weeks whose reports may already be cached
+    analytics.forget_windows(db, (row["created_at"] for row in rows))
+    # One summary event per chunk rather than a delta per imported row
+    events.queue(db, {"type": "tickets_imported", "count": len(rows)})
+
+def import_tickets(
+    db: Session,
+    stream: TextIO,
+    fmt: str,
+    job: Optional[str] = None,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    progress=None
+) -> Dict:
+    """Imports every row of stream; returns a report shaped like schemas.ImportReport."""
+    checkpoint = db.get(models.ImportCheckpoint, job) if job else None
+    if job and checkpoint is None:
+        checkpoint = models.ImportCheckpoint(job=job, rows_read=0, imported=0, rejected=0)
+        db.add(checkpoint)
+    state = checkpoint or SimpleNamespace(rows_read=0, imported=0, rejected=0)
+    rows = read_rows(stream, fmt)
+    # Rows up to the checkpoint were committed by an earlier run of this job
+    for _ in islice(rows, state.rows_read):
+        pass
+    errors = []
+    read_now = 0
+    started = time.perf_counter()
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        valid, chunk_errors = validate_chunk(db, chunk, state.rows_read + 1)
+        if valid:
+            insert_tickets(db, valid)
+        state.rows_read += len(chunk)
+        state.imported += len(valid)
+        state.rejected += len(chunk_errors)
+        db.commit()
+        read_now += len(chunk)
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        if progress:
+            progress(state.rows_read, state.imported, state.rejected)
+    elapsed = time.perf_counter() - started
+    return {
+        "job": job,
+        "rows_read": state.rows_read,
+        "imported": state.imported,
+        "rejected": state.rejected,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(read_now / elapsed, 1) if elapsed else 0.0,
+    }
+
+def export_records(batch) -> List[dict]:
+    return [schemas.TicketResponseOut.model_validate(ticket).model_dump(mode="json") for ticket in batch]
+
+def export_chunks(db: Session, fmt: str, batch_size: int = BULK_CHUNK_SIZE, **filters) -> Iterator[Tuple[int, str]]:
+    """Yields (ticket count, text) per batch of tickets with their responses."""
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"unsupported format {fmt!r}; use csv or ndjson")
+    if fmt == "csv":
+        yield 0, ",".join(EXPORT_COLUMNS) + "\r\n"
+    for batch in crud.iter_ticket_batches(db, batch_size, **filters):
+        records = export_records(batch)
+        if fmt == "ndjson":
+            yield len(records), "".join(json.dumps(record) + "\n" for record in records)
+        else:
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+            for record in records:
+                writer.writerow(dict(record, responses=json.dumps(record["responses"])))
+            yield len(records), buffer.getvalue()
+
+def export_tickets(db: Session, out: TextIO, fmt: str, **filters) -> Dict:
+    exported = 0
+    started = time.perf_counter()
+    for count, text in export_chunks(db, fmt, **filters):
+        out.write(text)
+        exported += count
+    elapsed = time.perf_counter() - started
+    return {"exported": exported, "elapsed_s": round(elapsed, 3), "rows_per_s": round(exported / elapsed, 1) if elapsed else 0.0}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk ticket import and export")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="import tickets from a CSV or NDJSON file ('-' for stdin)")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=["csv", "ndjson"])
+    importer.add_argument("--job", help="checkpoint name; rerun with the same name to resume")
+    importer.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    exporter = commands.add_parser("export", help="export tickets with responses ('-' for stdout)")
+    exporter.add_argument("path")
+    exporter.add_argument("--format", choices=["csv", "ndjson"])
+    args = parser.parse_args(argv)
+    fmt = args.format or format_for(args.path)
+
+    from database import SessionLocal
+    with SessionLocal() as db:
+        if args.command == "import":
+            def progress(rows_read, imported, rejected):
+                print(f"read {rows_read}, imported {imported}, rejected {rejected}", file=sys.stderr)
+            stream = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+            with stream:
+                report = import_tickets(db, stream, fmt, job=args.job, chunk_size=args.chunk_size, progress=progress)
+        else:
+            out = sys.stdout if args.path == "-" else open(args.path, "w", newline="", encoding="utf-8")
+            with out:
+                report = export_tickets(db, out, fmt)
+    print(json.dumps(report), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
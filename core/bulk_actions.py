@@ -0,0 +1,150 @@
+"""Status changes and canned replies applied to many tickets in one transaction.
+
+The per-ticket routes load a ticket, change it through the ORM and commit, a
+few round trips per ticket. Here the targets are selected once (locked on
+PostgreSQL), then one UPDATE sets every status and one INSERT ... SELECT adds
+every reply. What the ORM hooks do for single tickets is done here for the
+whole set: counters, closed_at, ticket events, reply notification jobs,
+render cache scopes and cached analytics windows.
+
+A call covers at most BULK_ACTION_MAX_TICKETS tickets. A filter matching more
+applies to the oldest that many and reports `more`, so the caller repeats it.
+"""
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import false, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+import models
+from core import analytics, counters, events, jobs, render_cache
+from core.identity import UserIdentity
+
+BULK_ACTION_MAX_TICKETS = int(os.getenv("BULK_ACTION_MAX_TICKETS", "500"))
+
+tickets = models.Ticket.__table__
+responses = models.TicketResponse.__table__
+
+FILTER_COLUMNS = {
+    "status": tickets.c.status,
+    "priority": tickets.c.priority,
+    "customer_id": tickets.c.user_id,
+    "category": tickets.c.category,
+    "duplicate_of_id": tickets.c.duplicate_of_id,
+}
+
+def select_targets(
+    db: Session, ticket_ids: Optional[List[int]] = None, filters: Optional[Dict] = None,
+    owner_id: Optional[int] = None, limit: int = BULK_ACTION_MAX_TICKETS
+) -> Tuple[list, dict]:
+    """The tickets to act on, locked for the transaction, and what was left out and why."""
+    query = select(
+        tickets.c.id, tickets.c.user_id, tickets.c.status, tickets.c.created_at, tickets.c.assignee_id
+    ).order_by(tickets.c.id)
+    if ticket_ids is not None:
+        ticket_ids = list(dict.fromkeys(ticket_ids))
+        if len(ticket_ids) > limit:
+            raise ValueError(f"At most {limit} tickets per request")
+        query = query.where(tickets.c.id.in_(ticket_ids))
+    else:
+        for name, value in (filters or {}).items():
+            if value is not None:
+                query = query.where(FILTER_COLUMNS[name] == value)
+        if owner_id is not None:
+            query = query.where(tickets.c.user_id == owner_id)
+        query = query.limit(limit + 1)
+    if db.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update()
+    else:
+        # Any write statement takes SQLite's RESERVED lock, even one matching no rows
+        db.execute(update(tickets).where(false()).values(id=tickets.c.id))
+    rows = db.execute(query).all()
+    skipped = {"not_found": [], "forbidden": [], "more": False}
+    if ticket_ids is not None:
+        found = {row.id for row in rows}
+        skipped["not_found"] = [ticket_id for ticket_id in ticket_ids if ticket_id not in found]
+        if owner_id is not None:
+            skipped["forbidden"] = [row.id for row in rows if row.user_id != owner_id]
+            rows = [row for row in rows if row.user_id == owner_id]
+    elif len(rows) > limit:
+        rows, skipped["more"] = rows[:limit], True
+    return rows, skipped
+
+def mark_changed(db: Session, rows: list) -> None:
+    render_cache.mark_changed(db, "all", *(f"ticket:{row.id}" for row in rows), *{f"customer:{row.user_id}" for row in rows})
+    analytics.forget_windows(db, (row.created_at for row in rows))
+
+def set_status(db: Session, rows: list, status: models.TicketStatus) -> List[int]:
+    """Moves the rows to status with one UPDATE; returns the ids that changed."""
+    status = models.TicketStatus(status)
+    changed = [row for row in rows if models.TicketStatus(row.status) != status]
+    if not changed:
+        return []
+    now = datetime.now()
+    # closed_at as core.archive's attribute hook keeps it: set on closing, cleared on reopening
+    closed_at = func.coalesce(tickets.c.closed_at, now) if status == models.TicketStatus.closed else None
+    db.execute(update(tickets).where(tickets.c.id.in_([row.id for row in changed])).values(status=status, closed_at=closed_at))
+    deltas = Counter()
+    for row in changed:
+        deltas.update(counters.status_deltas(row.status, status, row.created_at))
+        events.queue(db, {
+            "type": "ticket_status",
+            "ticket_id": row.id,
+            "customer_id": row.user_id,
+            "status": status.value,
+            "old_status": models.TicketStatus(row.status).value,
+            "assignee_id": row.assignee_id,
+        })
+    counters.bump(db, dict(deltas))
+    mark_changed(db, changed)
+    return [row.id for row in changed]
+
+def add_responses(db: Session, rows: list, responder_id: int, message: str) -> List[int]:
+    """Adds the same reply to every row with one INSERT ... SELECT; returns the new response ids."""
+    if not rows:
+        return []
+    now = datetime.now()
+    by_id = {row.id: row for row in rows}
+    added = db.execute(
+        insert(responses).from_select(
+            ["ticket_id", "responder_id", "message", "timestamp"],
+            select(
+                tickets.c.id, literal(responder_id, responses.c.responder_id.type),
+                literal(message, responses.c.message.type), literal(now, responses.c.timestamp.type)
+            ).where(tickets.c.id.in_(list(by_id))).order_by(tickets.c.id)
+        ).returning(responses.c.id, responses.c.ticket_id)
+    ).all()
+    counters.bump(db, {counters.TOTAL_RESPONSES: len(added)})
+    # One notification per reply, committed with them, as add_ticket_response does
+    jobs.enqueue_many(db, "ticket_response", ({"response_id": response.id} for response in added))
+    for response in added:
+        events.queue(db, {
+            "type": "ticket_response",
+            "ticket_id": response.ticket_id,
+            "customer_id": by_id[response.ticket_id].user_id,
+            "response_id": response.id,
+            "responder_id": responder_id,
+            "message": message,
+            "timestamp": now.isoformat(),
+        })
+    mark_changed(db, rows)
+    return [response.id for response in added]
+
+def apply(
+    db: Session, actor: UserIdentity, ticket_ids: Optional[Iterable[int]] = None, filters: Optional[Dict] = None,
+    status: Optional[models.TicketStatus] = None, message: Optional[str] = None, limit: int = BULK_ACTION_MAX_TICKETS
+) -> dict:
+    """Replies to and/or sets the status of the selected tickets, all in one transaction.
+
+    Authorization is checked per ticket as on the single-ticket routes: agents
+    may act on any ticket, customers may only reply to their own. Changing
+    status is for agents, and the router checks that.
+    """
+    if status is None and not message:
+        raise ValueError("Nothing to do: give a status or a message")
+    owner_id = None if actor.role == models.UserRole.support_agent else actor.id
+    rows, skipped = select_targets(db, list(ticket_ids) if ticket_ids is not None else None, filters, owner_id, limit)
+    added = add_responses(db, rows, actor.id, message) if message else []
+    changed = set_status(db, rows, status) if status is not None else []
+    db.commit()
+    return {"matched": [row.id for row in rows], "status_changed": changed, "responses_added": len(added), **skipped}
@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import models
+from core.identity import UserIdentity
+
+try:
+    import redis
+except ImportError:  # optional: only needed for USER_CACHE_BACKEND=redis with a real server
+    redis = None
+
+# "memory" is per process; "redis" is shared between workers (REDIS_URL, or an
+# in-process stand-in when unset)
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Cached "no such user" marker, distinct from a cache miss
+NOT_FOUND = object()
+_MISS = object()
+
+class TTLCache:
+    """Thread-safe LRU with a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISS
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class LocalRedis:
+    """In-process stand-in for the subset of the redis client API used here."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value if isinstance(value, bytes) else str(value).encode(), time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data.get(key, (b"0", None))[0]) + 1
+            self._data[key] = (str(value).encode(), None)
+            return value
+
+# The generation lookup and the read or write it selects, in one round trip.
+# The entry's key is derived on the server, so it can't be passed in KEYS.
+CACHE_GET_LUA = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+return redis.call('GET', ARGV[1] .. ':' .. generation .. ':' .. ARGV[2])
+"""
+CACHE_SET_LUA = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+return redis.call('SET', ARGV[1] .. ':' .. generation .. ':' .. ARGV[2], ARGV[3], 'EX', ARGV[4])
+"""
+
+class RedisCache:
+    """TTLCache-compatible wrapper over a redis client, storing JSON values.
+
+    clear() bumps a generation number that is part of every key, so it does not
+    need to enumerate keys on a shared server.
+    """
+
+    def __init__(self, client, ttl: float, prefix: str):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._generation_key = f"{prefix}:generation"
+        # The in-process stand-in can't run scripts; its two lookups never leave the process
+        scripts = hasattr(client, "register_script")
+        self._get_script = client.register_script(CACHE_GET_LUA) if scripts else None
+        self._set_script = client.register_script(CACHE_SET_LUA) if scripts else None
+
+    def _key(self, key, generation=None):
+        if generation is None:
+            generation = int(self.client.get(self._generation_key) or 0)
+        return f"{self.prefix}:{generation}:{key}"
+
+    def get(self, key):
+        if self._get_script is not None:
+            raw = self._get_script(keys=[self._generation_key], args=[self.prefix, key])
+        else:
+            raw = self.client.get(self._key(key))
+        return _MISS if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        ttl = max(1, int(self.ttl))
+        if self._set_script is not None:
+            self._set_script(keys=[self._generation_key], args=[self.prefix, key, json.dumps(value), ttl])
+        else:
+            self.client.set(self._key(key), json.dumps(value), ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            generation = int(self.client.get(self._generation_key) or 0)
+            self.client.delete(*(self._key(key, generation) for key in keys))
+
+    def clear(self):
+        self.client.incr(self._generation_key)
+
+def redis_client():
+    if REDIS_URL and redis is not None:
+        return redis.Redis.from_url(REDIS_URL)
+    return LocalRedis()
+
+class UserCache:
+    """User identities keyed by email and by id, with hit/miss counters."""
+
+    def __init__(self, backend, cache_absent: bool = True):
+        self.backend = backend
+        # A per-process cache never hears of a registration on another worker,
+        # so only a shared backend may remember that an email has no user
+        self.cache_absent = cache_absent
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _encode(self, identity):
+        return None if identity is None else identity.to_dict()
+
+    def _lookup(self, key):
+        value = self.backend.get(key)
+        if value is _MISS:
+            self.misses += 1
+            return _MISS
+        self.hits += 1
+        return NOT_FOUND if value is None else UserIdentity.from_dict(value)
+
+    def get_by_email(self, email):
+        """Returns a UserIdentity, NOT_FOUND for a cached absence, or None on a miss."""
+        value = self._lookup(f"email:{email}")
+        return None if value is _MISS else value
+
+    def get_by_id(self, user_id):
+        value = self._lookup(f"id:{user_id}")
+        return None if value is _MISS else value
+
+    def store(self, email, identity):
+        # identity None caches the absence of a user with this email
+        if identity is None and not self.cache_absent:
+            return
+        self.backend.set(f"email:{email}", self._encode(identity))
+        if identity is not None:
+            self.backend.set(f"id:{identity.id}", self._encode(identity))
+
+    def invalidate(self, email=None, user_id=None):
+        keys = ([f"email:{email}"] if email else []) + ([f"id:{user_id}"] if user_id is not None else [])
+        self.backend.delete(*keys)
+        self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": USER_CACHE_BACKEND,
+            "ttl_seconds": USER_CACHE_TTL,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+        }
+
+if USER_CACHE_BACKEND == "redis":
+    user_cache = UserCache(RedisCache(redis_client(), USER_CACHE_TTL, prefix="user_cache"))
+else:
+    user_cache = UserCache(TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL), cache_absent=False)
+
+# Invalidation: collect the users touched by each flush or bulk statement and
+# drop them once the transaction commits. This covers registration (a cached
+# "not found"), role changes and deletes made through any Session.
+
+CACHED_ATTRIBUTES = ("name", "email", "role")
+
+@event.listens_for(Session, "after_flush")
+def _collect_user_changes(session, flush_context):
+    pending = session.info.setdefault("user_cache_invalidate", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, models.User):
+            continue
+        state = inspect(obj)
+        if obj in session.dirty and not any(state.attrs[name].history.has_changes() for name in CACHED_ATTRIBUTES):
+            continue
+        pending.add((obj.email, obj.id))
+        for old_email in state.attrs.email.history.deleted or ():
+            pending.add((old_email, obj.id))
+
+# Bulk UPDATE/DELETE statements don't say which rows they touched
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _collect_bulk_user_changes(context):
+    if context.mapper.class_ is models.User:
+        context.session.info["user_cache_clear"] = True
+
+@event.listens_for(Session, "after_commit")
+def _apply_user_invalidations(session):
+    if session.info.pop("user_cache_clear", False):
+        user_cache.clear()
+    for email, user_id in session.info.pop("user_cache_invalidate", ()):
+        user_cache.invalidate(email=email, user_id=user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_invalidations(session):
+    session.info.pop("user_cache_clear", None)
+    session.info.pop("user_cache_invalidate", None)
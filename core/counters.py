@@ -0,0 +1,164 @@
+"""Ticket counters maintained alongside writes, so dashboards never aggregate tickets.
+
+Each counter is one row in ticket_counters. crud bumps them in the same
+transaction as the ticket change; reconcile() recomputes them from the
+tickets and archive tables to repair any drift (raw SQL edits, bulk
+statements).
+
+    python -m core.counters    # reconcile once, e.g. from cron
+"""
+import asyncio
+import calendar
+import logging
+import os
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import select, update, func, false, cast, text, BigInteger
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import models
+from core import render_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reconciliation runs in the app process; 0 disables them
+COUNTER_RECONCILE_INTERVAL = int(os.getenv("COUNTER_RECONCILE_INTERVAL", "3600"))
+
+TOTAL_TICKETS = "tickets"
+TOTAL_RESPONSES = "responses"
+# Sum of created_at (epoch seconds) over tickets that are not closed; divided
+# by the backlog size it gives the mean backlog age without a scan
+BACKLOG_CREATED_SUM = "backlog_created_at_sum"
+
+counters_table = models.TicketCounter.__table__
+
+def status_key(status) -> str:
+    return f"status:{models.TicketStatus(status).value}"
+
+def priority_key(priority) -> str:
+    return f"priority:{priority or 'none'}"
+
+def epoch(value: datetime) -> int:
+    # created_at is naive; treat it as UTC on both sides so SQL and Python agree
+    return calendar.timegm(value.timetuple()) if value else 0
+
+def epoch_column(dialect_name: str, column):
+    if dialect_name == "postgresql":
+        return cast(func.floor(func.extract("epoch", column)), BigInteger)
+    return cast(func.strftime("%s", column), BigInteger)
+
+def bump(db: Session, deltas: Dict[str, int]) -> None:
+    """Adds deltas to the named counters inside the caller's transaction."""
+    rows = [{"name": name, "value": delta} for name, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    # Atomic upsert; sorted names keep row-lock order fixed across transactions
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(counters_table).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[counters_table.c.name],
+        set_={"value": counters_table.c.value + stmt.excluded.value}
+    ))
+
+def created_deltas(ticket: models.Ticket) -> Dict[str, int]:
+    deltas = {TOTAL_TICKETS: 1, status_key(ticket.status): 1, priority_key(ticket.priority): 1}
+    if models.TicketStatus(ticket.status) != models.TicketStatus.closed:
+        deltas[BACKLOG_CREATED_SUM] = epoch(ticket.created_at)
+    return deltas
+
+def status_change_deltas(ticket: models.Ticket, old_status) -> Dict[str, int]:
+    return status_deltas(old_status, ticket.status, ticket.created_at)
+
+def status_deltas(old_status, new_status, created_at: datetime) -> Dict[str, int]:
+    old, new = models.TicketStatus(old_status), models.TicketStatus(new_status)
+    if old == new:
+        return {}
+    deltas = {status_key(old): -1, status_key(new): 1}
+    if old == models.TicketStatus.closed:
+        deltas[BACKLOG_CREATED_SUM] = epoch(created_at)
+    elif new == models.TicketStatus.closed:
+        deltas[BACKLOG_CREATED_SUM] = -epoch(created_at)
+    return deltas
+
+def read_counters(db: Session) -> Dict[str, int]:
+    return dict(db.execute(select(counters_table.c.name, counters_table.c.value)).all())
+
+def summarize(values: Dict[str, int], now: datetime = None) -> dict:
+    by_status = {status.value: values.get(status_key(status), 0) for status in models.TicketStatus}
+    by_priority = {name.split(":", 1)[1]: value for name, value in sorted(values.items()) if name.startswith("priority:") and value}
+    backlog = by_status["open"] + by_status["in_progress"]
+    age = epoch(now or datetime.now()) - values.get(BACKLOG_CREATED_SUM, 0) / backlog if backlog else None
+    return {
+        "total_tickets": values.get(TOTAL_TICKETS, 0),
+        "total_responses": values.get(TOTAL_RESPONSES, 0),
+        "by_status": by_status,
+        "by_priority": by_priority,
+        "backlog": backlog,
+        "backlog_avg_age_hours": round(age / 3600, 1) if age is not None else None,
+    }
+
+def actual_counters(db: Session) -> Dict[str, int]:
+    dialect_name = db.get_bind().dialect.name
+    ticket = models.Ticket
+    values = {
+        TOTAL_TICKETS: db.scalar(select(func.count()).select_from(ticket)),
+        TOTAL_RESPONSES: db.scalar(select(func.count()).select_from(models.TicketResponse)),
+        BACKLOG_CREATED_SUM: db.scalar(
+            select(func.coalesce(func.sum(epoch_column(dialect_name, ticket.created_at)), 0))
+            .where(ticket.status != models.TicketStatus.closed)
+        ),
+    }
+    for status, count in db.execute(select(ticket.status, func.count()).group_by(ticket.status)):
+        values[status_key(status)] = count
+    for priority, count in db.execute(select(ticket.priority, func.count()).group_by(ticket.priority)):
+        values[priority_key(priority)] = values.get(priority_key(priority), 0) + count
+    # Archived tickets (all closed, see core.archive) still count toward the totals
+    archived = models.ArchivedTicket
+    values[TOTAL_RESPONSES] += db.scalar(select(func.count()).select_from(models.ArchivedTicketResponse))
+    for status, count in db.execute(select(archived.status, func.count()).group_by(archived.status)):
+        values[TOTAL_TICKETS] += count
+        values[status_key(status)] = values.get(status_key(status), 0) + count
+    for priority, count in db.execute(select(archived.priority, func.count()).group_by(archived.priority)):
+        values[priority_key(priority)] = values.get(priority_key(priority), 0) + count
+    return values
+
+def lock_counters(db: Session) -> None:
+    # Hold off concurrent bumps until the corrected values are committed
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE ticket_counters IN EXCLUSIVE MODE"))
+    else:
+        # Any write statement takes SQLite's RESERVED lock, even one matching no rows
+        db.execute(update(counters_table).where(false()).values(value=counters_table.c.value))
+
+def reconcile(db: Session) -> Dict[str, int]:
+    """Rewrites drifted counters from the ticket tables; returns the corrections made."""
+    lock_counters(db)
+    stored = read_counters(db)
+    actual = actual_counters(db)
+    corrections = {name: actual.get(name, 0) - stored.get(name, 0) for name in set(stored) | set(actual)}
+    corrections = {name: delta for name, delta in corrections.items() if delta}
+    bump(db, corrections)
+    if corrections:
+        # The agent dashboard shows these counts
+        render_cache.mark_changed(db, "all")
+    db.commit()
+    if corrections:
+        logger.warning("Ticket counters drifted, corrected: %s", corrections)
+    return corrections
+
+def reconcile_with(session_factory) -> Dict[str, int]:
+    with session_factory() as db:
+        return reconcile(db)
+
+async def reconcile_periodically(session_factory, interval: int = COUNTER_RECONCILE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(reconcile_with, session_factory)
+        except Exception:
+            logger.exception("Ticket counter reconciliation failed")
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    print(reconcile_with(SessionLocal))
@@ -0,0 +1,409 @@
+"""Near-duplicate tickets: MinHash signatures in an LSH index.
+
+A ticket's subject + description is cut into shingles of DUPLICATE_SHINGLE
+consecutive words, and the shingle set is summarised by a MinHash signature of
+DUPLICATE_PERMUTATIONS values. The share of positions at which two signatures
+agree estimates the Jaccard similarity of the two sets. Signatures are cut
+into DUPLICATE_BANDS bands; tickets that agree on a whole band are candidates,
+and a candidate whose estimated similarity reaches DUPLICATE_THRESHOLD is a
+duplicate. With 128 values in 32 bands of 4, a pair at similarity 0.6 becomes
+a candidate 99% of the time, one at 0.5 87% and one at 0.2 5%. Rewording a
+tenth of a ticket's words leaves about 0.6 of its two-word shingles.
+
+The index lives in each process's memory: signatures in a numpy array and
+every band hash in one sorted array for binary search, with the newest
+tickets' band hashes in a dict until the next merge. Every check first
+catches up from the database (tickets past the last indexed id, plus any
+lower ids that weren't committed yet last time), so all workers see every
+committed ticket. create_ticket links a new ticket to its most similar
+earlier one in tickets.duplicate_of_id. The link may point at a ticket that
+has since been archived; archiving keeps ticket ids.
+
+The index is saved to DUPLICATE_INDEX_PATH every DUPLICATE_SAVE_INTERVAL
+seconds and at shutdown, and loaded at startup, which then only has to catch
+up on tickets created since the save.
+
+    python -m core.duplicates cluster    # link duplicates across the whole backlog
+    python -m core.duplicates build      # rebuild the saved index from scratch
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy import bindparam, or_, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import models
+from core import render_cache
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_DETECTION = os.getenv("DUPLICATE_DETECTION", "true").lower() == "true"
+DUPLICATE_INDEX_PATH = os.getenv("DUPLICATE_INDEX_PATH", "duplicate_index.npz")
+DUPLICATE_PERMUTATIONS = int(os.getenv("DUPLICATE_PERMUTATIONS", "128"))
+DUPLICATE_BANDS = int(os.getenv("DUPLICATE_BANDS", "32"))
+DUPLICATE_SHINGLE = int(os.getenv("DUPLICATE_SHINGLE", "2"))
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.5"))
+# Seconds between saves of the index in the app process; 0 saves only at shutdown
+DUPLICATE_SAVE_INTERVAL = int(os.getenv("DUPLICATE_SAVE_INTERVAL", "300"))
+# New tickets whose band hashes wait in a dict before being merged into the sorted array
+DUPLICATE_TAIL_MAX = int(os.getenv("DUPLICATE_TAIL_MAX", "4096"))
+# How long ids skipped by a catch-up are watched for a late commit, and how many at most
+DUPLICATE_GAP_SECONDS = 60
+DUPLICATE_GAP_MAX = 1000
+SEED = 1
+
+EMPTY = np.uint32(0xFFFFFFFF)
+# Shingles hashed per block when signing; the (shingles x permutations) scratch array stays in cache
+SIGN_BLOCK = 1024
+SHINGLE_PRIME = np.uint64(1099511628211)
+WORD = re.compile(r"[a-z0-9]+")
+
+tickets = models.Ticket.__table__
+
+def ticket_text(subject: Optional[str], description: Optional[str]) -> str:
+    return f"{subject or ''}\n{description or ''}"
+
+class DuplicateStats:
+    """Checks, links, catch-ups and index load/save times in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.check_seconds = 0.0
+        self.links = 0
+        self.caught_up = 0
+        self.load_seconds = 0.0
+        self.saves = 0
+        self.save_seconds = 0.0
+
+    def record_check(self, elapsed: float, linked: bool):
+        with self._lock:
+            self.checks += 1
+            self.check_seconds += elapsed
+            self.links += linked
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "indexed": index.count,
+                "checks": self.checks,
+                "check_avg_ms": round(self.check_seconds / self.checks * 1000, 4) if self.checks else None,
+                "links": self.links,
+                "caught_up": self.caught_up,
+                "load_seconds": round(self.load_seconds, 6),
+                "saves": self.saves,
+                "save_seconds": round(self.save_seconds, 6),
+            }
+
+class DuplicateIndex:
+    def __init__(self, permutations: int = DUPLICATE_PERMUTATIONS, bands: int = DUPLICATE_BANDS,
+                 shingle: int = DUPLICATE_SHINGLE, threshold: float = DUPLICATE_THRESHOLD):
+        if permutations % bands:
+            raise ValueError("DUPLICATE_PERMUTATIONS must be a multiple of DUPLICATE_BANDS")
+        self.permutations, self.bands, self.shingle, self.threshold = permutations, bands, shingle, threshold
+        self.rows = permutations // bands
+        # Fixed seed: signatures must mean the same in every process and in saved indexes
+        rng = np.random.default_rng(SEED)
+        self.a = rng.integers(0, 1 << 63, size=permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=permutations, dtype=np.uint64)
+        self.mixers = rng.integers(0, 1 << 63, size=self.rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        # Band keys carry their band number in the top bits, so all bands share one sorted array
+        self.band_bits = np.uint64(max((bands - 1).bit_length(), 1))
+        self.band_tags = np.arange(bands, dtype=np.uint64) << (np.uint64(64) - self.band_bits)
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.signatures = np.empty((0, self.permutations), dtype=np.uint32)
+        # Band keys of all rows but the newest, sorted, and the row each came from
+        self.sorted_keys = np.empty(0, dtype=np.uint64)
+        self.sorted_rows = np.empty(0, dtype=np.int64)
+        # The newest rows' band keys, until the next merge
+        self.tail = {}
+        self.tail_rows = 0
+        self.last_id = 0
+        self.gaps = {}
+        self.dirty = False
+
+    def shingles(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """32-bit hashes of every run of `shingle` words (or of the whole text, if shorter), and the text each came from."""
+        words = [WORD.findall(text.lower()) for text in texts]
+        lengths = np.array([len(text) for text in words], dtype=np.int64)
+        hashes = np.fromiter((zlib.crc32(word.encode()) for text in words for word in text), dtype=np.uint64, count=int(lengths.sum()))
+        owners = np.repeat(np.arange(len(texts)), lengths)
+        offsets = np.arange(len(hashes)) - (np.cumsum(lengths) - lengths)[owners]
+        combined = hashes.copy()
+        for j in range(1, self.shingle):
+            following = np.zeros_like(hashes)
+            following[:len(hashes) - j] = hashes[j:]
+            following[offsets + j >= lengths[owners]] = 0
+            combined = combined * SHINGLE_PRIME + following
+        keep = offsets <= np.maximum(lengths - self.shingle, 0)[owners]
+        combined = combined[keep]
+        return (combined ^ (combined >> np.uint64(32))) & np.uint64(0xFFFFFFFF), owners[keep]
+
+    def sign(self, texts: List[str]) -> np.ndarray:
+        """MinHash signatures, one row per text; a text without words gets all EMPTY."""
+        shingles, owners = self.shingles(texts)
+        signatures = np.full((len(texts), self.permutations), EMPTY, dtype=np.uint32)
+        for first in range(0, len(shingles), SIGN_BLOCK):
+            block, block_owners = shingles[first:first + SIGN_BLOCK], owners[first:first + SIGN_BLOCK]
+            # Multiply-add-shift hashing, one hash function per permutation; repeated shingles don't change a minimum
+            values = np.multiply.outer(block, self.a)
+            values += self.b
+            values >>= np.uint64(32)
+            starts = np.flatnonzero(np.r_[True, block_owners[1:] != block_owners[:-1]])
+            docs = block_owners[starts]
+            # A text can straddle two blocks
+            signatures[docs] = np.minimum(signatures[docs], np.minimum.reduceat(values, starts, axis=0))
+        return signatures
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        banded = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return ((banded * self.mixers).sum(axis=2) >> self.band_bits) | self.band_tags
+
+    def add(self, ids: np.ndarray, signatures: np.ndarray):
+        keep = ~(signatures == EMPTY).all(axis=1)
+        ids, signatures = ids[keep], signatures[keep]
+        keys = self.band_keys(signatures)
+        with self.lock:
+            needed = self.count + len(ids)
+            if needed > len(self.ids):
+                capacity = max(needed, 2 * len(self.ids), 1024)
+                self.ids = np.resize(self.ids, capacity)
+                self.signatures = np.resize(self.signatures, (capacity, self.permutations))
+            self.ids[self.count:needed] = ids
+            self.signatures[self.count:needed] = signatures
+            if len(ids) > DUPLICATE_TAIL_MAX:
+                # Large batches (a first build, a catch-up after downtime) go straight into the sorted keys
+                self.merge()
+                self.insert(keys.ravel(), np.repeat(np.arange(self.count, needed), self.bands))
+            else:
+                for row, row_keys in enumerate(keys.tolist(), start=self.count):
+                    for key in row_keys:
+                        self.tail.setdefault(key, []).append(row)
+                self.tail_rows += len(ids)
+            self.count = needed
+            self.dirty = True
+            if self.tail_rows > DUPLICATE_TAIL_MAX:
+                self.merge()
+
+    def merge(self):
+        with self.lock:
+            if self.tail:
+                keys = np.fromiter((key for key, rows in self.tail.items() for _ in rows), dtype=np.uint64)
+                rows = np.fromiter((row for rows in self.tail.values() for row in rows), dtype=np.int64, count=len(keys))
+                self.insert(keys, rows)
+            self.tail = {}
+            self.tail_rows = 0
+
+    def insert(self, keys: np.ndarray, rows: np.ndarray):
+        # A sort of the new keys and one linear merge into the sorted ones
+        order = np.argsort(keys, kind="stable")
+        positions = np.searchsorted(self.sorted_keys, keys[order], "right")
+        self.sorted_keys = np.insert(self.sorted_keys, positions, keys[order])
+        self.sorted_rows = np.insert(self.sorted_rows, positions, rows[order])
+
+    def candidates(self, keys: np.ndarray) -> np.ndarray:
+        lows = np.searchsorted(self.sorted_keys, keys, "left")
+        highs = np.searchsorted(self.sorted_keys, keys, "right")
+        found = [self.sorted_rows[lo:hi] for lo, hi in zip(lows.tolist(), highs.tolist()) if hi > lo]
+        found += [np.array(self.tail[key], dtype=np.int64) for key in keys.tolist() if key in self.tail]
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def similar(self, signature: np.ndarray, exclude_id: Optional[int] = None, limit: int = 10) -> List[Tuple[int, float]]:
+        """Indexed tickets at or above the threshold, most similar first."""
+        if (signature == EMPTY).all():
+            return []
+        with self.lock:
+            rows = self.candidates(self.band_keys(signature[None, :])[0])
+            scores = (self.signatures[rows] == signature).mean(axis=1)
+            ids = self.ids[rows]
+        keep = (scores >= self.threshold) & (ids != (exclude_id if exclude_id is not None else -1))
+        order = np.lexsort((ids[keep], -scores[keep]))[:limit]
+        return [(int(i), round(float(s), 3)) for i, s in zip(ids[keep][order], scores[keep][order])]
+
+    def catch_up(self, db: Session, batch_size: int = 5000) -> int:
+        """Indexes committed tickets this index hasn't seen; returns how many."""
+        total = 0
+        with self.lock:
+            # A first build skips over deleted and archived ids, not uncommitted ones
+            watch = self.last_id > 0
+        while True:
+            # The query runs unlocked: other callers (or, in async mode, other
+            # requests on this thread) may catch up at the same time
+            with self.lock:
+                now = time.monotonic()
+                self.gaps = {ticket_id: seen for ticket_id, seen in self.gaps.items() if now - seen < DUPLICATE_GAP_SECONDS}
+                condition = tickets.c.id > self.last_id
+                if self.gaps:
+                    condition = or_(condition, tickets.c.id.in_(list(self.gaps)))
+            rows = db.execute(
+                select(tickets.c.id, tickets.c.subject, tickets.c.description).where(condition).order_by(tickets.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            ids = np.array([row.id for row in rows], dtype=np.int64)
+            signatures = self.sign([ticket_text(row.subject, row.description) for row in rows])
+            with self.lock:
+                # Only what nobody indexed while the query ran
+                fresh = np.array([ticket_id > self.last_id or ticket_id in self.gaps for ticket_id in ids.tolist()], dtype=bool)
+                for ticket_id in ids[fresh].tolist():
+                    self.gaps.pop(ticket_id, None)
+                new = ids[ids > self.last_id]
+                if watch and len(new):
+                    # Ids skipped over may belong to transactions still in flight
+                    skipped = np.setdiff1d(np.arange(self.last_id + 1, new[-1]), new)
+                    self.gaps.update((int(ticket_id), now) for ticket_id in skipped[:max(DUPLICATE_GAP_MAX - len(self.gaps), 0)])
+                if fresh.any():
+                    self.add(ids[fresh], signatures[fresh])
+                self.last_id = max(self.last_id, int(ids[-1]))
+            total += int(fresh.sum())
+            if len(rows) < batch_size:
+                break
+        stats.caught_up += total
+        return total
+
+    def save(self, path: str) -> None:
+        started = time.perf_counter()
+        with self.lock:
+            self.merge()
+            partial = f"{path}.partial.npz"
+            np.savez(
+                partial, params=np.array([self.permutations, self.bands, self.shingle, SEED]), last_id=np.array(self.last_id),
+                ids=self.ids[:self.count], signatures=self.signatures[:self.count], sorted_keys=self.sorted_keys, sorted_rows=self.sorted_rows
+            )
+            os.replace(partial, path)
+            self.dirty = False
+        stats.saves += 1
+        stats.save_seconds = time.perf_counter() - started
+
+    def load(self, path: str) -> bool:
+        """Replaces the contents with a saved index; False if missing or built with other settings."""
+        started = time.perf_counter()
+        try:
+            data = np.load(path, allow_pickle=False)
+        except FileNotFoundError:
+            return False
+        with data, self.lock:
+            if data["params"].tolist() != [self.permutations, self.bands, self.shingle, SEED]:
+                logger.warning("Ignoring %s: built with different duplicate detection settings", path)
+                return False
+            self.clear()
+            self.ids, self.signatures = data["ids"], data["signatures"]
+            self.sorted_keys, self.sorted_rows = data["sorted_keys"], data["sorted_rows"]
+            self.count = len(self.ids)
+            self.last_id = int(data["last_id"])
+        stats.load_seconds = time.perf_counter() - started
+        return True
+
+stats = DuplicateStats()
+index = DuplicateIndex()
+
+def find_duplicate(db: Session, subject: str, description: str) -> Optional[int]:
+    """The id of the earlier ticket most similar to this text, if any is similar enough."""
+    if not DUPLICATE_DETECTION:
+        return None
+    index.catch_up(db)
+    started = time.perf_counter()
+    matches = index.similar(index.sign([ticket_text(subject, description)])[0], limit=1)
+    stats.record_check(time.perf_counter() - started, bool(matches))
+    return matches[0][0] if matches else None
+
+def similar_tickets(db: Session, ticket: models.Ticket, limit: int = 10) -> List[dict]:
+    """Tickets most like this one, active or archived, with their estimated similarity."""
+    index.catch_up(db)
+    matches = dict(index.similar(index.sign([ticket_text(ticket.subject, ticket.description)])[0], exclude_id=ticket.id, limit=limit))
+    found = {}
+    for model in (models.Ticket, models.ArchivedTicket):
+        missing = [ticket_id for ticket_id in matches if ticket_id not in found]
+        if missing:
+            for row in db.execute(select(model.id, model.subject, model.status).where(model.id.in_(missing))):
+                found[row.id] = {"id": row.id, "subject": row.subject, "status": row.status, "similarity": matches[row.id], "archived": model.archived}
+    return [found[ticket_id] for ticket_id in matches if ticket_id in found]
+
+def cluster(db: Session, threshold: float = DUPLICATE_THRESHOLD, batch_size: int = 5000) -> dict:
+    """Rebuilds the index from every active ticket and links each duplicate to the oldest ticket in its group."""
+    with index.lock:
+        index.clear()
+        index.catch_up(db, batch_size)
+        index.merge()
+        count = index.count
+        # Every ticket sharing a band bucket is paired with the bucket's first ticket
+        keys, rows = index.sorted_keys, index.sorted_rows
+        starts = np.r_[True, keys[1:] != keys[:-1]]
+        heads = rows[np.maximum.accumulate(np.where(starts, np.arange(len(keys)), 0))]
+        pairs = np.stack([heads, rows], axis=1)[~starts]
+        pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+        similar = np.concatenate([
+            (index.signatures[pairs[i:i + 100000, 0]] == index.signatures[pairs[i:i + 100000, 1]]).mean(axis=1) >= threshold
+            for i in range(0, len(pairs), 100000)
+        ]) if len(pairs) else np.empty(0, dtype=bool)
+        ids = index.ids[:count].copy()
+    parent = np.arange(count)
+
+    def root(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for left, right in pairs[similar].tolist():
+        a, b = root(left), root(right)
+        # Rows are in id order, so the lower root is the older ticket
+        parent[max(a, b)] = min(a, b)
+    roots = np.array([root(row) for row in range(count)], dtype=np.int64)
+    members = np.flatnonzero(roots != np.arange(count))
+    links = [{"ticket_id": int(ids[row]), "original": int(ids[roots[row]])} for row in members]
+    stmt = tickets.update().where(tickets.c.id == bindparam("ticket_id")).values(duplicate_of_id=bindparam("original"))
+    for first in range(0, len(links), batch_size):
+        db.connection().execute(stmt, links[first:first + batch_size])
+        db.commit()
+    if links:
+        render_cache.render_cache.clear()
+    return {"tickets": count, "candidate_pairs": len(pairs), "similar_pairs": int(similar.sum()),
+            "groups": len(np.unique(roots[members])), "linked": len(links)}
+
+def load_index(session_factory, path: Optional[str] = None) -> int:
+    """Loads the saved index and catches it up; returns the tickets indexed."""
+    path = path or DUPLICATE_INDEX_PATH
+    started = time.perf_counter()
+    loaded = index.load(path)
+    with session_factory() as db:
+        index.catch_up(db)
+    logger.info("Duplicate index %s with %d tickets in %.2fs", "loaded" if loaded else "built", index.count, time.perf_counter() - started)
+    return index.count
+
+async def save_periodically(interval: int = DUPLICATE_SAVE_INTERVAL, path: Optional[str] = None):
+    while True:
+        await asyncio.sleep(interval)
+        if index.dirty:
+            try:
+                await run_in_threadpool(index.save, path or DUPLICATE_INDEX_PATH)
+            except Exception:
+                logger.exception("Saving the duplicate index failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate ticket index")
+    parser.add_argument("command", choices=["cluster", "build"])
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+    args = parser.parse_args()
+    from database import SessionLocal
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        if args.command == "cluster":
+            print(cluster(db, args.threshold))
+        else:
+            index.clear()
+            index.catch_up(db)
+        index.save(DUPLICATE_INDEX_PATH)
+        print(f"Indexed {index.count} tickets in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,268 @@
+"""Ticket change events pushed to browsers over server-sent events.
+
+Commits that create a ticket, add a response or change a status publish a small
+delta (see the session hooks at the bottom) through the broker. Every open
+/events stream holds a Subscription: agents receive everything, customers only
+events about their own tickets. An idle subscriber costs one bounded queue and
+a parked coroutine, so a worker can hold thousands of them.
+
+With EVENTS_BACKEND=redis the events travel over a Redis pub/sub channel and
+reach the subscribers of every worker; the default in-process bus only reaches
+the worker that committed.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import models
+from core.cache import REDIS_URL, redis
+
+logger = logging.getLogger(__name__)
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "ticket_events")
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+# Events a subscriber may fall behind by before it is told to resync
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+# Comment lines keep idle connections open through proxies
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+EVENTS_RETRY_MS = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+
+RESYNC = {"type": "resync"}
+
+class TooManySubscribers(Exception):
+    pass
+
+class Subscription:
+    def __init__(self, customer_id: Optional[int]):
+        # None: an agent, interested in every ticket
+        self.customer_id = customer_id
+        self.queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = 0
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind for deltas to be useful: replace the backlog with one resync
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+def _deliver_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+class LocalBus:
+    """In-process bus: publishing dispatches straight to this worker's subscribers."""
+
+    def __init__(self):
+        self.dispatch = None
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, event):
+        # Nobody in this worker has subscribed yet
+        if self.dispatch is not None:
+            self.dispatch(event)
+
+class RedisBus:
+    """Redis pub/sub bus; a listener thread dispatches each worker's copy."""
+
+    def __init__(self, client, channel):
+        self.client = client
+        self.channel = channel
+        self._listener = None
+
+    def start(self, dispatch):
+        if self._listener is not None:
+            return
+
+        def listen():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+            for message in pubsub.listen():
+                try:
+                    dispatch(json.loads(message["data"]))
+                except Exception:
+                    logger.exception("Dropped malformed ticket event")
+
+        self._listener = threading.Thread(target=listen, name="ticket-events", daemon=True)
+        self._listener.start()
+
+    def publish(self, event):
+        self.client.publish(self.channel, json.dumps(event))
+
+class EventBroker:
+    def __init__(self, bus, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.bus = bus
+        self.max_subscribers = max_subscribers
+        self._agents = set()
+        self._customers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._started = False
+        self.published = 0
+        self.dispatched = 0
+
+    def __len__(self):
+        return len(self._agents) + sum(len(subs) for subs in self._customers.values())
+
+    def subscribe(self, customer_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(customer_id)
+        with self._lock:
+            if len(self) >= self.max_subscribers:
+                raise TooManySubscribers()
+            if not self._started:
+                self.bus.start(self.dispatch)
+                self._started = True
+            if customer_id is None:
+                self._agents.add(subscription)
+            else:
+                self._customers[customer_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription.customer_id is None:
+                self._agents.discard(subscription)
+            else:
+                subscribers = self._customers.get(subscription.customer_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._customers[subscription.customer_id]
+
+    def publish(self, event):
+        self.published += 1
+        self.bus.publish(event)
+
+    def dispatch(self, event):
+        """Hands event to the matching subscribers; safe to call from any thread."""
+        with self._lock:
+            targets = list(self._agents)
+            targets.extend(self._customers.get(event.get("customer_id"), ()))
+        self.dispatched += 1
+        by_loop = defaultdict(list)
+        for subscription in targets:
+            by_loop[subscription.loop].append(subscription)
+        # One callback per loop rather than one per subscriber
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, subscriptions, event)
+            except RuntimeError:
+                # The loop has closed; its streams are gone
+                pass
+
+    def stats(self):
+        with self._lock:
+            agents, customers = len(self._agents), sum(len(subs) for subs in self._customers.values())
+        return {
+            "backend": type(self.bus).__name__,
+            "subscribers": agents + customers,
+            "agent_subscribers": agents,
+            "customer_subscribers": customers,
+            "published": self.published,
+            "dispatched": self.dispatched,
+        }
+
+def format_event(event) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def stream(subscription: Subscription, heartbeat: float = EVENTS_HEARTBEAT):
+    """SSE text for one subscriber; unsubscribes when the client goes away."""
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+if EVENTS_BACKEND == "redis":
+    if REDIS_URL and redis is not None:
+        broker = EventBroker(RedisBus(redis.Redis.from_url(REDIS_URL), EVENTS_CHANNEL))
+    else:
+        logger.warning("EVENTS_BACKEND=redis needs REDIS_URL and the redis package; using the in-process bus")
+        broker = EventBroker(LocalBus())
+else:
+    broker = EventBroker(LocalBus())
+
+def queue(session, event):
+    # Published once the session commits, for writes the flush hook can't see
+    session.info.setdefault("ticket_events", []).append(event)
+
+def _timestamp(value):
+    return value.isoformat() if value is not None else None
+
+# Events follow the transaction, like the cache hooks in core.cache: collected
+# on flush, published after commit, dropped on rollback.
+
+@event.listens_for(Session, "after_flush")
+def _collect_ticket_events(session, flush_context):
+    events = session.info.setdefault("ticket_events", [])
+    for obj in session.new:
+        if isinstance(obj, models.Ticket):
+            events.append({
+                "type": "ticket_created",
+                "ticket_id": obj.id,
+                "customer_id": obj.user_id,
+                "subject": obj.subject,
+                "priority": obj.priority,
+                "status": obj.status.value if obj.status else models.TicketStatus.open.value,
+                "created_at": _timestamp(obj.created_at),
+            })
+        elif isinstance(obj, models.TicketResponse):
+            ticket = session.get(models.Ticket, obj.ticket_id)
+            events.append({
+                "type": "ticket_response",
+                "ticket_id": obj.ticket_id,
+                "customer_id": ticket.user_id if ticket is not None else None,
+                "response_id": obj.id,
+                "responder_id": obj.responder_id,
+                "message": obj.message,
+                "timestamp": _timestamp(obj.timestamp),
+            })
+    for obj in session.dirty:
+        if not isinstance(obj, models.Ticket):
+            continue
+        history = inspect(obj).attrs.status.history
+        if not history.has_changes():
+            continue
+        new = models.TicketStatus(obj.status)
+        old = models.TicketStatus(history.deleted[0]) if history.deleted and history.deleted[0] is not None else None
+        if new == old:
+            continue
+        events.append({
+            "type": "ticket_status",
+            "ticket_id": obj.id,
+            "customer_id": obj.user_id,
+            "status": new.value,
+            "old_status": old.value if old else None,
+            "assignee_id": obj.assignee_id,
+        })
+
+@event.listens_for(Session, "after_commit")
+def _publish_ticket_events(session):
+    for ticket_event in session.info.pop("ticket_events", ()):
+        try:
+            broker.publish(ticket_event)
+        except Exception:
+            # The commit stands; at worst clients miss a delta until they reload
+            logger.exception("Could not publish %s", ticket_event["type"])
+
+@event.listens_for(Session, "after_rollback")
+def _discard_ticket_events(session):
+    session.info.pop("ticket_events", None)
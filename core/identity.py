@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+import models
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """The parts of a User that authorization and templates need.
+
+    Detached from any Session, so it can be cached across requests (or
+    carried in a session token) and read without touching the database.
+    """
+    id: int
+    name: str
+    email: str
+    role: models.UserRole
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "UserIdentity":
+        return cls(id=user.id, name=user.name, email=user.email, role=models.UserRole(user.role))
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "email": self.email, "role": self.role.value}
+
+    @classmethod
+    def from_dict(cls, data) -> "UserIdentity":
+        return cls(id=data["id"], name=data["name"], email=data["email"], role=models.UserRole(data["role"]))
@@ -0,0 +1,224 @@
+"""Per-request profiling: SQL statements, DB time, template rendering and latency.
+
+Engine events and a Jinja template hook add to the RequestProfile of the
+request being served (found through a context variable, which also follows
+work into the threadpool). ProfilingMiddleware opens the profile, reports it
+in a Server-Timing header, flags statements repeated often enough to look like
+N+1 lazy loading, and feeds the Prometheus metrics served at /metrics.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import jinja2
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# "all" profiles every request, "sample" a PROFILING_SAMPLE_RATE share of them,
+# "off" none. Request counts and latency are always recorded.
+PROFILING_MODE = os.getenv("PROFILING_MODE", "all")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.05"))
+# The same statement this many times in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# Responses that stay open for as long as the client listens (SSE, /stream_tickets)
+STREAMING_CONTENT_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def suspected_n_plus_one(self):
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= N_PLUS_ONE_THRESHOLD]
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+@contextmanager
+def profiled():
+    profile = RequestProfile()
+    token = current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        current_profile.reset(token)
+
+# Registered on the Engine class so the sync, async and test engines are all covered
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and current_profile.get() is not None:
+        context.profile_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    started = getattr(context, "profile_started", None)
+    if profile is None or started is None:
+        return
+    profile.db_time += time.perf_counter() - started
+    profile.queries += 1
+    profile.statements[statement] += 1
+
+class TimedTemplate(jinja2.Template):
+    def render(self, *args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+def instrument_templates(templates):
+    # Applies to templates loaded from now on, so call before the first render
+    templates.env.template_class = TimedTemplate
+    return templates
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+class Metrics:
+    """Request metrics keyed by label tuples, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.profiled = Counter()
+        self.db_seconds = Counter()
+        self.template_seconds = Counter()
+        self.n_plus_one = Counter()
+        self.latency = {}
+        self.queries = {}
+
+    def observe(self, method, route, status, elapsed, profile=None):
+        with self._lock:
+            self.requests[(method, route, str(status))] += 1
+            self.latency.setdefault((method, route), Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            if profile is None:
+                return
+            self.profiled[(method, route)] += 1
+            self.db_seconds[(method, route)] += profile.db_time
+            self.template_seconds[(method, route)] += profile.template_time
+            self.queries.setdefault((method, route), Histogram(QUERY_BUCKETS)).observe(profile.queries)
+            if profile.suspected_n_plus_one():
+                self.n_plus_one[(method, route)] += 1
+
+    def render(self):
+        lines = []
+
+        def labels(names, values):
+            return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+        def counter(name, help_text, values, names=("method", "route")):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} counter"])
+            lines.extend(f"{name}{labels(names, key)} {value:g}" for key, value in sorted(values.items()))
+
+        def histogram(name, help_text, values):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} histogram"])
+            for key, hist in sorted(values.items()):
+                names = ("method", "route")
+                bounds = ["%g" % bound for bound in hist.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, hist.counts + [hist.total]):
+                    lines.append(f"{name}_bucket{labels(names + ('le',), key + (bound,))} {count}")
+                lines.append(f"{name}_sum{labels(names, key)} {hist.sum:g}")
+                lines.append(f"{name}_count{labels(names, key)} {hist.total}")
+
+        with self._lock:
+            counter("http_requests_total", "Requests served.", self.requests, names=("method", "route", "status"))
+            histogram("http_request_duration_seconds", "Time to the end of the response body; to the headers for event streams.", self.latency)
+            counter("http_requests_profiled_total", "Requests with query and template profiling.", self.profiled)
+            histogram("db_queries_per_request", "SQL statements per profiled request.", self.queries)
+            counter("db_query_seconds_total", "Time in SQL statements, profiled requests only.", self.db_seconds)
+            counter("template_render_seconds_total", "Time rendering templates, profiled requests only.", self.template_seconds)
+            counter("n_plus_one_requests_total", f"Profiled requests repeating a statement {N_PLUS_ONE_THRESHOLD}+ times.", self.n_plus_one)
+        return "\n".join(lines) + "\n"
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+metrics = Metrics()
+
+def should_profile():
+    if PROFILING_MODE == "all":
+        return True
+    if PROFILING_MODE == "sample":
+        return random.random() < PROFILING_SAMPLE_RATE
+    return False
+
+def short_statement(statement):
+    return re.sub(r"\s+", " ", statement)[:200]
+
+class ProfilingMiddleware:
+    """ASGI middleware; pure ASGI so it also times streamed response bodies.
+
+    Open-ended streams are timed to their response headers instead and are
+    never reported as slow: their length is how long the client listened.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        profile = RequestProfile() if should_profile() else None
+        token = current_profile.set(profile)
+        status_code = 500
+        started = time.perf_counter()
+        headers_sent_after = None
+
+        async def send_with_timing(message):
+            nonlocal status_code, headers_sent_after
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.split(b";")[0].strip() in STREAMING_CONTENT_TYPES:
+                    headers_sent_after = time.perf_counter() - started
+                if profile is not None:
+                    timing = (f'db;dur={profile.db_time * 1000:.2f};desc="{profile.queries} queries", '
+                              f'tpl;dur={profile.template_time * 1000:.2f}')
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_profile.reset(token)
+            streaming = headers_sent_after is not None
+            elapsed = headers_sent_after if streaming else time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.observe(scope["method"], route, status_code, elapsed, profile)
+            if profile is not None:
+                for statement, count in profile.suspected_n_plus_one():
+                    logger.warning("Possible N+1 on %s %s: %d x %s", scope["method"], route, count, short_statement(statement))
+            if not streaming and elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request %s %s: %.1f ms%s", scope["method"], route, elapsed * 1000,
+                    f" ({profile.queries} queries, db {profile.db_time * 1000:.1f} ms, templates {profile.template_time * 1000:.1f} ms)" if profile else ""
+                )
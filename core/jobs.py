@@ -0,0 +1,340 @@
+"""Durable background jobs kept in the database and run by worker threads.
+
+Write paths call enqueue() inside their own transaction, so a job exists
+exactly when the write it follows has committed, with no broker involved.
+Workers claim due jobs with FOR UPDATE SKIP LOCKED on Postgres (SQLite takes
+its write lock instead), run the registered handler and record the outcome in
+the handler's own transaction. A failed job is retried with exponential
+backoff; after max_attempts it is dead-lettered (status "dead") and kept for
+inspection until `retry-dead` puts it back.
+
+Delivery is at least once: a handler that fails after its side effect, or
+whose worker dies mid-job, runs again, so handlers must be idempotent.
+
+    python -m core.jobs worker --concurrency 4
+    python -m core.jobs stats
+    python -m core.jobs retry-dead --kind ticket_created
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional
+from sqlalchemy import delete, false, func, insert, literal_column, select, update
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Retry n waits about JOB_BACKOFF_BASE * 2^(n-1) seconds, capped at JOB_BACKOFF_MAX
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "5"))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "3600"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# A job running this long is presumed to have lost its worker and is requeued
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "600"))
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "168"))
+JOB_MAINTENANCE_INTERVAL = float(os.getenv("JOB_MAINTENANCE_INTERVAL", "60"))
+# Worker threads started inside each web process; 0 leaves jobs to `python -m core.jobs worker`
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_HANDLER_MODULES = os.getenv("JOB_HANDLER_MODULES", "core.notifications,core.triage")
+
+jobs_table = models.Job.__table__
+handlers: Dict[str, Callable[[Session, dict], None]] = {}
+
+def handler(kind: str):
+    """Registers fn(db, payload) for kind. The worker commits db after it returns."""
+    def register(fn):
+        handlers[kind] = fn
+        return fn
+    return register
+
+def load_handlers(modules: str = JOB_HANDLER_MODULES) -> None:
+    for name in filter(None, (module.strip() for module in modules.split(","))):
+        importlib.import_module(name)
+
+def enqueue(db: Session, kind: str, payload: dict, delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> models.Job:
+    """Adds a job to db's transaction; it becomes visible to workers on commit."""
+    job = models.Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        status=models.JobStatus.queued,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=datetime.now() + timedelta(seconds=delay)
+    )
+    db.add(job)
+    return job
+
+def enqueue_many(db: Session, kind: str, payloads: Iterable[dict], max_attempts: int = JOB_MAX_ATTEMPTS) -> None:
+    """Like enqueue for many payloads at once, as one executemany insert."""
+    now = datetime.now()
+    rows = [
+        {"kind": kind, "payload": json.dumps(payload), "status": models.JobStatus.queued, "attempts": 0,
+         "max_attempts": max_attempts, "run_at": now, "created_at": now}
+        for payload in payloads
+    ]
+    if rows:
+        db.execute(insert(models.Job.__table__), rows)
+
+def backoff(attempts: int) -> float:
+    # Jitter spreads out retries of jobs that failed together
+    return min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+def claim(db: Session, worker_id: str, kinds: Optional[Iterable[str]] = None) -> Optional[models.Job]:
+    now = datetime.now()
+    # The status literal lets SQLite match the partial index ix_jobs_queued_run_at
+    query = select(models.Job).where(
+        models.Job.status == literal_column("'queued'"),
+        models.Job.run_at <= now
+    ).order_by(models.Job.run_at, models.Job.id).limit(1).execution_options(populate_existing=True)
+    if kinds:
+        query = query.where(models.Job.kind.in_(list(kinds)))
+    if db.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    else:
+        # Any write statement takes SQLite's RESERVED lock, even one matching no rows
+        db.execute(update(jobs_table).where(false()).values(id=jobs_table.c.id))
+    job = db.scalars(query).first()
+    if job is None:
+        db.rollback()
+        return None
+    job.status = models.JobStatus.running
+    job.attempts += 1
+    job.locked_by = worker_id
+    job.locked_at = now
+    db.commit()
+    return job
+
+def _owned(job, worker_id):
+    # Only the claim that is still current may record an outcome
+    return update(jobs_table).where(jobs_table.c.id == job.id, jobs_table.c.locked_by == worker_id)
+
+def fail(db: Session, job: models.Job, worker_id: str, error: str) -> models.JobStatus:
+    now = datetime.now()
+    values = {"locked_by": None, "locked_at": None, "last_error": error[-4000:]}
+    if job.attempts >= job.max_attempts:
+        status = models.JobStatus.dead
+        values.update(status=status, finished_at=now)
+    else:
+        status = models.JobStatus.queued
+        values.update(status=status, run_at=now + timedelta(seconds=backoff(job.attempts)))
+    db.execute(_owned(job, worker_id).values(**values))
+    db.commit()
+    return status
+
+def run_job(session_factory, job: models.Job, worker_id: str) -> Optional[models.JobStatus]:
+    """Runs one claimed job; returns its new status, or None if the claim was lost."""
+    started = time.perf_counter()
+    with session_factory() as db:
+        try:
+            fn = handlers.get(job.kind)
+            if fn is None:
+                raise LookupError(f"no handler registered for job kind {job.kind!r}")
+            fn(db, json.loads(job.payload))
+            # Success is recorded in the handler's transaction, so its writes and
+            # the job's completion commit together
+            done = db.execute(_owned(job, worker_id).values(
+                status=models.JobStatus.succeeded, finished_at=datetime.now(), locked_by=None, locked_at=None, last_error=None
+            ))
+            if done.rowcount == 0:
+                db.rollback()
+                logger.warning("Job %s (%s) was requeued while running; discarding this run", job.id, job.kind)
+                return None
+            db.commit()
+            status = models.JobStatus.succeeded
+        except Exception:
+            db.rollback()
+            error = traceback.format_exc()
+            logger.warning("Job %s (%s) failed on attempt %d/%d: %s", job.id, job.kind, job.attempts, job.max_attempts, error.strip().splitlines()[-1])
+            status = fail(db, job, worker_id, error)
+    stats.record(job.kind, status, time.perf_counter() - started)
+    return status
+
+def reap_stale(db: Session) -> int:
+    """Requeues (or dead-letters) jobs whose worker stopped reporting."""
+    cutoff = datetime.now() - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    stale = (jobs_table.c.status == models.JobStatus.running.name) & (jobs_table.c.locked_at < cutoff)
+    error = "worker lost while running the job"
+    dead = db.execute(update(jobs_table).where(stale, jobs_table.c.attempts >= jobs_table.c.max_attempts).values(
+        status=models.JobStatus.dead, finished_at=datetime.now(), locked_by=None, locked_at=None, last_error=error
+    )).rowcount
+    requeued = db.execute(update(jobs_table).where(stale).values(
+        status=models.JobStatus.queued, run_at=datetime.now(), locked_by=None, locked_at=None, last_error=error
+    )).rowcount
+    db.commit()
+    return dead + requeued
+
+def purge(db: Session, retention_hours: int = JOB_RETENTION_HOURS) -> int:
+    cutoff = datetime.now() - timedelta(hours=retention_hours)
+    deleted = db.execute(delete(jobs_table).where(
+        jobs_table.c.status == models.JobStatus.succeeded.name, jobs_table.c.finished_at < cutoff
+    )).rowcount
+    db.commit()
+    return deleted
+
+def retry_dead(db: Session, kind: Optional[str] = None) -> int:
+    query = update(jobs_table).where(jobs_table.c.status == models.JobStatus.dead.name)
+    if kind:
+        query = query.where(jobs_table.c.kind == kind)
+    retried = db.execute(query.values(status=models.JobStatus.queued, attempts=0, run_at=datetime.now(), finished_at=None)).rowcount
+    db.commit()
+    return retried
+
+def queue_stats(db: Session) -> dict:
+    """Backlog by status and kind, plus recent throughput, read from the jobs table."""
+    now = datetime.now()
+    counts = defaultdict(dict)
+    rows = db.execute(
+        select(models.Job.status, models.Job.kind, func.count())
+        .where(models.Job.status != models.JobStatus.succeeded)
+        .group_by(models.Job.status, models.Job.kind)
+    ).all()
+    for status, kind, count in rows:
+        counts[status.value][kind] = count
+    oldest_due = db.scalar(select(func.min(models.Job.run_at)).where(
+        models.Job.status == literal_column("'queued'"), models.Job.run_at <= now
+    ))
+    succeeded = db.scalar(select(func.count()).where(
+        models.Job.finished_at >= now - timedelta(minutes=1), models.Job.status == models.JobStatus.succeeded
+    ))
+    return {
+        "queued": counts.get("queued", {}),
+        "running": counts.get("running", {}),
+        "dead": counts.get("dead", {}),
+        "succeeded_last_minute": succeeded,
+        "oldest_due_seconds": round((now - oldest_due).total_seconds(), 1) if oldest_due else 0.0,
+    }
+
+class JobStats:
+    """Outcomes and handler time per kind for the jobs run by this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def record(self, kind, status, elapsed):
+        outcome = {models.JobStatus.succeeded: "succeeded", models.JobStatus.queued: "retried"}.get(status, "dead")
+        with self._lock:
+            self.outcomes[(kind, outcome)] += 1
+            self.seconds[kind] += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.outcomes), dict(self.seconds)
+
+stats = JobStats()
+
+class Worker:
+    """concurrency threads claiming and running jobs, plus one housekeeping thread."""
+
+    def __init__(self, session_factory, concurrency: int = 1, kinds: Optional[Iterable[str]] = None,
+                 poll_interval: float = JOB_POLL_INTERVAL, name: Optional[str] = None):
+        load_handlers()
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.kinds = list(kinds) if kinds else None
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self.threads = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            self.threads.append(threading.Thread(target=self._run, args=(f"{self.name}:{i}",), name=f"job-worker-{i}", daemon=True))
+        self.threads.append(threading.Thread(target=self._maintain, name="job-maintenance", daemon=True))
+        for thread in self.threads:
+            thread.start()
+        logger.info("Started %d job worker threads as %s", self.concurrency, self.name)
+
+    def stop(self, timeout: Optional[float] = None):
+        # Running jobs finish; idle threads wake from their poll wait
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _run(self, worker_id):
+        while not self.stopping.is_set():
+            try:
+                with self.session_factory() as db:
+                    job = claim(db, worker_id, self.kinds)
+                if job is None:
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                run_job(self.session_factory, job, worker_id)
+            except Exception:
+                logger.exception("Job worker %s failed to claim or record a job", worker_id)
+                self.stopping.wait(self.poll_interval)
+
+    def _maintain(self):
+        previous = {}
+        while not self.stopping.wait(JOB_MAINTENANCE_INTERVAL):
+            try:
+                with self.session_factory() as db:
+                    reaped, purged = reap_stale(db), purge(db)
+                if reaped:
+                    logger.warning("Requeued %d jobs whose worker stopped responding", reaped)
+                outcomes, _ = stats.snapshot()
+                done = {key: count - previous.get(key, 0) for key, count in outcomes.items() if count != previous.get(key, 0)}
+                previous = outcomes
+                if done or purged:
+                    rate = sum(count for (_, outcome), count in done.items() if outcome == "succeeded") / JOB_MAINTENANCE_INTERVAL
+                    logger.info("Jobs in the last %.0fs: %s (%.2f/s succeeded), purged %d", JOB_MAINTENANCE_INTERVAL, done, rate, purged)
+            except Exception:
+                logger.exception("Job maintenance failed")
+
+def run_pending(session_factory, kinds: Optional[Iterable[str]] = None, worker_id: str = "inline") -> int:
+    """Runs every due job in the calling thread; returns how many were run."""
+    load_handlers()
+    ran = 0
+    while True:
+        with session_factory() as db:
+            job = claim(db, worker_id, kinds)
+        if job is None:
+            return ran
+        run_job(session_factory, job, worker_id)
+        ran += 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background job worker and maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="run jobs until SIGINT/SIGTERM")
+    worker.add_argument("--concurrency", type=int, default=4)
+    worker.add_argument("--kinds", help="comma-separated job kinds this worker takes (default: all)")
+    commands.add_parser("run-once", help="run every due job, then exit")
+    commands.add_parser("stats", help="print the backlog")
+    retry = commands.add_parser("retry-dead", help="requeue dead-lettered jobs")
+    retry.add_argument("--kind")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from database import SessionLocal
+    if args.command == "worker":
+        pool = Worker(SessionLocal, args.concurrency, kinds=args.kinds.split(",") if args.kinds else None)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: pool.stopping.set())
+        pool.start()
+        while not pool.stopping.wait(1):
+            pass
+        pool.stop()
+    elif args.command == "run-once":
+        print(f"Ran {run_pending(SessionLocal)} jobs")
+    else:
+        with SessionLocal() as db:
+            if args.command == "stats":
+                print(json.dumps(queue_stats(db), indent=2))
+            else:
+                print(f"Requeued {retry_dead(db, args.kind)} jobs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Ticket notification emails, sent by background jobs (see core.jobs).
+
+Without SMTP_HOST the messages are only logged. A job retried after its email
+went out sends it again; these handlers keep no send log, so a duplicate is
+possible but a lost notification is not.
+"""
+import logging
+import os
+import smtplib
+from email.message import EmailMessage
+from sqlalchemy.orm import Session
+import models
+from core import jobs
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+NOTIFY_FROM = os.getenv("NOTIFY_FROM", "support@example.com")
+
+def send_email(to: str, subject: str, body: str) -> None:
+    if not SMTP_HOST:
+        logger.info("Email to %s: %s", to, subject)
+        return
+    message = EmailMessage()
+    message["From"] = NOTIFY_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        smtp.send_message(message)
+
+@jobs.handler("ticket_created")
+def ticket_created(db: Session, payload: dict) -> None:
+    ticket = db.get(models.Ticket, payload["ticket_id"])
+    if ticket is None:
+        return  # deleted before the job ran
+    send_email(
+        ticket.user.email,
+        f"[Ticket #{ticket.id}] {ticket.subject}",
+        f"Hi {ticket.user.name},\n\nWe received your ticket and an agent will reply soon.\n\n{ticket.description}\n"
+    )
+
+@jobs.handler("ticket_response")
+def ticket_response(db: Session, payload: dict) -> None:
+    response = db.get(models.TicketResponse, payload["response_id"])
+    if response is None:
+        return
+    ticket = response.ticket
+    # Agent replies go to the customer; customer replies to the assigned agent, if any
+    if response.responder_id != ticket.user_id:
+        recipient = ticket.user
+    elif ticket.assignee_id is not None:
+        recipient = db.get(models.User, ticket.assignee_id)
+    else:
+        return
+    send_email(
+        recipient.email,
+        f"Re: [Ticket #{ticket.id}] {ticket.subject}",
+        f"{response.responder.name} wrote:\n\n{response.message}\n"
+    )
@@ -0,0 +1,18 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+
+# Keyset cursors encode the (created_at, id) of the last row on a page so the
+# next page resumes with an index range scan instead of an OFFSET.
+
+def encode_cursor(created_at: datetime, ticket_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{ticket_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        stamp, ticket_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(stamp), int(ticket_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
@@ -0,0 +1,252 @@
+"""Per-route rate limits and admission control for the expensive endpoints.
+
+Two kinds of policy, keyed by exact "METHOD /path":
+
+- Rate limits are token buckets per client: COUNT requests per SECONDS with
+  bursts up to BURST (default COUNT), counted per IP or per user (the session
+  identity, else ?user_email=, else the IP). Over the limit is a 429 with
+  Retry-After. Buckets live in process memory, or in Redis with
+  RATE_LIMIT_BACKEND=redis so every worker shares them (REDIS_URL; without
+  it an in-process stand-in).
+- Concurrency limits cap how many requests of a route run at once in this
+  worker. Others queue for a slot; one that would wait longer than
+  ADMISSION_MAX_WAIT_MS, or finds ADMISSION_MAX_QUEUE already waiting, is shed
+  with a 503 and Retry-After instead of adding to the latency of everyone
+  behind it.
+
+    RATE_LIMIT_POLICIES="POST /login=ip:10/60:20;GET /support_agent_tickets=user:30/60"
+    CONCURRENCY_LIMITS="GET /support_agent_tickets=4;POST /login=8"
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional, Tuple
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from core import sessions
+from core.cache import redis_client
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_POLICIES = os.getenv(
+    "RATE_LIMIT_POLICIES",
+    "POST /login=ip:10/60:20;POST /auth/login=ip:10/60:20;POST /register=ip:5/60;GET /support_agent_tickets=user:30/60"
+)
+CONCURRENCY_LIMITS = os.getenv(
+    "CONCURRENCY_LIMITS",
+    "POST /login=8;POST /auth/login=8;POST /register=4;GET /support_agent_tickets=4"
+)
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", "2000"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Behind a proxy the client address is the first X-Forwarded-For entry
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+class RatePolicy:
+    def __init__(self, route: str, scope: str, count: int, seconds: float, burst: Optional[int] = None):
+        if scope not in ("ip", "user"):
+            raise ValueError(f"rate limit scope must be ip or user, not {scope!r}")
+        self.route = route
+        self.scope = scope
+        self.rate = count / seconds
+        self.burst = burst or count
+
+def parse_routes(raw: str) -> Dict[str, str]:
+    routes = {}
+    for entry in filter(None, (part.strip() for part in raw.split(";"))):
+        route, _, spec = entry.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        routes[f"{method.upper()} {path.strip()}"] = spec.strip()
+    return routes
+
+def load_rate_policies(raw: str) -> Dict[str, RatePolicy]:
+    # "ip:10/60:20" is 10 per 60 seconds per IP, bursting to 20
+    policies = {}
+    for route, spec in parse_routes(raw).items():
+        scope, _, limit = spec.partition(":")
+        rate, _, burst = limit.partition(":")
+        count, _, seconds = rate.partition("/")
+        policies[route] = RatePolicy(route, scope, int(count), float(seconds), int(burst) if burst else None)
+    return policies
+
+def take_token(state: Optional[Tuple[float, float]], now: float, rate: float, burst: int):
+    """Token bucket step: returns (allowed, retry_after, new_state)."""
+    tokens, updated = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return True, 0.0, (tokens - 1, now)
+    return False, (1 - tokens) / rate, (tokens, now)
+
+class MemoryBuckets:
+    """Buckets for this process only, least recently used evicted past max_keys."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int):
+        with self._lock:
+            allowed, retry_after, state = take_token(self._buckets.get(key), time.monotonic(), rate, burst)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+# take_token in Lua, so the read-modify-write is atomic on the shared server.
+# Redis's clock keeps workers on different hosts consistent.
+TAKE_TOKEN_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+class RedisBuckets:
+    """Buckets shared by every worker through Redis."""
+
+    def __init__(self, client, prefix: str = "ratelimit"):
+        self.client = client
+        self.prefix = prefix
+        # The in-process stand-in can't run scripts; it is one process, so a lock will do
+        self._script = client.register_script(TAKE_TOKEN_LUA) if hasattr(client, "register_script") else None
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int):
+        key = f"{self.prefix}:{key}"
+        if self._script is not None:
+            allowed, retry_after = self._script(keys=[key], args=[rate, burst])
+            return bool(allowed), float(retry_after)
+        with self._lock:
+            raw = self.client.get(key)
+            allowed, retry_after, state = take_token(json.loads(raw) if raw else None, time.time(), rate, burst)
+            self.client.set(key, json.dumps(state), ex=math.ceil(burst / rate) + 1)
+        return allowed, retry_after
+
+class AdmissionGate:
+    """At most limit requests at once; a queued one gives up after max_wait seconds."""
+
+    def __init__(self, limit: int, max_wait: float, max_queue: int):
+        self.limit = limit
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = None
+
+    async def acquire(self) -> bool:
+        # Created lazily: a semaphore binds to the event loop it is first used on
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return True
+
+    def release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+class RateLimiter:
+    def __init__(self, buckets, rate_policies: Dict[str, RatePolicy], concurrency: Dict[str, int],
+                 max_wait: float = ADMISSION_MAX_WAIT_MS / 1000, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.buckets = buckets
+        self.rate_policies = rate_policies
+        self.gates = {route: AdmissionGate(limit, max_wait, max_queue) for route, limit in concurrency.items()}
+        self.max_wait = max_wait
+        self.counts = defaultdict(int)
+
+    def client_key(self, request: Request, policy: RatePolicy) -> str:
+        if policy.scope == "user":
+            identity = sessions.request_identity(request)
+            if identity is not None:
+                return f"user:{identity.id}"
+            email = request.query_params.get("user_email") or request.query_params.get("email_query")
+            if email:
+                return f"email:{email.lower()}"
+        forwarded = request.headers.get("x-forwarded-for") if TRUST_FORWARDED_FOR else None
+        if forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    def check_rate(self, request: Request, route: str) -> Optional[float]:
+        """Takes a token for this client; returns the Retry-After seconds if there was none."""
+        policy = self.rate_policies.get(route)
+        if policy is None:
+            return None
+        allowed, retry_after = self.buckets.take(f"{route}:{self.client_key(request, policy)}", policy.rate, policy.burst)
+        if allowed:
+            return None
+        self.counts[(route, "limited")] += 1
+        return retry_after
+
+    def stats(self):
+        return {
+            "backend": type(self.buckets).__name__,
+            "outcomes": [{"route": route, "outcome": outcome, "count": count} for (route, outcome), count in sorted(self.counts.items())],
+            "gates": {route: {"limit": gate.limit, "running": gate.running, "waiting": gate.waiting} for route, gate in self.gates.items()},
+        }
+
+def make_limiter() -> RateLimiter:
+    buckets = RedisBuckets(redis_client()) if RATE_LIMIT_BACKEND == "redis" else MemoryBuckets()
+    concurrency = {route: int(limit) for route, limit in parse_routes(CONCURRENCY_LIMITS).items()}
+    return RateLimiter(buckets, load_rate_policies(RATE_LIMIT_POLICIES), concurrency)
+
+limiter = make_limiter()
+
+def too_many(retry_after: float, status_code: int, detail: str):
+    return JSONResponse(status_code=status_code, content={"detail": detail}, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+class RateLimitMiddleware:
+    """ASGI middleware applying the module's limiter to the routes it has policies for."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = f"{scope['method']} {scope['path']}"
+        gate = limiter.gates.get(route)
+        if route not in limiter.rate_policies and gate is None:
+            return await self.app(scope, receive, send)
+        retry_after = limiter.check_rate(Request(scope), route)
+        if retry_after is not None:
+            return await too_many(retry_after, 429, "Too many requests")(scope, receive, send)
+        if gate is None:
+            limiter.counts[(route, "allowed")] += 1
+            return await self.app(scope, receive, send)
+        if not await gate.acquire():
+            limiter.counts[(route, "shed")] += 1
+            return await too_many(limiter.max_wait, 503, "Server busy, please retry")(scope, receive, send)
+        limiter.counts[(route, "allowed")] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
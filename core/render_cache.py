@@ -0,0 +1,167 @@
+"""Rendered-page and ticket-card cache with ETags, driven by version stamps.
+
+Every cached page is keyed by its ETag, a hash of the page name, the viewer,
+the filters and the version of each scope it depends on: "all" for agent
+pages, "customer:<id>" for a customer's pages. Ticket cards are cached per
+viewer under "ticket:<id>". A committed change to a ticket or response gives
+its scopes new versions (see the session hooks at the bottom), so old keys and
+ETags simply stop matching; nothing has to be deleted.
+
+With the memory backend each worker keeps its own versions, so another
+worker's writes show up only once RENDER_CACHE_TTL expires them; use the redis
+backend when running several workers.
+"""
+import hashlib
+import json
+import os
+import secrets
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from markupsafe import Markup
+import models
+from core import assets
+from core.cache import TTLCache, RedisCache, redis_client, USER_CACHE_BACKEND, CACHED_ATTRIBUTES, _MISS
+
+RENDER_CACHE_BACKEND = os.getenv("RENDER_CACHE_BACKEND", USER_CACHE_BACKEND)
+RENDER_CACHE_TTL = float(os.getenv("RENDER_CACHE_TTL", "30"))
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "5000"))
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+def templates_stamp(directory=TEMPLATES_DIR):
+    # Changes whenever a template does, so a deploy never revalidates old HTML;
+    # static files too, since pages link their fingerprinted names
+    digest = hashlib.sha1(assets.source_digest().encode())
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as template:
+                digest.update(name.encode() + template.read())
+    return digest.hexdigest()[:12]
+
+class RenderCache:
+    def __init__(self, backend, stamp):
+        self.backend = backend
+        self.stamp = stamp
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+    def version(self, scope):
+        token = self.backend.get(f"version:{scope}")
+        if token is _MISS:
+            # Unknown (or expired) scopes start at a fresh version
+            token = secrets.token_hex(6)
+            self.backend.set(f"version:{scope}", token)
+        return token
+
+    def bump(self, *scopes):
+        for scope in scopes:
+            self.backend.set(f"version:{scope}", secrets.token_hex(6))
+
+    def clear(self):
+        # Versions go too, so every scope starts over with a fresh one
+        self.backend.clear()
+
+    def etag(self, *parts, scopes=()):
+        versions = [self.version(scope) for scope in scopes]
+        digest = hashlib.sha1(json.dumps([self.stamp, parts, versions], default=str).encode()).hexdigest()[:24]
+        return f'W/"{digest}"'
+
+    def matches(self, if_none_match, etag):
+        if not if_none_match:
+            return False
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        # Weak comparison: W/"x" and "x" name the same representation
+        matched = "*" in candidates or etag in candidates or etag[2:] in candidates
+        if matched:
+            self.not_modified += 1
+        return matched
+
+    def get_page(self, etag):
+        html = self.backend.get(f"page:{etag}")
+        if html is _MISS:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return html
+
+    def set_page(self, etag, html):
+        self.backend.set(f"page:{etag}", html)
+
+    def ticket_fragment(self, template, ticket, user):
+        key = f"fragment:{template.name}:{user.id}:{ticket.id}:{self.version(f'ticket:{ticket.id}')}"
+        html = self.backend.get(key)
+        if html is _MISS:
+            self.fragment_misses += 1
+            html = template.render(ticket=ticket, user=user)
+            self.backend.set(key, html)
+        else:
+            self.fragment_hits += 1
+        return Markup(html)
+
+    def stats(self):
+        return {
+            "backend": RENDER_CACHE_BACKEND,
+            "ttl_seconds": RENDER_CACHE_TTL,
+            "page_hits": self.hits,
+            "page_misses": self.misses,
+            "not_modified": self.not_modified,
+            "fragment_hits": self.fragment_hits,
+            "fragment_misses": self.fragment_misses,
+        }
+
+if RENDER_CACHE_BACKEND == "redis":
+    render_cache = RenderCache(RedisCache(redis_client(), RENDER_CACHE_TTL, prefix="render_cache"), templates_stamp())
+else:
+    render_cache = RenderCache(TTLCache(RENDER_CACHE_MAX_ENTRIES, RENDER_CACHE_TTL), templates_stamp())
+
+def install(templates):
+    """Exposes ticket_fragment(template_name, ticket, user) to the templates."""
+    def ticket_fragment(name, ticket, user):
+        return render_cache.ticket_fragment(templates.get_template(name), ticket, user)
+    templates.env.globals["ticket_fragment"] = ticket_fragment
+    return templates
+
+def mark_changed(session, *scopes):
+    # For writes the flush hook can't see, e.g. executemany inserts and COPY
+    session.info.setdefault("render_cache_scopes", set()).update(scopes)
+
+# Invalidation follows core.cache: collect the tickets touched by each flush and
+# give their scopes new versions once the transaction commits.
+
+@event.listens_for(Session, "after_flush")
+def _collect_ticket_changes(session, flush_context):
+    pending = session.info.setdefault("render_cache_scopes", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User):
+            # Names, emails and roles are rendered into cards for all of the user's tickets
+            state = inspect(obj)
+            if obj in session.deleted or (obj in session.dirty and any(state.attrs[name].history.has_changes() for name in CACHED_ATTRIBUTES)):
+                session.info["render_cache_clear"] = True
+            continue
+        if isinstance(obj, models.TicketResponse):
+            ticket = session.get(models.Ticket, obj.ticket_id)
+            if ticket is None:
+                session.info["render_cache_clear"] = True
+                continue
+            obj = ticket
+        if isinstance(obj, models.Ticket):
+            pending.update({"all", f"customer:{obj.user_id}", f"ticket:{obj.id}"})
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _collect_bulk_ticket_changes(context):
+    if context.mapper.class_ in (models.User, models.Ticket, models.TicketResponse):
+        context.session.info["render_cache_clear"] = True
+
+@event.listens_for(Session, "after_commit")
+def _apply_ticket_changes(session):
+    if session.info.pop("render_cache_clear", False):
+        render_cache.clear()
+    render_cache.bump(*session.info.pop("render_cache_scopes", ()))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_ticket_changes(session):
+    session.info.pop("render_cache_clear", None)
+    session.info.pop("render_cache_scopes", None)
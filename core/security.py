@@ -1,9 +1,131 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
 from passlib.context import CryptContext
+from passlib.exc import UnknownHashError
+from starlette.concurrency import run_in_threadpool
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max to the configured cost makes needs_update() flag hashes made
+# with any other cost, so they are transparently rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 0 keeps hashing on the request threadpool (the pre-pool behaviour)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash/verify jobs allowed in flight (running + queued) before shedding load
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)  
+    return pwd_context.hash(password)
+
+def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    # Returns (valid, new_hash); new_hash is set when the stored cost is stale
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except (UnknownHashError, ValueError):
+        return False, None
+
+def _timed(fn, *args):
+    # Runs in the worker process; the wall-clock start lets the parent split
+    # queue wait from hashing time
+    started = time.time()
+    return started, fn(*args)
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many hash/verify jobs are already pending."""
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.run_time_total = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the server process already runs threads
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHashingBusy()
+        self.pending += 1
+        self.submitted += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        submitted_at = time.time()
+        try:
+            if self.workers <= 0:
+                started, result = await run_in_threadpool(_timed, fn, *args)
+            else:
+                loop = asyncio.get_running_loop()
+                started, result = await loop.run_in_executor(self._get_executor(), _timed, fn, *args)
+        finally:
+            self.pending -= 1
+        finished = time.time()
+        wait = max(0.0, started - submitted_at)
+        self.completed += 1
+        self.queue_wait_total += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+        self.run_time_total += finished - started
+        return result
+
+    def warm_up(self):
+        # Start every worker now so the first logins don't pay for process spawn
+        if self.workers > 0:
+            executor = self._get_executor()
+            for future in [executor.submit(_timed, abs, 0) for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_wait_ms": round(self.queue_wait_total / completed * 1000, 3),
+            "max_queue_wait_ms": round(self.queue_wait_max * 1000, 3),
+            "avg_run_time_ms": round(self.run_time_total / completed * 1000, 3),
+        }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+async def hash_password_async(password) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.run(verify_and_update_password, plain_password, hashed_password)
@@ -0,0 +1,38 @@
+"""Fast JSON responses for the ticket listing APIs.
+
+With API_SERIALIZATION=fast (the default) /get_tickets builds its payload
+from column rows (crud.get_ticket_payload_page) and encodes it with orjson,
+bypassing response_model validation. The JSON is the same as the pydantic
+path's, which API_SERIALIZATION=pydantic restores.
+"""
+import enum
+import json
+import os
+from datetime import date, datetime
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead, more slowly
+    orjson = None
+
+API_SERIALIZATION = os.getenv("API_SERIALIZATION", "fast")
+
+def _default(value):
+    # orjson's native handling of the types the payloads hold
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """A JSONResponse for payloads of plain dicts, lists, datetimes and enums."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
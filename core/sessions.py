@@ -0,0 +1,84 @@
+import logging
+import os
+import secrets
+import time
+from typing import Optional
+import jwt
+from core.identity import UserIdentity
+
+logger = logging.getLogger(__name__)
+
+# Session tokens: HS256 JWTs carrying the user's id, name, email and role, so
+# requests can be authorized without reading the users table.
+# SESSION_SIGNING_KEYS is "kid:secret,kid:secret"; the first key signs, the
+# rest are accepted for verification only, which allows rotation without
+# logging everyone out.
+SESSION_COOKIE_NAME = "session"
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(8 * 3600)))
+SESSION_COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "false").lower() == "true"
+TOKEN_ALGORITHM = "HS256"
+# Also accept a bare user_email/email parameter, as the pages did before
+# sessions existed. Turn off once all clients carry a session.
+LEGACY_EMAIL_AUTH = os.getenv("LEGACY_EMAIL_AUTH", "true").lower() == "true"
+
+def load_signing_keys(spec):
+    keys = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kid, _, secret = entry.partition(":")
+        if not secret:
+            raise ValueError("SESSION_SIGNING_KEYS entries must look like kid:secret")
+        keys[kid] = secret
+    return keys
+
+SIGNING_KEYS = load_signing_keys(os.getenv("SESSION_SIGNING_KEYS", ""))
+if not SIGNING_KEYS:
+    # Fine for a single dev process; tokens won't survive a restart or be
+    # accepted by other workers
+    logger.warning("SESSION_SIGNING_KEYS is not set; using a random per-process key")
+    SIGNING_KEYS = {"dev": secrets.token_urlsafe(32)}
+ACTIVE_KEY_ID = next(iter(SIGNING_KEYS))
+
+class InvalidSessionToken(Exception):
+    """The token is malformed, expired, or signed with an unknown key."""
+
+def create_access_token(data: dict, expires_in: Optional[int] = None) -> str:
+    now = int(time.time())
+    payload = dict(data, iat=now, exp=now + (expires_in or SESSION_TTL))
+    return jwt.encode(payload, SIGNING_KEYS[ACTIVE_KEY_ID], algorithm=TOKEN_ALGORITHM, headers={"kid": ACTIVE_KEY_ID})
+
+def decode_access_token(token: str) -> dict:
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid not in SIGNING_KEYS:
+            raise InvalidSessionToken("unknown signing key")
+        return jwt.decode(token, SIGNING_KEYS[kid], algorithms=[TOKEN_ALGORITHM])
+    except jwt.PyJWTError as exc:
+        raise InvalidSessionToken(str(exc)) from exc
+
+def create_session_token(identity: UserIdentity) -> str:
+    return create_access_token({"sub": str(identity.id), "email": identity.email, "name": identity.name, "role": identity.role.value})
+
+def identity_from_token(token: str) -> Optional[UserIdentity]:
+    try:
+        claims = decode_access_token(token)
+        return UserIdentity.from_dict({"id": int(claims["sub"]), "name": claims["name"], "email": claims["email"], "role": claims["role"]})
+    except (InvalidSessionToken, KeyError, ValueError):
+        return None
+
+def request_identity(request) -> Optional[UserIdentity]:
+    # Session cookie for the browser UI, bearer token for API clients
+    token = request.cookies.get(SESSION_COOKIE_NAME)
+    if not token:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    return identity_from_token(token) if token else None
+
+def set_session_cookie(response, identity: UserIdentity):
+    response.set_cookie(
+        SESSION_COOKIE_NAME,
+        create_session_token(identity),
+        max_age=SESSION_TTL,
+        httponly=True,
+        samesite="lax",
+        secure=SESSION_COOKIE_SECURE
+    )
@@ -0,0 +1,59 @@
+"""The one Jinja environment behind every page, with compiled templates kept on disk.
+
+Jinja turns each template into Python code the first time it's loaded. With a
+TEMPLATE_CACHE_DIR that code is also written to a FileSystemBytecodeCache, so
+a fresh process only unmarshals it; entries are keyed by the template source,
+so an edited template is simply compiled again. warm() loads every template
+before the app takes traffic, and a deploy can fill the cache ahead:
+
+    python -m core.templating compile
+
+TEMPLATE_AUTO_RELOAD=false stops Jinja from checking each template's file for
+changes on every render, for releases where templates never change in place.
+"""
+import argparse
+import os
+import time
+from typing import Optional
+import jinja2
+from fastapi.templating import Jinja2Templates
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(ROOT, "templates")
+# Empty keeps compiled templates in memory only
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(ROOT, "build", "jinja"))
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "true").lower() == "true"
+
+def bytecode_cache(directory: Optional[str] = TEMPLATE_CACHE_DIR) -> Optional[jinja2.BytecodeCache]:
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(directory)
+
+def environment(directory: str = TEMPLATES_DIR, cache_dir: Optional[str] = TEMPLATE_CACHE_DIR) -> jinja2.Environment:
+    # What Jinja2Templates(directory=...) would build, plus the bytecode cache
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        autoescape=True,
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        bytecode_cache=bytecode_cache(cache_dir),
+    )
+
+templates = Jinja2Templates(env=environment())
+
+def warm(env: jinja2.Environment = templates.env) -> int:
+    """Loads every template into the environment's cache; returns how many."""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compiled Jinja templates")
+    parser.add_argument("command", choices=["compile"])
+    args = parser.parse_args()
+    if not TEMPLATE_CACHE_DIR:
+        parser.error("TEMPLATE_CACHE_DIR is empty; there is nowhere to write compiled templates")
+    started = time.perf_counter()
+    count = warm()
+    print(f"Compiled {count} templates into {TEMPLATE_CACHE_DIR} in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,354 @@
+"""Automatic triage: a category and a suggested priority for every ticket.
+
+Tickets are scored on subject + description by a nearest-centroid TF-IDF
+model: each ticket's L2-normalised TF-IDF vector is compared (cosine) with one
+centroid per category and one per priority, and the best match wins when it
+scores at least TRIAGE_MIN_SCORE. A batch is scored with a handful of numpy
+operations whatever its size, so the per-ticket cost is mostly tokenizing.
+
+The model is trained offline from historical tickets, active and archived:
+
+- priorities are learned from the priorities tickets were filed with
+- categories start from the keyword lists below; training labels history
+  with them and learns the words that co-occur, so "VAT" ends up near billing
+
+Without a trained model at TRIAGE_MODEL_PATH the keyword lists themselves are
+the model. Processes pick up a retrained file on their next batch.
+
+New tickets are triaged by a "triage" job (see core.jobs), which takes the
+newest untriaged tickets in batches. Bulk imports enqueue no jobs; they, and
+everything after retraining, are rescored from the command line.
+
+    python -m core.triage train           # writes TRIAGE_MODEL_PATH
+    python -m core.triage rescore         # every active ticket
+    python -m core.triage rescore --pending
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Sequence
+import numpy as np
+from sqlalchemy import bindparam, func, select, union_all
+from sqlalchemy.orm import Session
+import models
+from core import jobs, render_cache
+
+TRIAGE_MODEL_PATH = os.getenv("TRIAGE_MODEL_PATH", "triage_model.npz")
+TRIAGE_BATCH_SIZE = int(os.getenv("TRIAGE_BATCH_SIZE", "500"))
+TRIAGE_MIN_SCORE = float(os.getenv("TRIAGE_MIN_SCORE", "0.05"))
+TRIAGE_VOCABULARY_SIZE = int(os.getenv("TRIAGE_VOCABULARY_SIZE", "20000"))
+TRIAGE_TRAIN_LIMIT = int(os.getenv("TRIAGE_TRAIN_LIMIT", "200000"))
+DEFAULT_CATEGORY = "general"
+
+CATEGORY_KEYWORDS = {
+    "billing": "bill billing billed invoice invoices charge charged charges refund refunds payment payments paid card subscription price pricing receipt",
+    "account": "account login log password reset locked signin sign username email verify verification 2fa authentication profile",
+    "bug": "error errors bug bugs crash crashes crashed broken fails failed failing failure exception blank glitch",
+    "performance": "slow slowly timeout timeouts latency loading lag lagging hangs freezes freezing",
+    "shipping": "delivery deliver delivered shipping shipped shipment order orders package parcel tracking courier arrived",
+    "feature_request": "feature features request suggestion suggest idea wish would love improvement",
+}
+PRIORITY_KEYWORDS = {
+    "high": "urgent asap immediately outage down critical emergency blocked blocking production cannot unable",
+    "medium": "error broken issue problem wrong failed incorrect",
+    "low": "question wondering curious suggestion feature idea minor typo cosmetic",
+}
+PRIORITY_ALIASES = {"urgent": "high", "critical": "high", "normal": "medium"}
+STOP_WORDS = frozenset(
+    "a an and are as at be been but by can could do does for from had has have how i i'm if in is it it's its me my "
+    "no not of on or our please so that the their them then there this to was we were what when which who will with "
+    "would you your hi hello thanks thank regards".split()
+)
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOP_WORDS]
+
+def ticket_text(subject: Optional[str], description: Optional[str]) -> str:
+    return f"{subject or ''}\n{description or ''}"
+
+def normalize_priority(priority: Optional[str]) -> Optional[str]:
+    value = (priority or "").strip().lower()
+    value = PRIORITY_ALIASES.get(value, value)
+    return value if value in PRIORITY_KEYWORDS else None
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+class TriageModel:
+    """Vocabulary, idf weights and one centroid per class for each head."""
+
+    def __init__(self, vocabulary: Sequence[str], idf: np.ndarray, categories: Sequence[str], category_centroids: np.ndarray,
+                 priorities: Sequence[str], priority_centroids: np.ndarray, source: str, trained_at: Optional[str] = None,
+                 documents: int = 0):
+        self.vocabulary = list(vocabulary)
+        self.index = {term: i for i, term in enumerate(self.vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.categories = list(categories)
+        self.category_centroids = np.asarray(category_centroids, dtype=np.float32)
+        self.priorities = list(priorities)
+        self.priority_centroids = np.asarray(priority_centroids, dtype=np.float32)
+        self.source = source
+        self.trained_at = trained_at
+        self.documents = documents
+
+    @classmethod
+    def from_keywords(cls) -> "TriageModel":
+        keywords = {**{f"category:{name}": words for name, words in CATEGORY_KEYWORDS.items()},
+                    **{f"priority:{name}": words for name, words in PRIORITY_KEYWORDS.items()}}
+        vocabulary = sorted({word for words in keywords.values() for word in words.split()})
+        index = {term: i for i, term in enumerate(vocabulary)}
+
+        def centroids(names, head):
+            matrix = np.zeros((len(names), len(vocabulary)), dtype=np.float32)
+            for row, name in enumerate(names):
+                matrix[row, [index[word] for word in keywords[f"{head}:{name}"].split()]] = 1
+            return _normalize_rows(matrix)
+
+        return cls(vocabulary, np.ones(len(vocabulary)), list(CATEGORY_KEYWORDS), centroids(list(CATEGORY_KEYWORDS), "category"),
+                   list(PRIORITY_KEYWORDS), centroids(list(PRIORITY_KEYWORDS), "priority"), source="keywords")
+
+    def vectorize(self, texts: Sequence[str]):
+        """Sparse TF-IDF rows as (row, column, weight) arrays sorted by row, each row of unit length."""
+        index = self.index
+        columns = []
+        lengths = np.empty(len(texts), dtype=np.int64)
+        for row, text in enumerate(texts):
+            ids = [i for i in map(index.get, tokenize(text)) if i is not None]
+            columns.extend(ids)
+            lengths[row] = len(ids)
+        width = max(len(self.vocabulary), 1)
+        keys = np.repeat(np.arange(len(texts), dtype=np.int64), lengths) * width + np.asarray(columns, dtype=np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        rows, cols = np.divmod(keys, width)
+        # Sublinear term frequency, so one repeated word doesn't swamp the rest
+        weights = ((1 + np.log(counts)) * self.idf[cols]).astype(np.float32)
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(texts)))
+        weights /= norms[rows]
+        return rows, cols, weights
+
+    @staticmethod
+    def similarities(vectors, count: int, centroids: np.ndarray) -> np.ndarray:
+        rows, cols, weights = vectors
+        scores = np.zeros((count, len(centroids)), dtype=np.float32)
+        if len(rows):
+            present, starts = np.unique(rows, return_index=True)
+            scores[present] = np.add.reduceat(weights[:, None] * centroids[:, cols].T, starts)
+        return scores
+
+    def predict(self, texts: Sequence[str]) -> List[dict]:
+        vectors = self.vectorize(texts)
+        heads = []
+        for labels, centroids, default in ((self.categories, self.category_centroids, DEFAULT_CATEGORY),
+                                           (self.priorities, self.priority_centroids, None)):
+            scores = self.similarities(vectors, len(texts), centroids)
+            best = scores.argmax(axis=1) if labels else np.zeros(len(texts), dtype=np.int64)
+            top = scores[np.arange(len(texts)), best] if labels else np.zeros(len(texts))
+            heads.append([labels[b] if s >= TRIAGE_MIN_SCORE else default for b, s in zip(best.tolist(), top.tolist())])
+        return [{"category": category, "suggested_priority": priority} for category, priority in zip(*heads)]
+
+    def save(self, path: str) -> None:
+        # Written beside the target and renamed, so readers never see half a file
+        partial = f"{path}.partial.npz"
+        np.savez_compressed(
+            partial, vocabulary=np.array(self.vocabulary), idf=self.idf,
+            categories=np.array(self.categories), category_centroids=self.category_centroids,
+            priorities=np.array(self.priorities), priority_centroids=self.priority_centroids,
+            trained_at=np.array(self.trained_at or ""), documents=np.array(self.documents)
+        )
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TriageModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["vocabulary"].tolist(), data["idf"], data["categories"].tolist(), data["category_centroids"],
+                       data["priorities"].tolist(), data["priority_centroids"], source="trained",
+                       trained_at=str(data["trained_at"]) or None, documents=int(data["documents"]))
+
+def train(texts: Sequence[str], priorities: Sequence[Optional[str]], vocabulary_size: int = TRIAGE_VOCABULARY_SIZE,
+          min_df: int = 2) -> TriageModel:
+    """Fits a model to historical ticket texts and the priorities they were filed with."""
+    df = Counter()
+    for text in texts:
+        df.update(set(tokenize(text)))
+    vocabulary = sorted(term for term, _ in sorted(
+        ((term, count) for term, count in df.items() if count >= min_df), key=lambda item: (-item[1], item[0])
+    )[:vocabulary_size])
+    # Keywords stay in the vocabulary even when history rarely uses them
+    keywords = TriageModel.from_keywords()
+    vocabulary = sorted(set(vocabulary) | set(keywords.vocabulary))
+    idf = np.log((1 + len(texts)) / (1 + np.array([df[term] for term in vocabulary], dtype=np.float64))) + 1
+    model = TriageModel(vocabulary, idf, [], np.zeros((0, len(vocabulary))), [], np.zeros((0, len(vocabulary))),
+                        source="trained", trained_at=datetime.now().isoformat(timespec="seconds"), documents=len(texts))
+    rows, cols, weights = model.vectorize(texts)
+
+    def fit(labels: Sequence[Optional[str]], names: Sequence[str]):
+        # Each class's centroid is the mean of its documents' vectors, renormalised
+        label_ids = np.array([names.index(label) if label in names else -1 for label in labels], dtype=np.int64)
+        per_entry = label_ids[rows]
+        present = [name for i, name in enumerate(names) if (label_ids == i).any()]
+        matrix = np.zeros((len(present), len(vocabulary)), dtype=np.float64)
+        for row, name in enumerate(present):
+            mask = per_entry == names.index(name)
+            matrix[row] = np.bincount(cols[mask], weights=weights[mask], minlength=len(vocabulary))
+        return present, _normalize_rows(matrix)
+
+    # Categories are labelled by the keyword model, priorities by what tickets were filed with
+    seeded = [prediction["category"] for prediction in keywords.predict(texts)]
+    model.categories, model.category_centroids = fit(seeded, list(CATEGORY_KEYWORDS))
+    model.priorities, model.priority_centroids = fit([normalize_priority(p) for p in priorities], list(PRIORITY_KEYWORDS))
+    if not model.categories or not model.priorities:
+        raise ValueError("not enough labelled tickets to train on")
+    return model
+
+class TriageStats:
+    """Tickets triaged by this process, the time spent, and the model in use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tickets = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.model_loads = 0
+        self.model_load_seconds = 0.0
+
+    def record(self, tickets: int, elapsed: float):
+        with self._lock:
+            self.tickets += tickets
+            self.batches += 1
+            self.seconds += elapsed
+
+    def record_load(self, elapsed: float):
+        with self._lock:
+            self.model_loads += 1
+            self.model_load_seconds = elapsed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            loaded = _loaded[1]
+            return {
+                "tickets": self.tickets,
+                "batches": self.batches,
+                "seconds": round(self.seconds, 6),
+                "tickets_per_second": round(self.tickets / self.seconds, 1) if self.seconds else None,
+                "model_loads": self.model_loads,
+                "model_load_seconds": round(self.model_load_seconds, 6),
+                "model_source": loaded.source if loaded else None,
+                "model_trained_at": loaded.trained_at if loaded else None,
+                "model_vocabulary": len(loaded.vocabulary) if loaded else None,
+            }
+
+stats = TriageStats()
+_load_lock = threading.Lock()
+_loaded = [None, None]  # (file mtime or None for the keyword model, model)
+
+def current_model(path: Optional[str] = None) -> TriageModel:
+    """The model at path, reloaded when the file changes; the keyword model when there is none."""
+    path = path or TRIAGE_MODEL_PATH
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    with _load_lock:
+        if _loaded[1] is None or _loaded[0] != mtime:
+            started = time.perf_counter()
+            _loaded[1] = TriageModel.load(path) if mtime is not None else TriageModel.from_keywords()
+            _loaded[0] = mtime
+            stats.record_load(time.perf_counter() - started)
+        return _loaded[1]
+
+def apply(db: Session, rows, pending_only: bool = False) -> int:
+    """Scores rows of (id, subject, description) and stores the results in db's transaction."""
+    if not rows:
+        return 0
+    started = time.perf_counter()
+    predictions = current_model().predict([ticket_text(row.subject, row.description) for row in rows])
+    tickets = models.Ticket.__table__
+    stmt = tickets.update().where(tickets.c.id == bindparam("ticket_id"))
+    if pending_only:
+        # Another worker may have got there first; its answer stands
+        stmt = stmt.where(tickets.c.triaged_at.is_(None))
+    now = datetime.now()
+    db.connection().execute(stmt.values(
+        category=bindparam("category"), suggested_priority=bindparam("suggested_priority"), triaged_at=now
+    ), [{"ticket_id": row.id, **prediction} for row, prediction in zip(rows, predictions)])
+    stats.record(len(rows), time.perf_counter() - started)
+    return len(rows)
+
+def triage_pending(db: Session, limit: int = TRIAGE_BATCH_SIZE) -> int:
+    """Triages up to limit untriaged tickets, newest first; the caller commits."""
+    tickets = models.Ticket.__table__
+    rows = db.execute(
+        select(tickets.c.id, tickets.c.user_id, tickets.c.subject, tickets.c.description)
+        .where(tickets.c.triaged_at.is_(None)).order_by(tickets.c.id.desc()).limit(limit)
+    ).all()
+    # Core statements bypass the flush hooks, so name the pages that changed
+    render_cache.mark_changed(db, "all", *(f"ticket:{row.id}" for row in rows))
+    return apply(db, rows, pending_only=True)
+
+@jobs.handler("triage")
+def triage_job(db: Session, payload: dict) -> None:
+    # Whichever job runs first takes every ticket waiting, so a burst is one batch
+    triage_pending(db)
+
+def rescore(db: Session, batch_size: int = 5000, pending_only: bool = False) -> int:
+    """Triages every active ticket (or every untriaged one) again, committing per batch."""
+    tickets = models.Ticket.__table__
+    query = select(tickets.c.id, tickets.c.subject, tickets.c.description).order_by(tickets.c.id).limit(batch_size)
+    if pending_only:
+        query = query.where(tickets.c.triaged_at.is_(None))
+    total, last_id = 0, 0
+    while True:
+        rows = db.execute(query.where(tickets.c.id > last_id)).all()
+        if not rows:
+            break
+        total += apply(db, rows)
+        db.commit()
+        last_id = rows[-1].id
+    if total:
+        render_cache.render_cache.clear()
+    return total
+
+def untriaged_count(db: Session) -> int:
+    tickets = models.Ticket.__table__
+    return db.scalar(select(func.count()).select_from(tickets).where(tickets.c.triaged_at.is_(None)))
+
+def training_set(db: Session, limit: int = TRIAGE_TRAIN_LIMIT):
+    """The newest limit tickets, active and archived, as (texts, priorities)."""
+    history = union_all(*(
+        select(table.c.subject, table.c.description, table.c.priority, table.c.created_at)
+        for table in (models.Ticket.__table__, models.ArchivedTicket.__table__)
+    )).subquery()
+    rows = db.execute(select(history).order_by(history.c.created_at.desc()).limit(limit)).all()
+    return [ticket_text(row.subject, row.description) for row in rows], [row.priority for row in rows]
+
+def queue_stats(db: Session) -> dict:
+    return {**stats.snapshot(), "untriaged": untriaged_count(db)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ticket triage model and backlog scoring")
+    parser.add_argument("command", choices=["train", "rescore"])
+    parser.add_argument("--limit", type=int, default=TRIAGE_TRAIN_LIMIT, help="train on this many of the newest tickets")
+    parser.add_argument("--vocabulary-size", type=int, default=TRIAGE_VOCABULARY_SIZE)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--pending", action="store_true", help="rescore only tickets not triaged yet")
+    args = parser.parse_args()
+    from database import SessionLocal
+    with SessionLocal() as db:
+        if args.command == "train":
+            started = time.perf_counter()
+            texts, priorities = training_set(db, args.limit)
+            model = train(texts, priorities, args.vocabulary_size)
+            model.save(TRIAGE_MODEL_PATH)
+            print(f"Trained on {len(texts)} tickets in {time.perf_counter() - started:.1f}s: "
+                  f"{len(model.vocabulary)} terms, categories {model.categories}, priorities {model.priorities}")
+        else:
+            started = time.perf_counter()
+            count = rescore(db, args.batch_size, args.pending)
+            elapsed = time.perf_counter() - started
+            print(f"Triaged {count} tickets in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s)")
@@ -0,0 +1,118 @@
+"""Agent work queue: priority-and-age ordering and atomic ticket claiming.
+
+Unassigned open tickets are handed out oldest queue_due_at first, where
+queue_due_at is created_at moved earlier by the ticket's priority boost. A
+high ticket jumps ahead of a day of newer low ones, but a low ticket that has
+waited long enough still beats fresh high ones.
+
+Claiming locks the chosen row with FOR UPDATE SKIP LOCKED on Postgres, so
+concurrent claimers each take a different ticket without waiting on each
+other. SQLite has no row locks; there a claim takes the database write lock
+first, which serializes claims instead.
+
+    python -m core.work_queue rescore    # after changing QUEUE_PRIORITY_BOOST_HOURS
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import bindparam, event, literal_column, select, update, false
+from sqlalchemy.orm import Session
+import models
+from core import counters
+
+def load_boosts(raw: str) -> Dict[str, float]:
+    # "high:24,medium:8": hours each priority is moved up the queue
+    boosts = {}
+    for entry in filter(None, (part.strip() for part in raw.split(","))):
+        priority, _, hours = entry.partition(":")
+        boosts[priority.strip().lower()] = float(hours)
+    return boosts
+
+PRIORITY_BOOST_HOURS = load_boosts(os.getenv("QUEUE_PRIORITY_BOOST_HOURS", "high:24,medium:8"))
+WORK_QUEUE_PEEK_MAX = int(os.getenv("WORK_QUEUE_PEEK_MAX", "100"))
+
+def due_at(created_at: Optional[datetime], priority: Optional[str]) -> datetime:
+    boost = PRIORITY_BOOST_HOURS.get((priority or "").lower(), 0)
+    return (created_at or datetime.now()) - timedelta(hours=boost)
+
+@event.listens_for(models.Ticket, "before_insert")
+def _set_queue_due_at(mapper, connection, ticket):
+    if ticket.queue_due_at is None:
+        if ticket.created_at is None:
+            ticket.created_at = datetime.now()
+        ticket.queue_due_at = due_at(ticket.created_at, ticket.priority)
+
+def queue_query():
+    # Matches the partial index ix_tickets_work_queue column for column. The
+    # status is a literal: SQLite only uses a partial index when the query's
+    # WHERE provably implies the index's, which a bound parameter doesn't
+    return select(models.Ticket).where(
+        models.Ticket.assignee_id.is_(None),
+        models.Ticket.status == literal_column("'open'")
+    ).order_by(models.Ticket.queue_due_at, models.Ticket.id)
+
+def peek(db: Session, limit: int) -> List[models.Ticket]:
+    return list(db.scalars(queue_query().limit(limit)))
+
+def lock_for_claim(db: Session) -> None:
+    # Any write statement takes SQLite's RESERVED lock, even one matching no rows
+    tickets = models.Ticket.__table__
+    db.execute(update(tickets).where(false()).values(id=tickets.c.id))
+
+def claim_next(db: Session, agent_id: int) -> Optional[models.Ticket]:
+    """Assigns the next ticket in the queue to agent_id and moves it to in_progress."""
+    query = queue_query().limit(1).execution_options(populate_existing=True)
+    if db.get_bind().dialect.name == "postgresql":
+        # Rows locked by other claimers are passed over rather than waited on
+        query = query.with_for_update(skip_locked=True)
+    else:
+        lock_for_claim(db)
+    ticket = db.scalars(query).first()
+    if ticket is None:
+        db.rollback()
+        return None
+    old_status = ticket.status
+    ticket.assignee_id = agent_id
+    ticket.assigned_at = datetime.now()
+    ticket.status = models.TicketStatus.in_progress
+    counters.bump(db, counters.status_change_deltas(ticket, old_status))
+    db.commit()
+    return ticket
+
+def release(db: Session, ticket: models.Ticket) -> models.Ticket:
+    """Puts a claimed ticket back in the queue at its original place."""
+    old_status = ticket.status
+    ticket.assignee_id = None
+    ticket.assigned_at = None
+    ticket.status = models.TicketStatus.open
+    counters.bump(db, counters.status_change_deltas(ticket, old_status))
+    db.commit()
+    return ticket
+
+def claimed_by(db: Session, agent_id: int) -> List[models.Ticket]:
+    return list(db.scalars(
+        select(models.Ticket).where(
+            models.Ticket.assignee_id == agent_id,
+            models.Ticket.status != models.TicketStatus.closed
+        ).order_by(models.Ticket.assigned_at)
+    ))
+
+def rescore(db: Session, chunk_size: int = 5000) -> int:
+    """Recomputes queue_due_at for every ticket from the current boosts."""
+    tickets = models.Ticket.__table__
+    # Python-side arithmetic keeps this dialect-neutral; it runs rarely
+    rows = db.execute(select(tickets.c.id, tickets.c.created_at, tickets.c.priority)).all()
+    stmt = tickets.update().where(tickets.c.id == bindparam("ticket_id")).values(queue_due_at=bindparam("due"))
+    for first in range(0, len(rows), chunk_size):
+        db.connection().execute(stmt, [{"ticket_id": row.id, "due": due_at(row.created_at, row.priority)} for row in rows[first:first + chunk_size]])
+    db.commit()
+    return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agent work queue maintenance")
+    parser.add_argument("command", choices=["rescore"])
+    parser.parse_args()
+    from database import SessionLocal
+    with SessionLocal() as db:
+        print(f"Rescored {rescore(db)} tickets")
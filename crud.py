@@ -0,0 +1,285 @@
+import re
+from typing import List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import select, tuple_, table, column, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload, joinedload, contains_eager
+import models
+from database import run_db
+# work_queue and archive also register the hooks that set queue_due_at and closed_at
+from core import archive, counters, duplicates, jobs, work_queue
+from core.cache import user_cache, NOT_FOUND
+from core.identity import UserIdentity
+from core.pagination import encode_cursor
+
+# External-content FTS5 trigram table over users.name (see migration 0002)
+users_name_trgm = table("users_name_trgm", column("rowid"), column("name"))
+
+def customer_name_filter(dialect_name: str, customer_name: str):
+    pattern = f"%{customer_name}%"
+    if dialect_name == "sqlite":
+        # LIKE against a trigram FTS5 table is answered from its index
+        return models.User.id.in_(select(users_name_trgm.c.rowid).where(users_name_trgm.c.name.like(pattern)))
+    # On Postgres ILIKE is served by the pg_trgm GIN index
+    return models.User.name.ilike(pattern)
+
+# Everything the ticket templates touch is loaded up front: an AsyncSession
+# cannot lazy-load once the query has returned to the route handler
+def with_responses():
+    return selectinload(models.Ticket.responses).joinedload(models.TicketResponse.responder)
+
+def dashboard_tickets_query(user_id: Optional[int] = None, limit: int = 3):
+    query = select(models.Ticket).options(
+        joinedload(models.Ticket.user),
+        joinedload(models.Ticket.responses).joinedload(models.TicketResponse.responder)
+    )
+    if user_id is not None:
+        query = query.where(models.Ticket.user_id == user_id)
+    return query.order_by(models.Ticket.created_at.desc()).limit(limit)
+
+def ticket_model(archived: bool = False):
+    # Archived tickets have the same columns and relationships in their own tables
+    return models.ArchivedTicket if archived else models.Ticket
+
+def customer_tickets_query(user_id: int, archived: bool = False):
+    if not archived:
+        return select(models.Ticket).options(with_responses()).where(models.Ticket.user_id == user_id).order_by(models.Ticket.created_at.desc())
+    ticket = models.ArchivedTicket
+    return select(ticket).options(
+        selectinload(ticket.responses).joinedload(models.ArchivedTicketResponse.responder)
+    ).where(ticket.user_id == user_id).order_by(ticket.created_at.desc())
+
+def agent_tickets_query(dialect_name: str, status: Optional[str] = None, priority: Optional[str] = None, customer_name: Optional[str] = None):
+    query = select(models.Ticket).join(models.User, models.Ticket.user_id == models.User.id).options(
+        contains_eager(models.Ticket.user),
+        with_responses()
+    )
+    if status:
+        query = query.where(models.Ticket.status == status)
+    if priority:
+        query = query.where(models.Ticket.priority == priority)
+    if customer_name:
+        query = query.where(customer_name_filter(dialect_name, customer_name))
+    return query.order_by(models.Ticket.created_at.desc())
+
+# Per-ticket search document kept current by triggers (see migration 0004):
+# a weighted tsvector on Postgres, an FTS5 table keyed by ticket id on SQLite
+ticket_search_pg = table("ticket_search", column("ticket_id"), column("document"))
+ticket_search_fts = table("ticket_search", column("rowid"))
+
+def fts5_match(text: str) -> str:
+    # Quote every term so user input can't reach FTS5 query syntax; terms are ANDed
+    return " ".join(f'"{term}"' for term in re.findall(r"\w+", text))
+
+def ticket_search_query(
+    dialect_name: str,
+    text: str,
+    status: Optional[models.TicketStatus] = None,
+    priority: Optional[str] = None,
+    customer_id: Optional[int] = None
+):
+    if dialect_name == "postgresql":
+        tsquery = func.websearch_to_tsquery("english", text)
+        rank = func.ts_rank_cd(ticket_search_pg.c.document, tsquery)
+        stmt = select(models.Ticket, rank.label("search_rank")).join(
+            ticket_search_pg, ticket_search_pg.c.ticket_id == models.Ticket.id
+        ).where(ticket_search_pg.c.document.op("@@")(tsquery))
+    else:
+        # bm25() is lower-is-better; weights favour subject over description over responses
+        rank = -func.bm25(literal_column("ticket_search"), 10.0, 4.0, 1.0)
+        stmt = select(models.Ticket, rank.label("search_rank")).join(
+            ticket_search_fts, ticket_search_fts.c.rowid == models.Ticket.id
+        ).where(literal_column("ticket_search").op("MATCH")(fts5_match(text)))
+    stmt = stmt.options(selectinload(models.Ticket.responses))
+    if status:
+        stmt = stmt.where(models.Ticket.status == status)
+    if priority:
+        stmt = stmt.where(models.Ticket.priority == priority)
+    if customer_id is not None:
+        stmt = stmt.where(models.Ticket.user_id == customer_id)
+    return stmt.order_by(literal_column("search_rank").desc(), models.Ticket.id.desc())
+
+def listing_conditions(
+    ticket,
+    status: Optional[models.TicketStatus] = None,
+    priority: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    after: Optional[Tuple[datetime, int]] = None
+):
+    conditions = []
+    if status:
+        conditions.append(ticket.status == status)
+    if priority:
+        conditions.append(ticket.priority == priority)
+    if customer_id is not None:
+        conditions.append(ticket.user_id == customer_id)
+    if after is not None:
+        conditions.append(tuple_(ticket.created_at, ticket.id) < tuple_(*after))
+    return conditions
+
+def ticket_listing_query(archived: bool = False, **filters):
+    ticket = ticket_model(archived)
+    # Newest first, with id as the tie-breaker so the (created_at, id) keyset is total
+    stmt = select(ticket).options(selectinload(ticket.responses)).where(*listing_conditions(ticket, **filters))
+    return stmt.order_by(ticket.created_at.desc(), ticket.id.desc())
+
+def get_ticket_page(db: Session, limit: int, **filters) -> Tuple[List[models.Ticket], Optional[str]]:
+    # Fetch one extra row to learn whether another page exists without a COUNT(*)
+    tickets = db.scalars(ticket_listing_query(**filters).limit(limit + 1)).all()
+    if len(tickets) <= limit:
+        return list(tickets), None
+    last = tickets[limit - 1]
+    return list(tickets[:limit]), encode_cursor(last.created_at, last.id)
+
+# schemas.TicketResponseOut and TicketResponseResponse, field for field and in order
+TICKET_FIELDS = ["subject", "description", "priority", "id", "user_id", "status", "created_at", "category", "suggested_priority", "duplicate_of_id"]
+RESPONSE_FIELDS = ["message", "id", "responder_id", "timestamp"]
+
+def get_ticket_payload_page(db: Session, limit: int, archived: bool = False, **filters) -> Tuple[List[dict], Optional[str]]:
+    """get_ticket_page as plain dicts shaped like schemas.TicketResponseOut.
+
+    Selects only the serialized columns as rows, skipping ORM identity
+    tracking and per-object validation; responses come from one IN query.
+    """
+    ticket = ticket_model(archived)
+    response = models.ArchivedTicketResponse if archived else models.TicketResponse
+    rows = db.execute(
+        select(*(getattr(ticket, name) for name in TICKET_FIELDS))
+        .where(*listing_conditions(ticket, **filters))
+        .order_by(ticket.created_at.desc(), ticket.id.desc())
+        .limit(limit + 1)
+    ).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    tickets = [dict(zip(TICKET_FIELDS, row), responses=[]) for row in rows]
+    by_id = {payload["id"]: payload["responses"] for payload in tickets}
+    if by_id:
+        for row in db.execute(
+            select(response.ticket_id, *(getattr(response, name) for name in RESPONSE_FIELDS))
+            .where(response.ticket_id.in_(by_id)).order_by(response.id)
+        ):
+            by_id[row[0]].append(dict(zip(RESPONSE_FIELDS, row[1:])))
+    return tickets, next_cursor
+
+def release_batch(db, batch):
+    # Drop a streamed batch from the session. expunge_all() would also discard
+    # the identity map the still-open yield_per result is loading into
+    for ticket in batch:
+        for response in ticket.responses:
+            db.expunge(response)
+        db.expunge(ticket)
+
+def iter_ticket_batches(db: Session, batch_size: int, **filters):
+    # yield_per streams rows from a server-side cursor; selectinload then batch-loads
+    # responses one partition at a time, so memory is bounded by batch_size
+    result = db.scalars(ticket_listing_query(**filters).execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        yield batch
+        release_batch(db, batch)
+
+
+async def aiter_ticket_batches(db: AsyncSession, batch_size: int, **filters):
+    result = await db.stream_scalars(ticket_listing_query(**filters).execution_options(yield_per=batch_size))
+    async for batch in result.partitions():
+        yield batch
+        release_batch(db, batch)
+
+# Unit-of-work helpers. Each takes a sync Session so route handlers can run it
+# through database.run_db in either DB_MODE.
+
+def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
+    return db.scalars(select(models.User).where(models.User.email == email)).first()
+
+def create_user(db: Session, name: str, email: str, password_hash: str, role: str) -> models.User:
+    user = models.User(name=name, email=email, password_hash=password_hash, role=role)
+    db.add(user)
+    db.commit()
+    return user
+
+def update_password_hash(db: Session, user_id: int, password_hash: str) -> None:
+    user = db.get(models.User, user_id)
+    user.password_hash = password_hash
+    db.commit()
+
+def get_ticket(db: Session, ticket_id: int) -> Optional[models.Ticket]:
+    return db.get(models.Ticket, ticket_id)
+
+def create_ticket(db: Session, user_id: int, subject: str, description: str, priority: Optional[str]) -> models.Ticket:
+    ticket = models.Ticket(
+        user_id=user_id,
+        subject=subject,
+        description=description,
+        priority=priority,
+        status=models.TicketStatus.open,
+        duplicate_of_id=duplicates.find_duplicate(db, subject, description)
+    )
+    db.add(ticket)
+    db.flush()
+    counters.bump(db, counters.created_deltas(ticket))
+    # Committed with the ticket, so the acknowledgement can't be lost or sent for a rolled-back ticket
+    jobs.enqueue(db, "ticket_created", {"ticket_id": ticket.id})
+    jobs.enqueue(db, "triage", {"ticket_id": ticket.id})
+    db.commit()
+    db.refresh(ticket)
+    return ticket
+
+def add_ticket_response(db: Session, ticket_id: int, responder_id: int, message: str) -> models.TicketResponse:
+    response = models.TicketResponse(ticket_id=ticket_id, responder_id=responder_id, message=message)
+    db.add(response)
+    db.flush()
+    counters.bump(db, {counters.TOTAL_RESPONSES: 1})
+    jobs.enqueue(db, "ticket_response", {"response_id": response.id})
+    db.commit()
+    db.refresh(response)
+    return response
+
+def update_ticket_status(db: Session, ticket: models.Ticket, status: str) -> models.Ticket:
+    if status:
+        old_status = ticket.status
+        ticket.status = status
+        counters.bump(db, counters.status_change_deltas(ticket, old_status))
+    db.commit()
+    db.refresh(ticket)
+    return ticket
+
+def get_ticket_summary(db: Session) -> dict:
+    # Reads the maintained counters only, whatever the size of tickets
+    return counters.summarize(counters.read_counters(db))
+
+def list_dashboard_tickets(db: Session, user_id: Optional[int] = None) -> List[models.Ticket]:
+    return list(db.scalars(dashboard_tickets_query(user_id=user_id)).unique().all())
+
+def list_customer_tickets(db: Session, user_id: int, archived: bool = False) -> List[models.Ticket]:
+    return list(db.scalars(customer_tickets_query(user_id, archived)).all())
+
+def list_agent_tickets(db: Session, **filters) -> List[models.Ticket]:
+    return list(db.scalars(agent_tickets_query(db.get_bind().dialect.name, **filters)).all())
+
+def search_tickets(db: Session, text: str, limit: int, offset: int = 0, **filters) -> Tuple[List[Tuple[models.Ticket, float]], bool]:
+    """Ranked matches for text, plus whether another page follows."""
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name != "postgresql" and not fts5_match(text):
+        return [], False
+    rows = db.execute(ticket_search_query(dialect_name, text, **filters).limit(limit + 1).offset(offset)).all()
+    return [(ticket, rank) for ticket, rank in rows[:limit]], len(rows) > limit
+
+def warm_queries(db: Session) -> None:
+    # Each page's reads once, matching nothing, so their SQL is compiled before the first request
+    get_user_by_email(db, "")
+    list_dashboard_tickets(db, user_id=0)
+    list_customer_tickets(db, 0)
+    get_ticket_summary(db)
+
+async def get_user_identity(db, email: str) -> Optional[UserIdentity]:
+    # Read-through: cached identities (and cached absences) skip the users query
+    cached = user_cache.get_by_email(email)
+    if cached is NOT_FOUND:
+        return None
+    if cached is not None:
+        return cached
+    user = await run_db(db, get_user_by_email, email)
+    identity = UserIdentity.from_user(user) if user else None
+    user_cache.store(email, identity)
+    return identity
@@ -1,28 +1,117 @@
-from fastapi import FastAPI
-from routers import tickets, frontend
-from database import engine, Base
+import asyncio
+from contextlib import asynccontextmanager
+from sqlalchemy.orm import configure_mappers
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from routers import analytics, auth, bulk, events, tickets, frontend, metrics
+import crud
+import database
+from database import async_engine, replica_async_engines, SessionLocal, PrimaryStickinessMiddleware
+from core import archive, assets, counters, duplicates, jobs, templating
+from core.security import password_hasher, PasswordHashingBusy
+from core.instrumentation import ProfilingMiddleware
+from core.ratelimit import RateLimitMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+import logging
 import os
+import time
 
-app = FastAPI(title="Customer Feedback and Support Ticketing System")
- 
-# Create database tables     
-try:
-    Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created successfully")
-except Exception as e:
-    print(f"❌ Database connection failed: {e}")
-    raise              
+logger = logging.getLogger(__name__)
+
+# "startup" applies migrations in the lifespan hook, before the app takes traffic;
+# "skip" leaves them to a release step (python setup_db.py) run once per deploy
+SCHEMA_SETUP = os.getenv("SCHEMA_SETUP", "startup")
+# Load templates, open pooled connections, compile the page queries and start the hashing workers before serving
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+def setup_schema():
+    # Imported here: Alembic and the migration scripts are only needed when migrating
+    from setup_db import setup_database
+    try:
+        setup_database()
+        print("✅ Database migrations applied successfully")
+    except Exception as e:
+        print(f"❌ Database connection failed: {e}")
+        raise
+
+def warm_queries(session_factory=SessionLocal):
+    configure_mappers()
+    with session_factory() as db:
+        crud.warm_queries(db)
+
+async def warm_up(session_factory=SessionLocal, engines=None):
+    # engines defaults to the primary and its replicas
+    started = time.perf_counter()
+    compiled = await asyncio.to_thread(templating.warm)
+    opened = await asyncio.to_thread(database.open_connections, engines)
+    await asyncio.to_thread(warm_queries, session_factory)
+    opened += await database.open_async_connections()
+    await asyncio.to_thread(password_hasher.warm_up)
+    logger.info("Warmed up in %.2fs: %d templates, %d connections", time.perf_counter() - started, compiled, opened)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SCHEMA_SETUP == "startup":
+        await asyncio.to_thread(setup_schema)
+    if STARTUP_WARMUP:
+        await warm_up()
+    reconciler = None
+    if counters.COUNTER_RECONCILE_INTERVAL > 0:
+        reconciler = asyncio.create_task(counters.reconcile_periodically(SessionLocal))
+    archiver = None
+    if archive.ARCHIVE_INTERVAL > 0:
+        archiver = asyncio.create_task(archive.archive_periodically(SessionLocal))
+    saver = None
+    if duplicates.DUPLICATE_DETECTION:
+        # Saved index plus the tickets since; without a saved file this indexes every active ticket
+        await asyncio.to_thread(duplicates.load_index, SessionLocal)
+        if duplicates.DUPLICATE_SAVE_INTERVAL > 0:
+            saver = asyncio.create_task(duplicates.save_periodically())
+    worker = None
+    if jobs.JOB_WORKERS > 0:
+        worker = jobs.Worker(SessionLocal, jobs.JOB_WORKERS)
+        worker.start()
+    yield
+    for task in (reconciler, archiver, saver):
+        if task is not None:
+            task.cancel()
+    if worker is not None:
+        # Lets running jobs finish; anything cut off is requeued by the lock timeout
+        await asyncio.to_thread(worker.stop, 10)
+    if duplicates.index.dirty:
+        await asyncio.to_thread(duplicates.index.save, duplicates.DUPLICATE_INDEX_PATH)
+    password_hasher.shutdown()
+    # Release pooled async connections (aiosqlite keeps a thread per connection)
+    for each in ([async_engine] if async_engine is not None else []) + replica_async_engines:
+        await each.dispose()
+
+app = FastAPI(title="Customer Feedback and Support Ticketing System", lifespan=lifespan)
                                                                                       
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    # The bcrypt pool is saturated; shed the request instead of queueing without bound
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"}, headers={"Retry-After": "1"})
+
+# Rate limits and concurrency caps for login, registration and the agent listing;
+# added first so the profiling middleware around it still counts rejected requests
+app.add_middleware(RateLimitMiddleware)
+
+# Per-request query/template profiling and the Prometheus metrics at /metrics
+app.add_middleware(ProfilingMiddleware)
+# Reads after a client's write go to the primary, not a lagging replica
+app.add_middleware(PrimaryStickinessMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
-                                                        
-# Setup templates directory with absolute path
-templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
-templates = Jinja2Templates(directory=templates_dir)
+# Fingerprinted, precompressed copies that browsers cache for good; templates link them with asset_url()
+if assets.ASSET_PIPELINE and assets.setup():
+    app.mount("/assets", assets.AssetFiles(directory=assets.ASSET_BUILD_DIR), name="assets")
 
 # Include routers
 app.include_router(frontend.router)
-# app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
+app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(tickets.router, prefix="", tags=["Tickets"])
+app.include_router(bulk.router, prefix="/bulk", tags=["Bulk"])
+app.include_router(events.router, prefix="/events", tags=["Events"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
+app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
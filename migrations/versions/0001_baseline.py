@@ -0,0 +1,73 @@
+"""Baseline schema: users, tickets and ticket_responses
+
+Databases created by the old Base.metadata.create_all call already have these
+tables, so each one is only created when missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-08-01 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Offline (--sql) runs have nothing to inspect and emit the full schema
+    existing = set() if op.get_context().as_sql else set(sa.inspect(op.get_bind()).get_table_names())
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(length=100), nullable=False),
+            sa.Column("email", sa.String(length=100), nullable=False),
+            sa.Column("password_hash", sa.String(length=255), nullable=False),
+            sa.Column("role", sa.Enum("customer", "support_agent", name="userrole"), nullable=False),
+            sa.PrimaryKeyConstraint("id")
+        )
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+        op.create_index("ix_users_id", "users", ["id"])
+    if "tickets" not in existing:
+        op.create_table(
+            "tickets",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("subject", sa.String(length=255), nullable=False),
+            sa.Column("description", sa.Text(), nullable=False),
+            sa.Column("priority", sa.String(length=50), nullable=True),
+            sa.Column("status", sa.Enum("open", "in_progress", "closed", name="ticketstatus"), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id")
+        )
+        op.create_index("ix_tickets_id", "tickets", ["id"])
+    if "ticket_responses" not in existing:
+        op.create_table(
+            "ticket_responses",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("ticket_id", sa.Integer(), nullable=False),
+            sa.Column("responder_id", sa.Integer(), nullable=False),
+            sa.Column("message", sa.Text(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["responder_id"], ["users.id"]),
+            sa.ForeignKeyConstraint(["ticket_id"], ["tickets.id"]),
+            sa.PrimaryKeyConstraint("id")
+        )
+        op.create_index("ix_ticket_responses_id", "ticket_responses", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("ticket_responses")
+    op.drop_table("tickets")
+    op.drop_table("users")
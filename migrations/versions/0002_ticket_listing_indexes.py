@@ -0,0 +1,76 @@
+"""Composite indexes for the ticket listing paths and customer-name search
+
+Every listing sorts by created_at DESC (id breaks ties for keyset paging),
+optionally filtered by user_id, status or priority. The customer-name
+substring search gets a pg_trgm GIN index on Postgres and an FTS5 trigram
+table kept in sync by triggers on SQLite.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-08-01 00:00:01.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TICKET_INDEXES = {
+    "ix_tickets_created_at_id": ["created_at", "id"],
+    "ix_tickets_user_id_created_at": ["user_id", "created_at", "id"],
+    "ix_tickets_status_created_at": ["status", "created_at", "id"],
+    "ix_tickets_priority_created_at": ["priority", "created_at", "id"],
+}
+
+SQLITE_NAME_SEARCH = [
+    "CREATE VIRTUAL TABLE users_name_trgm USING fts5(name, content='users', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER users_name_trgm_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_name_trgm(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER users_name_trgm_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_name_trgm(users_name_trgm, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER users_name_trgm_au AFTER UPDATE OF name ON users BEGIN "
+    "INSERT INTO users_name_trgm(users_name_trgm, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO users_name_trgm(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO users_name_trgm(users_name_trgm) VALUES ('rebuild')",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    # Rows created while the model default was evaluated once at import time
+    # may carry NULLs from older schemas; keyset paging needs a value
+    op.execute(sa.text("UPDATE tickets SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+    for name, columns in TICKET_INDEXES.items():
+        op.create_index(name, "tickets", columns)
+    op.create_index("ix_ticket_responses_ticket_id", "ticket_responses", ["ticket_id"])
+    if dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            "ix_users_name_trgm", "users", ["name"],
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        )
+    elif dialect == "sqlite":
+        for statement in SQLITE_NAME_SEARCH:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.drop_index("ix_users_name_trgm", table_name="users")
+    elif dialect == "sqlite":
+        for trigger in ("users_name_trgm_ai", "users_name_trgm_ad", "users_name_trgm_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS users_name_trgm")
+    op.drop_index("ix_ticket_responses_ticket_id", table_name="ticket_responses")
+    for name in TICKET_INDEXES:
+        op.drop_index(name, table_name="tickets")
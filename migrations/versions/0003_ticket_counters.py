@@ -0,0 +1,50 @@
+"""Ticket counters table, backfilled from existing tickets
+
+One row per counter (see core.counters). The backfill mirrors
+core.counters.actual_counters so the first reconciliation finds no drift.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-08-01 00:00:02.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EPOCH = {
+    "postgresql": "CAST(FLOOR(EXTRACT(EPOCH FROM created_at)) AS BIGINT)",
+    "sqlite": "CAST(strftime('%s', created_at) AS BIGINT)",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    op.create_table(
+        "ticket_counters",
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("value", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("name")
+    )
+    for statement in (
+        "SELECT 'tickets', COUNT(*) FROM tickets",
+        "SELECT 'responses', COUNT(*) FROM ticket_responses",
+        f"SELECT 'backlog_created_at_sum', COALESCE(SUM({EPOCH.get(dialect, EPOCH['sqlite'])}), 0) FROM tickets WHERE status != 'closed'",
+        "SELECT 'status:' || CAST(status AS VARCHAR), COUNT(*) FROM tickets GROUP BY status",
+        "SELECT 'priority:' || COALESCE(priority, 'none'), COUNT(*) FROM tickets GROUP BY COALESCE(priority, 'none')",
+    ):
+        op.execute(f"INSERT INTO ticket_counters (name, value) {statement}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("ticket_counters")
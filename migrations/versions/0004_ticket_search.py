@@ -0,0 +1,98 @@
+"""Full-text search document per ticket: subject, description and responses
+
+Postgres keeps a weighted tsvector per ticket in ticket_search (GIN indexed);
+SQLite keeps an FTS5 table of the same name keyed by ticket id. Triggers on
+tickets and ticket_responses update the affected ticket's document on every
+write, so search never needs a rebuild.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-08-01 00:00:03.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+POSTGRES_SEARCH = [
+    "CREATE TABLE ticket_search ("
+    "ticket_id INTEGER PRIMARY KEY REFERENCES tickets(id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX ix_ticket_search_document ON ticket_search USING gin (document)",
+    # Rebuilds one ticket's document; cost is bounded by that ticket's responses
+    "CREATE FUNCTION ticket_search_refresh(tid INTEGER) RETURNS void AS $$ "
+    "INSERT INTO ticket_search (ticket_id, document) "
+    "SELECT t.id, "
+    "setweight(to_tsvector('english', coalesce(t.subject, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(t.description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce((SELECT string_agg(r.message, ' ') FROM ticket_responses r WHERE r.ticket_id = t.id), '')), 'C') "
+    "FROM tickets t WHERE t.id = tid "
+    "ON CONFLICT (ticket_id) DO UPDATE SET document = excluded.document "
+    "$$ LANGUAGE sql",
+    "CREATE FUNCTION ticket_search_on_ticket() RETURNS trigger AS $$ "
+    "BEGIN PERFORM ticket_search_refresh(NEW.id); RETURN NULL; END "
+    "$$ LANGUAGE plpgsql",
+    "CREATE FUNCTION ticket_search_on_response() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP <> 'INSERT' THEN PERFORM ticket_search_refresh(OLD.ticket_id); END IF; "
+    "IF TG_OP <> 'DELETE' THEN PERFORM ticket_search_refresh(NEW.ticket_id); END IF; "
+    "RETURN NULL; END "
+    "$$ LANGUAGE plpgsql",
+    "CREATE TRIGGER ticket_search_ticket AFTER INSERT OR UPDATE OF subject, description ON tickets "
+    "FOR EACH ROW EXECUTE FUNCTION ticket_search_on_ticket()",
+    "CREATE TRIGGER ticket_search_response AFTER INSERT OR UPDATE OF message, ticket_id OR DELETE ON ticket_responses "
+    "FOR EACH ROW EXECUTE FUNCTION ticket_search_on_response()",
+    "SELECT ticket_search_refresh(id) FROM tickets",
+]
+
+SQLITE_RESPONSES = "coalesce((SELECT group_concat(message, ' ') FROM ticket_responses WHERE ticket_id = {}), '')"
+
+SQLITE_SEARCH = [
+    "CREATE VIRTUAL TABLE ticket_search USING fts5(subject, description, responses, tokenize='porter unicode61')",
+    "CREATE TRIGGER ticket_search_ai AFTER INSERT ON tickets BEGIN "
+    "INSERT INTO ticket_search(rowid, subject, description, responses) VALUES (new.id, new.subject, new.description, ''); END",
+    "CREATE TRIGGER ticket_search_au AFTER UPDATE OF subject, description ON tickets BEGIN "
+    "UPDATE ticket_search SET subject = new.subject, description = new.description WHERE rowid = new.id; END",
+    "CREATE TRIGGER ticket_search_ad AFTER DELETE ON tickets BEGIN "
+    "DELETE FROM ticket_search WHERE rowid = old.id; END",
+    # Appending is enough for a new response; edits and deletes rebuild the column
+    "CREATE TRIGGER ticket_search_response_ai AFTER INSERT ON ticket_responses BEGIN "
+    "UPDATE ticket_search SET responses = responses || ' ' || new.message WHERE rowid = new.ticket_id; END",
+    "CREATE TRIGGER ticket_search_response_au AFTER UPDATE OF message, ticket_id ON ticket_responses BEGIN "
+    f"UPDATE ticket_search SET responses = {SQLITE_RESPONSES.format('old.ticket_id')} WHERE rowid = old.ticket_id; "
+    f"UPDATE ticket_search SET responses = {SQLITE_RESPONSES.format('new.ticket_id')} WHERE rowid = new.ticket_id; END",
+    "CREATE TRIGGER ticket_search_response_ad AFTER DELETE ON ticket_responses BEGIN "
+    f"UPDATE ticket_search SET responses = {SQLITE_RESPONSES.format('old.ticket_id')} WHERE rowid = old.ticket_id; END",
+    "INSERT INTO ticket_search(rowid, subject, description, responses) "
+    f"SELECT id, subject, description, {SQLITE_RESPONSES.format('tickets.id')} FROM tickets",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for statement in POSTGRES_SEARCH if dialect == "postgresql" else SQLITE_SEARCH:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP TRIGGER IF EXISTS ticket_search_ticket ON tickets")
+        op.execute("DROP TRIGGER IF EXISTS ticket_search_response ON ticket_responses")
+        op.execute("DROP TABLE IF EXISTS ticket_search")
+        for function in ("ticket_search_on_ticket()", "ticket_search_on_response()", "ticket_search_refresh(INTEGER)"):
+            op.execute(f"DROP FUNCTION IF EXISTS {function}")
+    else:
+        for trigger in ("ticket_search_ai", "ticket_search_au", "ticket_search_ad",
+                        "ticket_search_response_ai", "ticket_search_response_au", "ticket_search_response_ad"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS ticket_search")
@@ -0,0 +1,36 @@
+"""Checkpoints for resumable bulk ticket imports
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-08-01 00:00:04.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "import_checkpoints",
+        sa.Column("job", sa.String(length=100), nullable=False),
+        sa.Column("rows_read", sa.BigInteger(), nullable=False),
+        sa.Column("imported", sa.BigInteger(), nullable=False),
+        sa.Column("rejected", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("job")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("import_checkpoints")
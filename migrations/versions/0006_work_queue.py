@@ -0,0 +1,94 @@
+"""Ticket assignment and the agent work queue
+
+tickets.assignee_id records the agent who claimed a ticket. queue_due_at is
+created_at moved earlier by a per-priority boost (see core.work_queue); the
+queue hands out unassigned open tickets in queue_due_at order, served by a
+partial index over exactly those rows.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-08-01 00:00:05.000000
+
+"""
+from contextlib import contextmanager
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+QUEUE_CONDITION = "assignee_id IS NULL AND status = 'open'"
+# core.work_queue's defaults; after changing QUEUE_PRIORITY_BOOST_HOURS run
+# python -m core.work_queue rescore
+PRIORITY_BOOST_HOURS = {"high": 24, "medium": 8}
+
+
+def backfill_due_at(dialect):
+    tickets = sa.table("tickets", sa.column("priority"), sa.column("created_at"), sa.column("queue_due_at"))
+    for priority, hours in PRIORITY_BOOST_HOURS.items():
+        if dialect == "postgresql":
+            due_at = tickets.c.created_at - sa.text(f"interval '{float(hours)} hours'")
+        else:
+            due_at = sa.func.datetime(tickets.c.created_at, f"-{float(hours)} hours")
+        op.execute(tickets.update().where(sa.func.lower(tickets.c.priority) == priority).values(queue_due_at=due_at))
+    op.execute(tickets.update().where(tickets.c.queue_due_at.is_(None)).values(queue_due_at=tickets.c.created_at))
+
+
+@contextmanager
+def rebuilding(table):
+    # A batch operation on SQLite copies the table into a new one; the triggers
+    # (the search triggers among them) go with the old table and partial
+    # indexes may come back without their WHERE, so both are put back as they were
+    conn = op.get_bind()
+    extras = conn.execute(sa.text(
+        "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = :name AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ), {"name": table}).all()
+    yield
+    for kind, name, statement in extras:
+        op.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    op.add_column("tickets", sa.Column("assignee_id", sa.Integer(), nullable=True))
+    if dialect == "sqlite":
+        # SQLite can't add a constraint to an existing table
+        with rebuilding("tickets"), op.batch_alter_table("tickets") as batch:
+            batch.create_foreign_key("fk_tickets_assignee_id_users", "users", ["assignee_id"], ["id"])
+    else:
+        op.create_foreign_key("fk_tickets_assignee_id_users", "tickets", "users", ["assignee_id"], ["id"])
+    op.add_column("tickets", sa.Column("assigned_at", sa.DateTime(), nullable=True))
+    op.add_column("tickets", sa.Column("queue_due_at", sa.DateTime(), nullable=True))
+    backfill_due_at(dialect)
+    op.create_index(
+        "ix_tickets_work_queue", "tickets", ["queue_due_at", "id"],
+        postgresql_where=sa.text(QUEUE_CONDITION), sqlite_where=sa.text(QUEUE_CONDITION)
+    )
+    op.create_index("ix_tickets_assignee_id", "tickets", ["assignee_id", "status"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_tickets_assignee_id", table_name="tickets")
+    op.drop_index("ix_tickets_work_queue", table_name="tickets")
+    if op.get_bind().dialect.name == "sqlite":
+        # SQLite won't drop a column that a foreign key uses
+        with rebuilding("tickets"), op.batch_alter_table("tickets") as batch:
+            batch.drop_constraint("fk_tickets_assignee_id_users", type_="foreignkey")
+            batch.drop_column("queue_due_at")
+            batch.drop_column("assigned_at")
+            batch.drop_column("assignee_id")
+        return
+    op.drop_constraint("fk_tickets_assignee_id_users", "tickets", type_="foreignkey")
+    op.drop_column("tickets", "queue_due_at")
+    op.drop_column("tickets", "assigned_at")
+    op.drop_column("tickets", "assignee_id")
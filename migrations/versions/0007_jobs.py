@@ -0,0 +1,56 @@
+"""Durable background job queue
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-08-01 00:00:06.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JOB_STATUS = sa.Enum("queued", "running", "succeeded", "dead", name="jobstatus")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), nullable=False),
+        sa.Column("kind", sa.String(length=100), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("status", JOB_STATUS, nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_at", sa.DateTime(), nullable=False),
+        sa.Column("locked_by", sa.String(length=100), nullable=True),
+        sa.Column("locked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(
+        "ix_jobs_queued_run_at", "jobs", ["run_at", "id"],
+        postgresql_where=sa.text("status = 'queued'"), sqlite_where=sa.text("status = 'queued'")
+    )
+    op.create_index("ix_jobs_status_kind", "jobs", ["status", "kind"])
+    op.create_index("ix_jobs_finished_at", "jobs", ["finished_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_jobs_finished_at", table_name="jobs")
+    op.drop_index("ix_jobs_status_kind", table_name="jobs")
+    op.drop_index("ix_jobs_queued_run_at", table_name="jobs")
+    op.drop_table("jobs")
+    if op.get_bind().dialect.name == "postgresql":
+        JOB_STATUS.drop(op.get_bind(), checkfirst=True)
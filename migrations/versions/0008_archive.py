@@ -0,0 +1,80 @@
+"""Cold archive tables for long-closed tickets
+
+tickets.closed_at records when a ticket was closed; core.archive moves tickets
+closed longer than ARCHIVE_AFTER_DAYS, with their responses, into
+archived_tickets and archived_ticket_responses. Tickets closed before this
+migration have no close time and are treated as closed when created.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-08-01 00:00:07.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The ticketstatus type already exists on Postgres (tickets.status)
+TICKET_STATUS = sa.Enum("open", "in_progress", "closed", name="ticketstatus").with_variant(
+    postgresql.ENUM("open", "in_progress", "closed", name="ticketstatus", create_type=False), "postgresql"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("tickets", sa.Column("closed_at", sa.DateTime(), nullable=True))
+    tickets = sa.table("tickets", sa.column("status", sa.String()), sa.column("created_at"), sa.column("closed_at"))
+    op.execute(tickets.update().where(tickets.c.status == "closed").values(closed_at=tickets.c.created_at))
+    op.create_index("ix_tickets_closed_at", "tickets", ["closed_at"])
+
+    op.create_table(
+        "archived_tickets",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("subject", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("priority", sa.String(length=50), nullable=True),
+        sa.Column("status", TICKET_STATUS, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("assignee_id", sa.Integer(), nullable=True),
+        sa.Column("assigned_at", sa.DateTime(), nullable=True),
+        sa.Column("closed_at", sa.DateTime(), nullable=True),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["assignee_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_archived_tickets_created_at_id", "archived_tickets", ["created_at", "id"])
+    op.create_index("ix_archived_tickets_user_id_created_at", "archived_tickets", ["user_id", "created_at", "id"])
+    op.create_table(
+        "archived_ticket_responses",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("ticket_id", sa.Integer(), nullable=False),
+        sa.Column("responder_id", sa.Integer(), nullable=False),
+        sa.Column("message", sa.Text(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["ticket_id"], ["archived_tickets.id"]),
+        sa.ForeignKeyConstraint(["responder_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_archived_ticket_responses_ticket_id", "archived_ticket_responses", ["ticket_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_archived_ticket_responses_ticket_id", table_name="archived_ticket_responses")
+    op.drop_table("archived_ticket_responses")
+    op.drop_index("ix_archived_tickets_user_id_created_at", table_name="archived_tickets")
+    op.drop_index("ix_archived_tickets_created_at_id", table_name="archived_tickets")
+    op.drop_table("archived_tickets")
+    op.drop_index("ix_tickets_closed_at", table_name="tickets")
+    op.drop_column("tickets", "closed_at")
@@ -0,0 +1,47 @@
+"""Ticket triage results
+
+core.triage fills in tickets.category and tickets.suggested_priority after a
+ticket is created, and triaged_at when it did; ix_tickets_untriaged finds the
+tickets still waiting. Existing tickets start untriaged (see
+`python -m core.triage rescore`). Archived tickets keep their triage results.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-08-01 00:00:08.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("tickets", sa.Column("category", sa.String(length=50), nullable=True))
+    op.add_column("tickets", sa.Column("suggested_priority", sa.String(length=50), nullable=True))
+    op.add_column("tickets", sa.Column("triaged_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_tickets_untriaged", "tickets", ["id"],
+        postgresql_where=sa.text("triaged_at IS NULL"),
+        sqlite_where=sa.text("triaged_at IS NULL")
+    )
+    op.add_column("archived_tickets", sa.Column("category", sa.String(length=50), nullable=True))
+    op.add_column("archived_tickets", sa.Column("suggested_priority", sa.String(length=50), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("archived_tickets", "suggested_priority")
+    op.drop_column("archived_tickets", "category")
+    op.drop_index("ix_tickets_untriaged", table_name="tickets")
+    op.drop_column("tickets", "triaged_at")
+    op.drop_column("tickets", "suggested_priority")
+    op.drop_column("tickets", "category")
@@ -0,0 +1,43 @@
+"""Analytics window cache and response timestamp indexes
+
+analytics_windows keeps the settled weeks of SLA and agent report data that
+core.analytics has computed; the timestamp indexes let it extract one week
+of responses without scanning all of them.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-08-01 00:00:09.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, Sequence[str], None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "analytics_windows",
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("window_start", sa.DateTime(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("kind", "window_start")
+    )
+    op.create_index("ix_ticket_responses_timestamp", "ticket_responses", ["timestamp"])
+    op.create_index("ix_archived_ticket_responses_timestamp", "archived_ticket_responses", ["timestamp"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_archived_ticket_responses_timestamp", table_name="archived_ticket_responses")
+    op.drop_index("ix_ticket_responses_timestamp", table_name="ticket_responses")
+    op.drop_table("analytics_windows")
@@ -0,0 +1,36 @@
+"""Duplicate ticket links
+
+tickets.duplicate_of_id points at the earlier ticket core.duplicates found
+this one to nearly repeat. There is no foreign key: the earlier ticket may be
+archived, which moves it to archived_tickets under the same id.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2025-08-01 00:00:10.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, Sequence[str], None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("tickets", sa.Column("duplicate_of_id", sa.Integer(), nullable=True))
+    op.create_index("ix_tickets_duplicate_of_id", "tickets", ["duplicate_of_id"])
+    op.add_column("archived_tickets", sa.Column("duplicate_of_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("archived_tickets", "duplicate_of_id")
+    op.drop_index("ix_tickets_duplicate_of_id", table_name="tickets")
+    op.drop_column("tickets", "duplicate_of_id")
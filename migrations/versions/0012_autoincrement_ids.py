@@ -0,0 +1,79 @@
+"""Ticket and response ids that are never reused on SQLite
+
+Without AUTOINCREMENT, SQLite gives the next row max(id) + 1, so once the
+newest ticket or response is archived (deleted from the hot table) its id is
+handed out again and collides with the archived copy. The tables are rebuilt
+with AUTOINCREMENT, their sequences start past the archive too, and responses
+that already took an archived id are moved to fresh ones. PostgreSQL
+sequences never go back, so nothing changes there.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2025-08-01 00:00:11.000000
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, Sequence[str], None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = {"tickets": "archived_tickets", "ticket_responses": "archived_ticket_responses"}
+PRIMARY_KEY = re.compile(r",\s*PRIMARY KEY \(id\)")
+AUTOINCREMENT = re.compile(r"\bid INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT\b")
+
+
+def rebuild(table, autoincrement):
+    # SQLite can't alter a primary key: copy into a new table, then restore the
+    # indexes and triggers (the search triggers among them) dropped with the old one
+    conn = op.get_bind()
+    create = conn.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table}).scalar_one()
+    extras = conn.execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = :name AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ), {"name": table}).scalars().all()
+    if autoincrement:
+        create = PRIMARY_KEY.sub("", re.sub(r"\bid INTEGER NOT NULL\b", "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT", create, count=1))
+    else:
+        create = AUTOINCREMENT.sub("id INTEGER NOT NULL", create).replace("\n)", ", \n\tPRIMARY KEY (id)\n)", 1)
+    create = re.sub(rf"^CREATE TABLE \"?{table}\"?", f"CREATE TABLE _new_{table}", create)
+    op.execute(create)
+    op.execute(f"INSERT INTO _new_{table} SELECT * FROM {table}")
+    op.execute(f"DROP TABLE {table}")
+    op.execute(f"ALTER TABLE _new_{table} RENAME TO {table}")
+    for statement in extras:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    # Responses the archiver could never move: their id is already in the archive
+    op.execute(
+        "UPDATE ticket_responses SET id = id + (SELECT max(coalesce((SELECT max(id) FROM ticket_responses), 0), "
+        "coalesce((SELECT max(id) FROM archived_ticket_responses), 0))) "
+        "WHERE id IN (SELECT id FROM archived_ticket_responses)"
+    )
+    for table, archived in TABLES.items():
+        rebuild(table, autoincrement=True)
+        op.execute(f"DELETE FROM sqlite_sequence WHERE name = '{table}'")
+        op.execute(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT '{table}', "
+            f"max(coalesce((SELECT max(id) FROM {table}), 0), coalesce((SELECT max(id) FROM {archived}), 0))"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        rebuild(table, autoincrement=False)
+        op.execute(f"DELETE FROM sqlite_sequence WHERE name = '{table}'")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Text, Enum, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
@@ -13,6 +13,12 @@ class TicketStatus(enum.Enum):
     in_progress = "in_progress"
     closed = "closed"
 
+class JobStatus(enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    dead = "dead"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -22,9 +28,14 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     role = Column(Enum(UserRole), nullable=False)
 
-    tickets = relationship("Ticket", back_populates="user")
+    tickets = relationship("Ticket", back_populates="user", foreign_keys="Ticket.user_id")
     responses = relationship("TicketResponse", back_populates="responder")
 
+    # Substring search on customer names; SQLite uses the users_name_trgm FTS5 table instead
+    __table_args__ = (
+        Index("ix_users_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
 class Ticket(Base):
     __tablename__ = "tickets"
 
@@ -34,19 +45,157 @@ class Ticket(Base):
     description = Column(Text, nullable=False)
     priority = Column(String(50), nullable=True)
     status = Column(Enum(TicketStatus), default=TicketStatus.open, nullable=False)
-    created_at = Column(DateTime, default=datetime.now())
+    created_at = Column(DateTime, default=datetime.now)
+    # Work queue (see core.work_queue): the claiming agent, and the queue position
+    assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    assigned_at = Column(DateTime, nullable=True)
+    queue_due_at = Column(DateTime, nullable=True)
+    # Set when the status becomes closed; core.archive moves tickets closed long enough
+    closed_at = Column(DateTime, nullable=True)
+    # Filled in after creation by core.triage; priority stays as the customer filed it
+    category = Column(String(50), nullable=True)
+    suggested_priority = Column(String(50), nullable=True)
+    triaged_at = Column(DateTime, nullable=True)
+    # Earlier ticket this one nearly repeats (core.duplicates); no FK, it may have been archived since
+    duplicate_of_id = Column(Integer, nullable=True)
 
-    user = relationship("User", back_populates="tickets")
+    user = relationship("User", back_populates="tickets", foreign_keys=[user_id])
     responses = relationship("TicketResponse", back_populates="ticket")
 
+    archived = False
+
+    # Listing access paths: newest first, optionally narrowed by owner, status or priority
+    __table_args__ = (
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        Index("ix_tickets_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_tickets_status_created_at", "status", "created_at", "id"),
+        Index("ix_tickets_priority_created_at", "priority", "created_at", "id"),
+        Index(
+            "ix_tickets_work_queue", "queue_due_at", "id",
+            postgresql_where=text("assignee_id IS NULL AND status = 'open'"),
+            sqlite_where=text("assignee_id IS NULL AND status = 'open'")
+        ),
+        Index("ix_tickets_assignee_id", "assignee_id", "status"),
+        Index("ix_tickets_closed_at", "closed_at"),
+        Index(
+            "ix_tickets_untriaged", "id",
+            postgresql_where=text("triaged_at IS NULL"),
+            sqlite_where=text("triaged_at IS NULL")
+        ),
+        Index("ix_tickets_duplicate_of_id", "duplicate_of_id"),
+        # Archived ids must never be handed out again (see migration 0012)
+        {"sqlite_autoincrement": True},
+    )
+
 class TicketResponse(Base):
     __tablename__ = "ticket_responses"
 
     id = Column(Integer, primary_key=True, index=True)
-    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False, index=True)
     responder_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     message = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=datetime.now())
+    timestamp = Column(DateTime, default=datetime.now)
 
     ticket = relationship("Ticket", back_populates="responses")
     responder = relationship("User", back_populates="responses")
+
+    # Per-week response extracts for core.analytics
+    __table_args__ = (
+        Index("ix_ticket_responses_timestamp", "timestamp"),
+        {"sqlite_autoincrement": True},
+    )
+
+class ArchivedTicket(Base):
+    __tablename__ = "archived_tickets"
+
+    # Closed tickets moved out of the hot tables by core.archive, keeping their ids
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    subject = Column(String(255), nullable=False)
+    description = Column(Text, nullable=False)
+    priority = Column(String(50), nullable=True)
+    status = Column(Enum(TicketStatus), nullable=False)
+    created_at = Column(DateTime)
+    assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    assigned_at = Column(DateTime, nullable=True)
+    closed_at = Column(DateTime, nullable=True)
+    category = Column(String(50), nullable=True)
+    suggested_priority = Column(String(50), nullable=True)
+    duplicate_of_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    user = relationship("User", foreign_keys=[user_id])
+    responses = relationship("ArchivedTicketResponse", back_populates="ticket")
+
+    archived = True
+
+    __table_args__ = (
+        Index("ix_archived_tickets_created_at_id", "created_at", "id"),
+        Index("ix_archived_tickets_user_id_created_at", "user_id", "created_at", "id"),
+    )
+
+class ArchivedTicketResponse(Base):
+    __tablename__ = "archived_ticket_responses"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    ticket_id = Column(Integer, ForeignKey("archived_tickets.id"), nullable=False, index=True)
+    responder_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    message = Column(Text, nullable=False)
+    timestamp = Column(DateTime)
+
+    ticket = relationship("ArchivedTicket", back_populates="responses")
+    responder = relationship("User")
+
+    __table_args__ = (
+        Index("ix_archived_ticket_responses_timestamp", "timestamp"),
+    )
+
+class TicketCounter(Base):
+    __tablename__ = "ticket_counters"
+
+    # e.g. "tickets", "status:open", "priority:high"; see core.counters
+    name = Column(String(100), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+
+    # Progress of a named bulk import, committed with each chunk (see core.bulk)
+    job = Column(String(100), primary_key=True)
+    rows_read = Column(BigInteger, nullable=False, default=0)
+    imported = Column(BigInteger, nullable=False, default=0)
+    rejected = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    # Background work enqueued in the same transaction as the write that needs it (see core.jobs)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.queued)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False, default=datetime.now)
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Workers take due queued jobs oldest first
+        Index("ix_jobs_queued_run_at", "run_at", "id", postgresql_where=text("status = 'queued'"), sqlite_where=text("status = 'queued'")),
+        Index("ix_jobs_status_kind", "status", "kind"),
+        Index("ix_jobs_finished_at", "finished_at"),
+    )
+
+class AnalyticsWindow(Base):
+    __tablename__ = "analytics_windows"
+
+    # A settled week of report data, computed once (see core.analytics)
+    kind = Column(String(20), primary_key=True)
+    window_start = Column(DateTime, primary_key=True)
+    payload = Column(Text, nullable=False)
+    computed_at = Column(DateTime, nullable=False, default=datetime.now)
@@ -0,0 +1,34 @@
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from database import get_db, run_db
+from core import analytics
+from core.identity import UserIdentity
+from routers.tickets import require_agent
+
+router = APIRouter()
+
+def report_weeks(
+    weeks: int = Query(analytics.ANALYTICS_DEFAULT_WEEKS, ge=1, le=analytics.ANALYTICS_MAX_WEEKS),
+    until: Optional[date] = Query(None, description="a day in the last week reported; defaults to today")
+) -> List:
+    return analytics.week_starts(weeks, until)
+
+@router.get("/sla")
+async def sla_report(
+    group_by: str = Query("priority", pattern="^(priority|week|agent)$"),
+    starts: List = Depends(report_weeks),
+    current_user: UserIdentity = Depends(require_agent),
+    db: Session = Depends(get_db)
+):
+    # The primary, not a replica: settled windows computed here are cached
+    return await run_db(db, analytics.sla_report, starts, group_by)
+
+@router.get("/agents")
+async def agent_report(
+    starts: List = Depends(report_weeks),
+    current_user: UserIdentity = Depends(require_agent),
+    db: Session = Depends(get_db)
+):
+    return await run_db(db, analytics.agent_report, starts)
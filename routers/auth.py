@@ -1,18 +1,22 @@
-# from fastapi import APIRouter, Depends, HTTPException, status
-# from fastapi.security import OAuth2PasswordRequestForm
-# from sqlalchemy.orm import Session
-# import schemas, models
-# from database import get_db
-# from core import security
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.orm import Session
+import schemas, crud
+from database import get_db, run_db
+from core import security, sessions
+from core.identity import UserIdentity
 
-# router = APIRouter()
+router = APIRouter()
 
-# @router.post("/login", response_model=schemas.Token)
-# def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-#     user = db.query(models.User).filter(models.User.email == form_data.username).first()
-#     if not user:
-#         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
-#     if not security.verify_password(form_data.password, user.password_hash):
-#         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
-#     access_token = security.create_access_token(data={"sub": user.email})
-#     return {"access_token": access_token, "token_type": "bearer"}
+@router.post("/login", response_model=schemas.Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_db(db, crud.get_user_by_email, form_data.username)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    valid, new_hash = await security.verify_password_async(form_data.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    if new_hash:
+        await run_db(db, crud.update_password_hash, user.id, new_hash)
+    access_token = sessions.create_session_token(UserIdentity.from_user(user))
+    return {"access_token": access_token, "token_type": "bearer"}
@@ -0,0 +1,113 @@
+import io
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form, Query, status
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import schemas, models
+import database
+from database import get_db, run_db
+from core import bulk, bulk_actions
+from core.identity import UserIdentity
+from routers.tickets import get_api_user, require_agent
+
+router = APIRouter()
+
+def require_api_agent(current_user: UserIdentity = Depends(get_api_user)):
+    return require_agent(current_user)
+
+def sync_bind(db):
+    # Bulk jobs run on a blocking Session in the threadpool in either DB_MODE,
+    # so a long import never holds the event loop
+    return database.engine if isinstance(db, AsyncSession) else db.get_bind()
+
+@router.post("/import", response_model=schemas.ImportReport)
+async def import_tickets(
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Form(None, alias="format"),
+    job: Optional[str] = Form(None),
+    current_user: UserIdentity = Depends(require_agent),
+    db: Session = Depends(get_db)
+):
+    bind = sync_bind(db)
+
+    def run():
+        # UploadFile spools to disk past 1MB, so the body is never held in memory
+        stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+        try:
+            with Session(bind=bind) as session:
+                return bulk.import_tickets(session, stream, fmt or bulk.format_for(file.filename), job=job)
+        finally:
+            stream.detach()
+
+    try:
+        return await run_in_threadpool(run)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+@router.get("/export")
+async def export_tickets(
+    fmt: str = Query("ndjson", alias="format", pattern="^(csv|ndjson)$"),
+    current_user: UserIdentity = Depends(require_agent),
+    db: Session = Depends(get_db)
+):
+    bind = sync_bind(db)
+
+    def generate():
+        with Session(bind=bind) as session:
+            for _, text in bulk.export_chunks(session, fmt):
+                yield text
+
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="tickets.{fmt}"'}
+    return StreamingResponse(generate(), media_type=media_type, headers=headers)
+
+async def apply_bulk_action(db, current_user, selection: schemas.BulkTicketSelection, **action):
+    filters = selection.filter.model_dump() if selection.filter else None
+    try:
+        return await run_db(db, bulk_actions.apply, current_user, selection.ticket_ids, filters, **action)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+@router.post("/tickets/status", response_model=schemas.BulkActionResult)
+async def bulk_update_status(
+    update: schemas.BulkStatusUpdate,
+    current_user: UserIdentity = Depends(require_api_agent),
+    db: Session = Depends(get_db)
+):
+    return await apply_bulk_action(db, current_user, update, status=models.TicketStatus(update.status.value))
+
+@router.post("/tickets/responses", response_model=schemas.BulkActionResult)
+async def bulk_add_responses(
+    reply: schemas.BulkResponseCreate,
+    current_user: UserIdentity = Depends(get_api_user),
+    db: Session = Depends(get_db)
+):
+    # Customers may reply to their own tickets (the rest come back as forbidden), not change status
+    if reply.status is not None and current_user.role != models.UserRole.support_agent:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update ticket status")
+    new_status = models.TicketStatus(reply.status.value) if reply.status else None
+    return await apply_bulk_action(db, current_user, reply, message=reply.message, status=new_status)
+
+@router.post("/tickets")
+async def bulk_ticket_form(
+    request: Request,
+    ticket_ids: List[int] = Form([]),
+    new_status: Optional[str] = Form(None, alias="status"),
+    message: Optional[str] = Form(None),
+    email: Optional[str] = Form(None),
+    current_user: UserIdentity = Depends(require_agent),
+    db: Session = Depends(get_db)
+):
+    # The checkbox form on the agent tickets page; goes back to the page like the per-ticket forms
+    try:
+        new_status = models.TicketStatus(new_status) if new_status else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+    message = (message or "").strip() or None
+    # Nothing picked to do (or no tickets ticked) is just a round trip back to the page
+    if ticket_ids and (new_status or message):
+        selection = schemas.BulkTicketSelection(ticket_ids=ticket_ids)
+        await apply_bulk_action(db, current_user, selection, status=new_status, message=message)
+    return RedirectResponse(url=request.headers.get("referer") or f"/support_agent_tickets?user_email={current_user.email}", status_code=303)
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from database import get_db
+from core import events
+from core.identity import UserIdentity
+from routers.tickets import get_current_user
+
+router = APIRouter()
+
+async def release(db):
+    # The stream outlives the request, so don't pin a pooled connection to it
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        db.close()
+
+@router.get("")
+async def ticket_events(current_user: UserIdentity = Depends(get_current_user), db=Depends(get_db)):
+    """Server-sent events: ticket_created, ticket_response, ticket_status, tickets_imported, resync."""
+    await release(db)
+    customer_id = None if current_user.role == models.UserRole.support_agent else current_user.id
+    try:
+        subscription = events.broker.subscribe(customer_id)
+    except events.TooManySubscribers:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many event streams", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        events.stream(subscription),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx holding events back in its buffer
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
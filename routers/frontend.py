@@ -1,17 +1,48 @@
-from fastapi import APIRouter, Request, Form, Depends, status, Header
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
-from database import get_db
-import models
-from core import security
+from fastapi import APIRouter, Request, Form, Depends, status
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
+from sqlalchemy.orm import Session
+from database import get_db, get_read_db, run_db
+import crud
+from core import assets, instrumentation, security, sessions, templating
+from core.cache import user_cache
+from core.render_cache import render_cache, install
+from core.identity import UserIdentity
 import logging
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
+templates = install(instrumentation.instrument_templates(templating.templates))
+templates.env.globals["asset_url"] = assets.asset_url
 
 logger = logging.getLogger(__name__)
 
+async def resolve_user(request: Request, db, user_email: str = None):
+    # A signed session decides identity without touching the users table
+    identity = sessions.request_identity(request)
+    if identity:
+        return identity
+    if user_email and sessions.LEGACY_EMAIL_AUTH:
+        return await crud.get_user_identity(db, user_email)
+    return None
+
+async def cached_page(request: Request, name: str, user, scopes, load, **filters):
+    """Renders a ticket page, or replays it from the render cache.
+
+    load() is only awaited on a miss; a matching If-None-Match skips the
+    database and the render altogether.
+    """
+    # Absolute URLs from url_for() depend on the host the page was requested on
+    etag = render_cache.etag(name, str(request.base_url), user.to_dict(), filters, scopes=scopes)
+    # Browsers revalidate every time, so a write is visible on the next load
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if render_cache.matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    html = render_cache.get_page(etag)
+    if html is None:
+        context = await load()
+        html = templates.get_template(name).render({"request": request, "user": user, **context})
+        render_cache.set_page(etag, html)
+    return HTMLResponse(html, headers=headers)
+
 @router.get("/", response_class=HTMLResponse)
 @router.get("/login", response_class=HTMLResponse)
 def get_login(request: Request):
@@ -22,125 +53,112 @@ def get_register(request: Request):
     return templates.TemplateResponse(request, "register.html", {"request": request})
 
 @router.post("/register")
-def post_register(request: Request, name: str = Form(...), email: str = Form(...), password: str = Form(...), role: str = Form(...), db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == email).first()
+async def post_register(request: Request, name: str = Form(...), email: str = Form(...), password: str = Form(...), role: str = Form(...), db: Session = Depends(get_db)):
+    existing_user = await run_db(db, crud.get_user_by_email, email)
     if existing_user:
         return templates.TemplateResponse(request, "register.html", {"request": request, "error": "Email already registered"})
-    hashed_password = security.get_password_hash(password)
-    new_user = models.User(name=name, email=email, password_hash=hashed_password, role=role)
-    print(new_user)
-    db.add(new_user)
-    db.commit()
+    hashed_password = await security.hash_password_async(password)
+    new_user = await run_db(db, crud.create_user, name, email, hashed_password, role)
+    logger.info("Registered user %s", new_user.id)
     return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
 
 @router.post("/login")
-def post_login(request: Request, email: str = Form(...), password: str = Form(...), role: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == email).first()
-    print(type(user))
-    if not user or not security.verify_password(password, user.password_hash) or user.role.value != role:
+async def post_login(request: Request, email: str = Form(...), password: str = Form(...), role: str = Form(...), db: Session = Depends(get_db)):
+    user = await run_db(db, crud.get_user_by_email, email)
+    if not user:
+        return templates.TemplateResponse(request, "login.html", {"request": request, "error": "Invalid credentials or role"})
+    valid, new_hash = await security.verify_password_async(password, user.password_hash)
+    if not valid or user.role.value != role:
         return templates.TemplateResponse(request, "login.html", {"request": request, "error": "Invalid credentials or role"})
+    # BCRYPT_ROUNDS changed since this hash was made; store one at the current cost
+    if new_hash:
+        await run_db(db, crud.update_password_hash, user.id, new_hash)
+    identity = UserIdentity.from_user(user)
+    # Warm the identity cache for clients still identified by user_email
+    user_cache.store(user.email, identity)
     # Redirect to dashboard with user_email as query parameter
     response = RedirectResponse(url=f"/dashboard?user_email={user.email}", status_code=status.HTTP_302_FOUND)
+    sessions.set_session_cookie(response, identity)
     return response
 
 @router.get("/dashboard", response_class=HTMLResponse)
-def get_dashboard(request: Request, db: Session = Depends(get_db), user_email: str = None):
-    if not user_email:
-        return RedirectResponse(url="/login")
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+async def get_dashboard(request: Request, db: Session = Depends(get_read_db), user_email: str = None):
+    user = await resolve_user(request, db, user_email)
     if not user:
         return RedirectResponse(url="/login")
     user_role = user.role.value
     if user_role == "customer":
-        return RedirectResponse(url=f"/customer_dashboard?user_email={user_email}")
+        return RedirectResponse(url=f"/customer_dashboard?user_email={user.email}")
     elif user_role == "support_agent":
-        return RedirectResponse(url=f"/support_agent_dashboard?user_email={user_email}")
+        return RedirectResponse(url=f"/support_agent_dashboard?user_email={user.email}")
     else:
         return RedirectResponse(url="/login")
 
 @router.get("/customer_dashboard", response_class=HTMLResponse)
-def customer_dashboard(request: Request, db: Session = Depends(get_db), user_email: str = None):
-    if not user_email:
-        return RedirectResponse(url="/login")
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+async def customer_dashboard(request: Request, db: Session = Depends(get_read_db), user_email: str = None):
+    user = await resolve_user(request, db, user_email)
     if not user:
         return RedirectResponse(url="/login")
     logger.info("Customer Dashboard accessed by user: %s with role: %s", user.email, user.role.value)
-    tickets = db.query(models.Ticket).options(joinedload(models.Ticket.responses).joinedload(models.TicketResponse.responder)).filter(models.Ticket.user_id == user.id).order_by(models.Ticket.created_at.desc()).limit(3).all()
-    response = templates.TemplateResponse("customer_dashboard.html", {"request": request, "user": user, "tickets": tickets})
-    response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
+
+    async def load():
+        return {"tickets": await run_db(db, crud.list_dashboard_tickets, user_id=user.id)}
+    return await cached_page(request, "customer_dashboard.html", user, [f"customer:{user.id}"], load)
 
 @router.get("/support_agent_dashboard", response_class=HTMLResponse)
-def support_agent_dashboard(request: Request, db: Session = Depends(get_db), user_email: str = None):
-    if not user_email:
-        return RedirectResponse(url="/login")
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+async def support_agent_dashboard(request: Request, db: Session = Depends(get_read_db), user_email: str = None):
+    user = await resolve_user(request, db, user_email)
     if not user:
         return RedirectResponse(url="/login")
     logger.info("Support Agent Dashboard accessed by user: %s with role: %s", user.email, user.role.value)
-    tickets = db.query(models.Ticket).options(joinedload(models.Ticket.responses).joinedload(models.TicketResponse.responder)).order_by(models.Ticket.created_at.desc()).limit(3).all()
-    response = templates.TemplateResponse("support_agent_dashboard.html", {"request": request, "user": user, "tickets": tickets})
-    response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
+
+    async def load():
+        tickets = await run_db(db, crud.list_dashboard_tickets)
+        summary = await run_db(db, crud.get_ticket_summary)
+        return {"tickets": tickets, "summary": summary}
+    return await cached_page(request, "support_agent_dashboard.html", user, ["all"], load)
 
 @router.get("/customer_tickets", response_class=HTMLResponse)
-def customer_tickets(request: Request, db: Session = Depends(get_db), user_email: str = None):
-    if not user_email:
-        return RedirectResponse(url="/login")
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+async def customer_tickets(request: Request, db: Session = Depends(get_read_db), user_email: str = None, archived: bool = False):
+    user = await resolve_user(request, db, user_email)
     if not user:
         return RedirectResponse(url="/login")
-    tickets = db.query(models.Ticket).filter(models.Ticket.user_id == user.id).order_by(models.Ticket.created_at.desc()).all()
-    response = templates.TemplateResponse("customer_tickets.html", {"request": request, "user": user, "tickets": tickets})
-    response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
+
+    async def load():
+        return {"tickets": await run_db(db, crud.list_customer_tickets, user.id, archived), "archived": archived}
+    return await cached_page(request, "customer_tickets.html", user, [f"customer:{user.id}"], load, archived=archived)
 
 @router.get("/support_agent_tickets", response_class=HTMLResponse)
-def support_agent_tickets(
+async def support_agent_tickets(
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user_email: str = None,
     status: str = None,
     priority: str = None,
     customer_name: str = None
 ):
-    if not user_email:
-        return RedirectResponse(url="/login")
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+    user = await resolve_user(request, db, user_email)
     if not user:
         return RedirectResponse(url="/login")
-    query = db.query(models.Ticket).join(models.User, models.Ticket.user_id == models.User.id)
-    if status:
-        query = query.filter(models.Ticket.status == status)
-    if priority:
-        query = query.filter(models.Ticket.priority == priority)
-    if customer_name:
-        query = query.filter(models.User.name.ilike(f"%{customer_name}%"))
-    tickets = query.order_by(models.Ticket.created_at.desc()).all()
-    response = templates.TemplateResponse("support_agent_tickets.html", {"request": request, "user": user, "tickets": tickets})
-    response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
+
+    async def load():
+        return {"tickets": await run_db(db, crud.list_agent_tickets, status=status, priority=priority, customer_name=customer_name)}
+    return await cached_page(
+        request, "support_agent_tickets.html", user, ["all"], load,
+        status=status, priority=priority, customer_name=customer_name
+    )
 
 @router.get("/logout")
 def logout():
-    # No cookie to delete, just redirect to login
     response = RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
+    response.delete_cookie(sessions.SESSION_COOKIE_NAME)
     return response
 
 @router.get("/user_info")
-def user_info(db: Session = Depends(get_db), user_email: str = None):
-    if not user_email:
+async def user_info(request: Request, db: Session = Depends(get_read_db), user_email: str = None):
+    user = await resolve_user(request, db, user_email)
+    if not user and not (user_email and sessions.LEGACY_EMAIL_AUTH):
         return JSONResponse(status_code=401, content={"error": "Not authenticated"})
-    user = db.query(models.User).filter(models.User.email == user_email).first()
     if not user:
         return JSONResponse(status_code=404, content={"error": "User not found"})
     return {"email": user.email, "name": user.name, "role": user.role.value}
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from core import analytics, duplicates, events, jobs, ratelimit, security, triage
+from database import get_db, run_db, pool_stats
+from core.cache import user_cache
+from core.render_cache import render_cache
+from core.instrumentation import metrics
+
+router = APIRouter()
+
+def gauges(prefix, stats):
+    # Numeric entries of a stats() dict as untyped Prometheus samples
+    return "".join(
+        f"{prefix}_{name} {value:g}\n" for name, value in stats.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    )
+
+def job_samples(stats):
+    # Backlog by status/kind from the jobs table, then this process's outcomes
+    lines = [
+        f'jobs_backlog{{status="{status}",kind="{kind}"}} {count}\n'
+        for status in ("queued", "running", "dead") for kind, count in stats[status].items()
+    ]
+    lines.append(f"jobs_succeeded_last_minute {stats['succeeded_last_minute']}\n")
+    lines.append(f"jobs_oldest_due_seconds {stats['oldest_due_seconds']:g}\n")
+    outcomes, seconds = jobs.stats.snapshot()
+    lines += [f'jobs_processed_total{{kind="{kind}",outcome="{outcome}"}} {count}\n' for (kind, outcome), count in outcomes.items()]
+    lines += [f'jobs_handler_seconds_total{{kind="{kind}"}} {total:.6f}\n' for kind, total in seconds.items()]
+    return "".join(lines)
+
+@router.get("", response_class=PlainTextResponse)
+async def prometheus_metrics(db: Session = Depends(get_db)):
+    body = metrics.render()
+    body += gauges("password_hashing", security.password_hasher.stats())
+    body += gauges("user_cache", user_cache.stats())
+    body += gauges("render_cache", render_cache.stats())
+    body += gauges("events", events.broker.stats())
+    body += job_samples(await run_db(db, jobs.queue_stats))
+    limits = ratelimit.limiter.stats()
+    body += "".join(f'rate_limit_requests_total{{route="{o["route"]}",outcome="{o["outcome"]}"}} {o["count"]}\n' for o in limits["outcomes"])
+    body += "".join(f'admission_{key}{{route="{route}"}} {value}\n' for route, gate in limits["gates"].items() for key, value in gate.items())
+    body += gauges("triage", await run_db(db, triage.queue_stats))
+    body += gauges("analytics", analytics.stats.snapshot())
+    body += gauges("duplicates", duplicates.stats.snapshot())
+    for name, stats in pool_stats().items():
+        body += "".join(f'db_pool_{key}{{engine="{name}"}} {value:g}\n' for key, value in stats.items())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@router.get("/password_hashing")
+def password_hashing_metrics():
+    return security.password_hasher.stats()
+
+@router.get("/user_cache")
+def user_cache_metrics():
+    return user_cache.stats()
+
+@router.get("/render_cache")
+def render_cache_metrics():
+    return render_cache.stats()
+
+@router.get("/events")
+def event_metrics():
+    return events.broker.stats()
+
+
+@router.get("/rate_limits")
+def rate_limit_metrics():
+    return ratelimit.limiter.stats()
+
+@router.get("/triage")
+async def triage_metrics(db: Session = Depends(get_db)):
+    return await run_db(db, triage.queue_stats)
+
+@router.get("/analytics")
+def analytics_metrics():
+    return analytics.stats.snapshot()
+
+@router.get("/db_pools")
+def db_pool_metrics():
+    return pool_stats()
+
+@router.get("/jobs")
+async def job_metrics(db: Session = Depends(get_db)):
+    outcomes, seconds = jobs.stats.snapshot()
+    return {
+        **(await run_db(db, jobs.queue_stats)),
+        "processed": [{"kind": kind, "outcome": outcome, "count": count} for (kind, outcome), count in outcomes.items()],
+        "handler_seconds": seconds,
+    }
+
+@router.get("/duplicates")
+def duplicate_metrics():
+    return duplicates.stats.snapshot()
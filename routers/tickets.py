@@ -1,32 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Form, Query, Response
 from fastapi import status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-import schemas, models
-from database import get_db
-from core.security import verify_password
-from fastapi.responses import RedirectResponse
+from typing import List, Optional
+import os
+import schemas, models, crud
+from database import get_db, get_read_db, run_db
+from core.security import verify_password_async
+from core import duplicates, serialization, sessions, work_queue
+from core.identity import UserIdentity
+from core.pagination import decode_cursor
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi import Request, Form, Query
 
 router = APIRouter()
 
-async def get_current_user(email: str = Form(None), email_query: str = Query(None), db: Session = Depends(get_db)):
+TICKET_PAGE_SIZE = int(os.getenv("TICKET_PAGE_SIZE", "100"))
+TICKET_PAGE_SIZE_MAX = int(os.getenv("TICKET_PAGE_SIZE_MAX", "1000"))
+TICKET_STREAM_BATCH_SIZE = int(os.getenv("TICKET_STREAM_BATCH_SIZE", "500"))
+# Deep offsets make the database rank and skip every earlier match
+TICKET_SEARCH_MAX_OFFSET = int(os.getenv("TICKET_SEARCH_MAX_OFFSET", "1000"))
+
+async def get_current_user(request: Request, email: str = Form(None), email_query: str = Query(None), db: Session = Depends(get_db)):
     # Accept email from form data or query parameter
-    actual_email = email or email_query
-    if not actual_email:
+    return await identify(request, email or email_query, db)
+
+async def get_api_user(request: Request, email_query: str = Query(None), db: Session = Depends(get_db)):
+    # For routes taking a JSON body: a Form parameter would make FastAPI read the body as a form
+    return await identify(request, email_query, db)
+
+async def identify(request: Request, actual_email: Optional[str], db) -> UserIdentity:
+    # A signed session (cookie or bearer token) identifies the user without a DB lookup
+    identity = sessions.request_identity(request)
+    if identity:
+        return identity
+    if not actual_email or not sessions.LEGACY_EMAIL_AUTH:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    user = db.query(models.User).filter(models.User.email == actual_email).first()
+    user = await crud.get_user_identity(db, actual_email)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     return user
 
+def require_agent(current_user: UserIdentity = Depends(get_current_user)):
+    # For the agent-only routes: work queue, bulk operations, analytics
+    if current_user.role != models.UserRole.support_agent:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized: support agents only")
+    return current_user
+
 @router.post("/create_ticket")
-def create_ticket(
+async def create_ticket(
     subject: str = Form(...),
     description: str = Form(...),
     priority: str = Form(...),
-    current_user: models.User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_user),
     db: Session = Depends(get_db),
     email: str = Form(None)
 ):
@@ -34,51 +61,171 @@ def create_ticket(
     if current_user.role != models.UserRole.customer:
         redirect_url = f"/{current_user.role.value}_dashboard?user_email={current_user.email}"
         return RedirectResponse(url=redirect_url, status_code=303)
-    new_ticket = models.Ticket(
-        user_id=current_user.id,
-        subject=subject,
-        description=description,
-        priority=priority,
-        status=models.TicketStatus.open
-    )
-    db.add(new_ticket)
-    db.commit()
-    db.refresh(new_ticket)
+    await run_db(db, crud.create_ticket, current_user.id, subject, description, priority)
     # Redirect back to customer dashboard after ticket creation
     redirect_url = f"/customer_dashboard?user_email={current_user.email}"
     return RedirectResponse(url=redirect_url, status_code=303)
 
+def ticket_filters(
+    current_user: UserIdentity,
+    status_filter: Optional[schemas.TicketStatus],
+    priority: Optional[str],
+    customer_id: Optional[int]
+):
+    # Customers are always scoped to their own tickets; agents may filter by customer
+    if current_user.role != models.UserRole.support_agent:
+        customer_id = current_user.id
+    return {
+        "status": models.TicketStatus(status_filter.value) if status_filter else None,
+        "priority": priority,
+        "customer_id": customer_id
+    }
+
 @router.get("/get_tickets", response_model=List[schemas.TicketResponseOut])
-def get_tickets(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if current_user.role == models.UserRole.support_agent:
-        tickets = db.query(models.Ticket).all()
-    else:
-        tickets = db.query(models.Ticket).filter(models.Ticket.user_id == current_user.id).all()
+async def get_tickets(
+    response: Response,
+    limit: int = Query(TICKET_PAGE_SIZE, ge=1, le=TICKET_PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None),
+    status_filter: Optional[schemas.TicketStatus] = Query(None, alias="status"),
+    priority: Optional[str] = Query(None),
+    customer_id: Optional[int] = Query(None),
+    archived: bool = Query(False, description="list archived tickets (closed long ago) instead of active ones"),
+    current_user: UserIdentity = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    filters = ticket_filters(current_user, status_filter, priority, customer_id)
+    filters["archived"] = archived
+    if cursor:
+        try:
+            filters["after"] = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if serialization.API_SERIALIZATION == "fast":
+        # Same JSON as response_model would produce, without per-row ORM objects or validation
+        tickets, next_cursor = await run_db(db, crud.get_ticket_payload_page, limit, **filters)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return serialization.FastJSONResponse(tickets, headers=headers)
+    tickets, next_cursor = await run_db(db, crud.get_ticket_page, limit, **filters)
+    # The list body keeps its original shape; the keyset cursor travels in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return tickets
 
+def ticket_ndjson(batch):
+    return "".join(schemas.TicketResponseOut.model_validate(ticket).model_dump_json() + "\n" for ticket in batch)
+
+@router.get("/search_tickets", response_model=List[schemas.TicketSearchHit])
+async def search_tickets(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=TICKET_SEARCH_MAX_OFFSET),
+    status_filter: Optional[schemas.TicketStatus] = Query(None, alias="status"),
+    priority: Optional[str] = Query(None),
+    customer_id: Optional[int] = Query(None),
+    current_user: UserIdentity = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    filters = ticket_filters(current_user, status_filter, priority, customer_id)
+    hits, has_more = await run_db(db, crud.search_tickets, q, limit, offset, **filters)
+    if has_more:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return [dict(schemas.TicketResponseOut.model_validate(ticket).model_dump(), rank=rank) for ticket, rank in hits]
+
+@router.get("/ticket_summary", response_model=schemas.TicketSummary)
+async def ticket_summary(current_user: UserIdentity = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    if current_user.role != models.UserRole.support_agent:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view ticket summary")
+    return await run_db(db, crud.get_ticket_summary)
+
+@router.get("/work_queue", response_model=List[schemas.QueuedTicket])
+async def peek_work_queue(
+    limit: int = Query(20, ge=1, le=work_queue.WORK_QUEUE_PEEK_MAX),
+    current_user: UserIdentity = Depends(require_agent),
+    db: Session = Depends(get_db)
+):
+    return await run_db(db, work_queue.peek, limit)
+
+@router.get("/work_queue/mine", response_model=List[schemas.QueuedTicket])
+async def my_claimed_tickets(current_user: UserIdentity = Depends(require_agent), db: Session = Depends(get_db)):
+    return await run_db(db, work_queue.claimed_by, current_user.id)
+
+@router.post("/work_queue/claim", response_model=schemas.QueuedTicket, responses={204: {"description": "The queue is empty"}})
+async def claim_next_ticket(current_user: UserIdentity = Depends(require_agent), db: Session = Depends(get_db)):
+    ticket = await run_db(db, work_queue.claim_next, current_user.id)
+    if ticket is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return ticket
+
+@router.post("/work_queue/{ticket_id}/release", response_model=schemas.QueuedTicket)
+async def release_ticket(ticket_id: int, current_user: UserIdentity = Depends(require_agent), db: Session = Depends(get_db)):
+    ticket = await run_db(db, crud.get_ticket, ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+    if ticket.assignee_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ticket is not claimed by you")
+    if ticket.status == models.TicketStatus.closed:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Closed tickets can't go back in the queue")
+    return await run_db(db, work_queue.release, ticket)
+
+@router.get("/similar_tickets/{ticket_id}", response_model=List[schemas.SimilarTicket])
+async def similar_tickets(
+    ticket_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: UserIdentity = Depends(require_agent),
+    db: Session = Depends(get_read_db)
+):
+    ticket = await run_db(db, crud.get_ticket, ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+    return await run_db(db, duplicates.similar_tickets, ticket, limit)
+
+@router.get("/get_tickets/stream")
+async def stream_tickets(
+    status_filter: Optional[schemas.TicketStatus] = Query(None, alias="status"),
+    priority: Optional[str] = Query(None),
+    customer_id: Optional[int] = Query(None),
+    archived: bool = Query(False),
+    current_user: UserIdentity = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    filters = ticket_filters(current_user, status_filter, priority, customer_id)
+    filters["archived"] = archived
+    # The request-scoped session is closed before the body is sent, so the
+    # server-side cursor lives on a session owned by the generator
+    if isinstance(db, AsyncSession):
+        bind = db.bind
+
+        async def generate():
+            async with AsyncSession(bind) as session:
+                async for batch in crud.aiter_ticket_batches(session, TICKET_STREAM_BATCH_SIZE, **filters):
+                    yield ticket_ndjson(batch)
+    else:
+        bind = db.get_bind()
+
+        def generate():
+            with Session(bind=bind) as session:
+                for batch in crud.iter_ticket_batches(session, TICKET_STREAM_BATCH_SIZE, **filters):
+                    yield ticket_ndjson(batch)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.post("/add_ticket_response/{ticket_id}/responses")
-def add_ticket_response(
+async def add_ticket_response(
     request: Request,
     ticket_id: int,
     message: str = Form(...),
     email: str = Form(None),
-    current_user: models.User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    ticket = db.query(models.Ticket).filter(models.Ticket.id == ticket_id).first()
+    ticket = await run_db(db, crud.get_ticket, ticket_id)
     if not ticket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
     # Authorization check: only ticket owner or support agent can add response
     if current_user.role != models.UserRole.support_agent and ticket.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add response to this ticket")
-    new_response = models.TicketResponse(
-        ticket_id=ticket_id,
-        responder_id=current_user.id,
-        message=message
-    )
-    db.add(new_response)
-    db.commit()
-    db.refresh(new_response)
+    await run_db(db, crud.add_ticket_response, ticket_id, current_user.id, message)
     referer = request.headers.get("referer")
     if referer:
         return RedirectResponse(url=referer, status_code=303)
@@ -90,24 +237,21 @@ def add_ticket_response(
         return RedirectResponse(url=redirect_url, status_code=303)
 
 @router.post("/update_ticket_status/{ticket_id}")
-def update_ticket_status(
+async def update_ticket_status(
     request: Request,
     ticket_id: int,
-    status: str = Form(...),
+    new_status: str = Form(..., alias="status"),
     email: str = Form(None),
-    current_user: models.User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    ticket = db.query(models.Ticket).filter(models.Ticket.id == ticket_id).first()
+    ticket = await run_db(db, crud.get_ticket, ticket_id)
     if not ticket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
     # Authorization check: only support agents can update ticket status
     if current_user.role != models.UserRole.support_agent:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update ticket status")
-    if status:
-        ticket.status = status
-    db.commit()
-    db.refresh(ticket)
+    await run_db(db, crud.update_ticket_status, ticket, new_status)
     # Redirect back to support agent dashboard or tickets page
     referer = request.headers.get("referer")
     if referer:
@@ -117,19 +261,12 @@ def update_ticket_status(
         return RedirectResponse(url=redirect_url, status_code=303)
 
 @router.post("/test_create_ticket")
-def test_create_ticket(email: str = Form(...), password: str = Form(...), subject: str = Form(...), description: str = Form(...), priority: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if not user or not verify_password(password, user.password_hash):
+async def test_create_ticket(email: str = Form(...), password: str = Form(...), subject: str = Form(...), description: str = Form(...), priority: str = Form(...), db: Session = Depends(get_db)):
+    user = await run_db(db, crud.get_user_by_email, email)
+    valid, new_hash = await verify_password_async(password, user.password_hash) if user else (False, None)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    if new_hash:
+        await run_db(db, crud.update_password_hash, user.id, new_hash)
     # Create ticket for authenticated user
-    new_ticket = models.Ticket(
-        user_id=user.id,
-        subject=subject,
-        description=description,
-        priority=priority,
-        status=models.TicketStatus.open
-    )
-    db.add(new_ticket)
-    db.commit()
-    db.refresh(new_ticket)
-    return new_ticket
+    return await run_db(db, crud.create_ticket, user.id, subject, description, priority)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -44,6 +44,22 @@ class TicketBase(BaseModel):
 class TicketCreate(TicketBase):
     pass
 
+class TicketImport(TicketCreate):
+    # The column sizes: on PostgreSQL one oversized value would fail the whole chunk
+    subject: str = Field(max_length=255)
+    priority: Optional[str] = Field(None, max_length=50)
+    # Imported rows name their customer by id or by email
+    user_id: Optional[int] = None
+    customer_email: Optional[str] = None
+    status: TicketStatus = TicketStatus.open
+    created_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_customer(self):
+        if self.user_id is None and not self.customer_email:
+            raise ValueError("user_id or customer_email is required")
+        return self
+
 class TicketUpdate(BaseModel):
     status: Optional[TicketStatus] = None
 
@@ -66,7 +82,87 @@ class TicketResponseOut(TicketBase):
     user_id: int
     status: TicketStatus
     created_at: datetime
+    category: Optional[str] = None
+    suggested_priority: Optional[str] = None
+    duplicate_of_id: Optional[int] = None
     responses: List[TicketResponseResponse] = []
 
     class Config:
         from_attributes = True
+
+class QueuedTicket(TicketBase):
+    id: int
+    user_id: int
+    status: TicketStatus
+    created_at: datetime
+    assignee_id: Optional[int] = None
+    assigned_at: Optional[datetime] = None
+    queue_due_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class TicketSearchHit(TicketResponseOut):
+    rank: float
+
+class SimilarTicket(BaseModel):
+    id: int
+    subject: str
+    status: TicketStatus
+    similarity: float
+    archived: bool
+
+class TicketSummary(BaseModel):
+    total_tickets: int
+    total_responses: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    backlog: int
+    backlog_avg_age_hours: Optional[float] = None
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    job: Optional[str] = None
+    rows_read: int
+    imported: int
+    rejected: int
+    errors: List[ImportRowError] = []
+    elapsed_s: float
+    rows_per_s: float
+
+class BulkTicketFilter(BaseModel):
+    status: Optional[TicketStatus] = None
+    priority: Optional[str] = None
+    customer_id: Optional[int] = None
+    category: Optional[str] = None
+    duplicate_of_id: Optional[int] = None
+
+class BulkTicketSelection(BaseModel):
+    # Either explicit ids or a filter; a filter applies to its oldest matches up to the batch limit
+    ticket_ids: Optional[List[int]] = None
+    filter: Optional[BulkTicketFilter] = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ticket_ids is None) == (self.filter is None):
+            raise ValueError("Give either ticket_ids or filter")
+        return self
+
+class BulkStatusUpdate(BulkTicketSelection):
+    status: TicketStatus
+
+class BulkResponseCreate(BulkTicketSelection):
+    message: str
+    # Optionally also set the status, e.g. reply and close
+    status: Optional[TicketStatus] = None
+
+class BulkActionResult(BaseModel):
+    matched: List[int]
+    status_changed: List[int] = []
+    responses_added: int = 0
+    not_found: List[int] = []
+    forbidden: List[int] = []
+    more: bool = False
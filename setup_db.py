@@ -1,10 +1,20 @@
-from database import Base, engine
-import models
+import os
+from alembic import command
+from alembic.config import Config
+from database import engine
 
-def setup_database():
-    print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully.")
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+def alembic_config(bind=None):
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.attributes["bind"] = bind or engine
+    return config
+
+def setup_database(bind=None):
+    print("Applying database migrations...")
+    command.upgrade(alembic_config(bind), "head")
+    print("Database schema is up to date.")
 
 if __name__ == "__main__":
     setup_database()
@@ -0,0 +1,139 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from core import analytics, counters
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.alice = models.User(email="alice@example.com", name="Alice", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.bob = models.User(email="bob@example.com", name="Bob", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.db.add_all([self.customer, self.alice, self.bob])
+        self.db.commit()
+        # Ten weeks back: long settled
+        self.week = analytics.week_start(datetime.now()) - analytics.WEEK * 10
+        t0 = self.week + timedelta(hours=1)
+        self.db.execute(insert(models.Ticket.__table__), [
+            {"id": 1, "user_id": self.customer.id, "subject": "Down", "description": "d", "priority": "High", "status": models.TicketStatus.closed,
+             "created_at": t0, "closed_at": t0 + timedelta(days=1), "assignee_id": self.alice.id},
+            {"id": 2, "user_id": self.customer.id, "subject": "Slow", "description": "d", "priority": "low", "status": models.TicketStatus.open,
+             "created_at": t0 + timedelta(hours=1), "closed_at": None, "assignee_id": None},
+            {"id": 3, "user_id": self.customer.id, "subject": "Hm", "description": "d", "priority": "medium", "status": models.TicketStatus.open,
+             "created_at": t0 + timedelta(hours=2), "closed_at": None, "assignee_id": None},
+        ])
+        self.db.execute(insert(models.TicketResponse.__table__), [
+            # The customer's own follow-up is no first response
+            {"ticket_id": 1, "responder_id": self.customer.id, "message": "?", "timestamp": t0 + timedelta(minutes=30)},
+            {"ticket_id": 1, "responder_id": self.alice.id, "message": "On it", "timestamp": t0 + timedelta(hours=1)},
+            {"ticket_id": 1, "responder_id": self.bob.id, "message": "Fixed", "timestamp": t0 + timedelta(hours=5)},
+            {"ticket_id": 2, "responder_id": self.bob.id, "message": "Looking", "timestamp": t0 + timedelta(hours=25)},
+        ])
+        self.db.commit()
+
+    def tearDown(self):
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.AnalyticsWindow).delete()
+        self.db.query(models.Job).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+
+    def assertHours(self, actual, expected):
+        # Histogram percentiles are exact to within a bucket, about 12%
+        self.assertAlmostEqual(actual, expected, delta=expected * 0.13)
+
+    def test_sla_by_priority(self):
+        report = analytics.sla_report(self.db, analytics.week_starts(1, self.week.date()), "priority")
+        groups = {group["key"]: group for group in report["groups"]}
+        self.assertEqual(set(groups), {"high", "medium", "low"})
+        self.assertEqual((groups["high"]["tickets"], groups["high"]["unanswered"], groups["high"]["open"]), (1, 0, 0))
+        self.assertHours(groups["high"]["first_response"]["p50_hours"], 1)
+        self.assertHours(groups["high"]["time_to_close"]["p90_hours"], 24)
+        self.assertEqual(groups["high"]["first_response"]["histogram"]["1-4h"], 1)
+        self.assertHours(groups["low"]["first_response"]["p50_hours"], 24)
+        self.assertEqual((groups["medium"]["unanswered"], groups["medium"]["open"]), (1, 1))
+        self.assertEqual(groups["medium"]["first_response"], {"count": 0})
+
+    def test_agent_report(self):
+        report = analytics.agent_report(self.db, analytics.week_starts(2, self.week.date() + analytics.WEEK))
+        agents = {agent["name"]: agent for agent in report["agents"]}
+        week = self.week.date().isoformat()
+        self.assertEqual((agents["Bob"]["responses"], agents["Bob"]["responses_by_week"]), (2, {week: 2}))
+        self.assertEqual(agents["Bob"]["responses_per_week"], 1.0)
+        self.assertEqual((agents["Alice"]["first_responses"], agents["Alice"]["closed"]), (1, 1))
+        self.assertEqual((agents["Bob"]["first_responses"], agents["Bob"]["closed"]), (1, 0))
+        self.assertHours(agents["Alice"]["time_to_close"]["p50_hours"], 24)
+
+    def test_settled_windows_are_cached_until_their_tickets_change(self):
+        starts = analytics.week_starts(12)
+        unsettled = sum(not analytics.is_settled("tickets", start, datetime.now()) for start in starts)
+        self.assertEqual(analytics.sla_report(self.db, starts)["windows_computed"], 12)
+        self.assertEqual(analytics.sla_report(self.db, starts)["windows_computed"], unsettled)
+        cached = lambda: self.db.query(models.AnalyticsWindow).filter_by(kind="tickets", window_start=self.week).count()
+        self.assertEqual(cached(), 1)
+        # Closing an old ticket drops its week in the same transaction
+        crud.update_ticket_status(self.db, self.db.get(models.Ticket, 3), models.TicketStatus.closed)
+        self.assertEqual(cached(), 0)
+        report = analytics.sla_report(self.db, starts)
+        self.assertEqual(report["windows_computed"], unsettled + 1)
+        medium = next(group for group in report["groups"] if group["key"] == "medium")
+        self.assertEqual((medium["open"], medium["time_to_close"]["count"]), (0, 1))
+
+    def test_percentiles_from_merged_histograms(self):
+        rng = np.random.default_rng(7)
+        durations = rng.lognormal(mean=9, sigma=1.5, size=20000)
+        merged = analytics.Distribution()
+        for part in np.array_split(durations, 4):
+            counts, totals = analytics.histograms(part, np.zeros(len(part), dtype=np.int64), 1)
+            merged.add(analytics.pack(counts[0], totals[0]))
+        summary = merged.summary()
+        self.assertEqual(summary["count"], 20000)
+        self.assertAlmostEqual(summary["mean_hours"], durations.mean() / 3600, places=3)
+        for q in analytics.PERCENTILES:
+            self.assertHours(summary[f"p{q}_hours"], np.percentile(durations, q) / 3600)
+
+    def test_endpoints_are_for_agents(self):
+        params = {"weeks": 1, "until": self.week.date().isoformat()}
+        self.assertEqual(client.get("/analytics/sla", params={**params, "email_query": "customer@example.com"}).status_code, 403)
+        response = client.get("/analytics/sla", params={**params, "group_by": "agent", "email_query": "alice@example.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({group["name"] for group in response.json()["groups"]}, {"Alice", "Bob"})
+        agents = client.get("/analytics/agents", params={**params, "email_query": "alice@example.com"}).json()
+        self.assertEqual(agents["weeks"], 1)
+        self.assertEqual(client.get("/metrics/analytics").json()["reports"] >= 2, True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import archive, counters
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestTicketArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer])
+        self.db.commit()
+
+    def tearDown(self):
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.ArchivedTicketResponse).delete()
+        self.db.query(models.ArchivedTicket).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+
+    def closed_ticket(self, subject, days_ago):
+        ticket = crud.create_ticket(self.db, self.customer.id, subject, "d", "low")
+        crud.add_ticket_response(self.db, ticket.id, self.agent.id, f"Fixed {subject}")
+        crud.update_ticket_status(self.db, ticket, "closed")
+        ticket.closed_at = datetime.now() - timedelta(days=days_ago)
+        self.db.commit()
+        return ticket
+
+    def test_closing_records_closed_at(self):
+        ticket = crud.create_ticket(self.db, self.customer.id, "A", "a", "low")
+        self.assertIsNone(ticket.closed_at)
+        crud.update_ticket_status(self.db, ticket, "closed")
+        self.assertIsNotNone(ticket.closed_at)
+        crud.update_ticket_status(self.db, ticket, "open")
+        self.assertIsNone(ticket.closed_at)
+
+    def test_mover_archives_long_closed_tickets_in_batches(self):
+        old = [self.closed_ticket(f"old {i}", 120).id for i in range(5)]
+        recent = self.closed_ticket("recent", 10).id
+        crud.create_ticket(self.db, self.customer.id, "open", "still open", "high")
+        summary = crud.get_ticket_summary(self.db)
+        self.assertEqual(archive.archive_closed(self.db, days=90, batch_size=2), 5)
+        hot = {ticket.subject for ticket in self.db.query(models.Ticket)}
+        self.assertEqual(hot, {"recent", "open"})
+        archived = self.db.query(models.ArchivedTicket).order_by(models.ArchivedTicket.id).all()
+        self.assertEqual([ticket.id for ticket in archived], old)
+        self.assertEqual([r.message for r in archived[0].responses], ["Fixed old 0"])
+        self.assertEqual(self.db.query(models.TicketResponse).count(), 1)
+        # Totals still cover archived history, and reconciling agrees with them
+        self.assertEqual(crud.get_ticket_summary(self.db), summary)
+        self.assertEqual(counters.reconcile(self.db), {})
+        self.assertEqual(archive.archive_closed(self.db, days=5), 1)
+        self.assertEqual(recent, self.db.query(models.ArchivedTicket).order_by(models.ArchivedTicket.id.desc()).first().id)
+
+    def test_archived_ids_are_not_reused(self):
+        # Without AUTOINCREMENT SQLite hands the newest deleted id out again
+        first = self.closed_ticket("first", 120)
+        ticket, reply = first.id, first.responses[0].id
+        self.assertEqual(archive.archive_closed(self.db, days=90), 1)
+        second = self.closed_ticket("second", 120)
+        self.assertGreater(second.id, ticket)
+        self.assertGreater(second.responses[0].id, reply)
+        # Its reply would have taken the archived reply's id and failed the copy
+        self.assertEqual(archive.archive_closed(self.db, days=90), 1)
+        self.assertEqual(self.db.query(models.ArchivedTicketResponse).count(), 2)
+
+    def test_archived_history_is_read_on_demand(self):
+        old = self.closed_ticket("old", 120).id
+        active = crud.create_ticket(self.db, self.customer.id, "active", "a", "low").id
+        archive.archive_closed(self.db, days=90)
+        listed = client.get("/get_tickets", params={"email_query": "customer@example.com"}).json()
+        self.assertEqual([ticket["id"] for ticket in listed], [active])
+        listed = client.get("/get_tickets", params={"email_query": "customer@example.com", "archived": "true"}).json()
+        self.assertEqual([ticket["id"] for ticket in listed], [old])
+        self.assertEqual(listed[0]["responses"][0]["message"], "Fixed old")
+
+        page = client.get("/customer_tickets", params={"user_email": "customer@example.com"}).text
+        self.assertIn("active", page)
+        self.assertNotIn("Fixed old", page)
+        page = client.get("/customer_tickets", params={"user_email": "customer@example.com", "archived": "true"}).text
+        self.assertIn("Fixed old", page)
+        self.assertNotIn(f"/add_ticket_response/{old}/responses", page)
+        response = client.post(f"/add_ticket_response/{old}/responses", data={"email": "customer@example.com", "message": "hi"})
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
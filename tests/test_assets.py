@@ -0,0 +1,84 @@
+import gzip
+import os
+import re
+import tempfile
+import unittest
+import brotli
+from fastapi.testclient import TestClient
+from main import app
+from core import assets
+
+client = TestClient(app)
+
+class TestAssets(unittest.TestCase):
+
+    def test_minify_css(self):
+        css = """/* header */
+        .a > .b , .c:hover {
+            content: "keep ; these /* */ spaces" ;
+            margin : 0 auto ;
+        }
+        @media (max-width: 768px) { .d { width: calc(100% - 2rem); } }
+        """
+        self.assertEqual(
+            assets.minify_css(css),
+            '.a>.b,.c:hover{content:"keep ; these /* */ spaces";margin :0 auto}@media (max-width:768px){.d{width:calc(100% - 2rem)}}'
+        )
+
+    def test_build_fingerprints_precompresses_and_prunes(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+            def write(name, text):
+                with open(os.path.join(source, name), "w") as f:
+                    f.write(text)
+            write("site.css", "body { color: red; }\n" * 50)
+            write("notes.patch", "not an asset")
+            first = assets.build(source, target)
+            built = first["files"]["site.css"]
+            self.assertRegex(built, r"^site\.[0-9a-f]{10}\.css$")
+            self.assertEqual(list(first["files"]), ["site.css"])
+            self.assertEqual(first["encodings"][built], ["gzip", "br"])
+            with open(os.path.join(target, built), "rb") as f:
+                minified = f.read()
+            with open(os.path.join(target, built + ".gz"), "rb") as f:
+                self.assertEqual(gzip.decompress(f.read()), minified)
+            with open(os.path.join(target, built + ".br"), "rb") as f:
+                self.assertEqual(brotli.decompress(f.read()), minified)
+            # Same content, same name; new content, new name, and the old files stay until pruned
+            self.assertEqual(assets.build(source, target)["files"], first["files"])
+            write("site.css", "body { color: blue; }\n")
+            second = assets.build(source, target)
+            self.assertNotEqual(second["files"]["site.css"], built)
+            self.assertEqual(second["encodings"][second["files"]["site.css"]], [])
+            self.assertTrue(os.path.exists(os.path.join(target, built)))
+            self.assertEqual(assets.prune(second, target), 3)
+            self.assertEqual(sorted(os.listdir(target)), sorted([assets.MANIFEST, second["files"]["site.css"]]))
+
+    def test_choose_encoding(self):
+        self.assertEqual(assets.choose_encoding("gzip, deflate, br", ["gzip", "br"]), "br")
+        self.assertEqual(assets.choose_encoding("br;q=0, gzip", ["gzip", "br"]), "gzip")
+        self.assertEqual(assets.choose_encoding("gzip;q=0.5, br;q=0.2", ["gzip", "br"]), "gzip")
+        self.assertEqual(assets.choose_encoding("*", ["gzip"]), "gzip")
+        self.assertIsNone(assets.choose_encoding("identity", ["gzip", "br"]))
+        self.assertIsNone(assets.choose_encoding(None, ["gzip", "br"]))
+
+    def test_pages_link_immutable_precompressed_assets(self):
+        page = client.get("/login")
+        url = re.search(r'href="(/assets/[^"]+\.css)"', page.text).group(1)
+        self.assertEqual(url, assets.asset_url("style.css"))
+        with open(os.path.join(assets.ASSET_BUILD_DIR, url[len(assets.ASSET_URL_PREFIX):]), "rb") as f:
+            built = f.read()
+        for accept, encoding in (("gzip, deflate, br", "br"), ("gzip", "gzip"), ("identity", None)):
+            response = client.get(url, headers={"Accept-Encoding": accept})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers.get("content-encoding"), encoding)
+            self.assertEqual(response.headers["cache-control"], assets.IMMUTABLE)
+            self.assertEqual(response.headers["vary"], "Accept-Encoding")
+            self.assertTrue(response.headers["content-type"].startswith("text/css"))
+            # The client undoes the encoding
+            self.assertEqual(response.content, built)
+        compressed = client.get(url, headers={"Accept-Encoding": "br"})
+        self.assertLess(int(compressed.headers["content-length"]), len(built) / 2)
+        self.assertEqual(client.get("/assets/missing.0123456789.css").status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
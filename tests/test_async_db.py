@@ -0,0 +1,93 @@
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db, async_database_url
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+import models as models
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+setup_database(engine)
+
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL))
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+client = TestClient(app)
+
+class TestAsyncDatabaseMode(unittest.TestCase):
+    """The same routes served through an AsyncSession (DB_MODE=async)."""
+
+    def setUp(self):
+        self.previous_override = app.dependency_overrides.get(get_db)
+        app.dependency_overrides[get_db] = override_get_async_db
+        self.db = TestingSessionLocal()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+
+        self.support_agent = models.User(email="support_agent@example.com", name="Support Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.support_agent, self.customer])
+        self.db.commit()
+        self.ticket = models.Ticket(user_id=self.customer.id, subject="Async Ticket", description="Test Description", priority="medium", status=models.TicketStatus.open)
+        self.db.add(self.ticket)
+        self.db.commit()
+        self.db.add(models.TicketResponse(ticket_id=self.ticket.id, responder_id=self.support_agent.id, message="Looking into it"))
+        self.db.commit()
+
+    def tearDown(self):
+        if self.previous_override is None:
+            app.dependency_overrides.pop(get_db, None)
+        else:
+            app.dependency_overrides[get_db] = self.previous_override
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def test_dashboards_render_with_eager_loads(self):
+        for path, email in [("/support_agent_dashboard", "support_agent@example.com"), ("/customer_dashboard", "customer@example.com"),
+                            ("/support_agent_tickets", "support_agent@example.com"), ("/customer_tickets", "customer@example.com")]:
+            with self.subTest(path=path):
+                response = client.get(path, params={"user_email": email})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("Async Ticket", response.text)
+                self.assertIn("Looking into it", response.text)
+
+    def test_get_tickets_and_stream(self):
+        response = client.get("/get_tickets", params={"email_query": "support_agent@example.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["responses"][0]["message"], "Looking into it")
+        stream = client.get("/get_tickets/stream", params={"email_query": "customer@example.com"})
+        self.assertEqual(stream.status_code, 200)
+        self.assertEqual(len(stream.text.splitlines()), 1)
+
+    def test_write_endpoints(self):
+        response = client.post("/create_ticket", data={"email": "customer@example.com", "subject": "Second", "description": "More", "priority": "low"}, follow_redirects=False)
+        self.assertEqual(response.status_code, 303)
+        response = client.post(f"/update_ticket_status/{self.ticket.id}", data={"email": "support_agent@example.com", "status": "closed"}, follow_redirects=False)
+        self.assertEqual(response.status_code, 303)
+        response = client.post(f"/add_ticket_response/{self.ticket.id}/responses", data={"email": "customer@example.com", "message": "Thanks"}, follow_redirects=False)
+        self.assertEqual(response.status_code, 303)
+        self.db.expire_all()
+        self.assertEqual(self.db.query(models.Ticket).count(), 2)
+        self.assertEqual(self.db.get(models.Ticket, self.ticket.id).status, models.TicketStatus.closed)
+        self.assertEqual(self.db.query(models.TicketResponse).count(), 2)
+
+    def test_update_status_requires_agent(self):
+        response = client.post(f"/update_ticket_status/{self.ticket.id}", data={"email": "customer@example.com", "status": "closed"}, follow_redirects=False)
+        self.assertEqual(response.status_code, 403)
+
+if __name__ == "__main__":
+    unittest.main()
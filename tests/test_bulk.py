@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import bulk, counters
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class FailingStream(io.StringIO):
+    """Raises once `fail_after` lines have been read, like a dropped upload."""
+
+    def __init__(self, text, fail_after):
+        super().__init__(text)
+        self.fail_after = fail_after
+
+    def __next__(self):
+        if self.fail_after == 0:
+            raise IOError("connection lost")
+        self.fail_after -= 1
+        return super().__next__()
+
+class TestBulkTickets(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.ImportCheckpoint).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(models.ImportCheckpoint).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        self.db.close()
+
+    def csv_body(self, rows):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=["customer_email", "user_id", "subject", "description", "priority", "status"])
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+    def test_csv_import_validates_rows_and_keeps_derived_data(self):
+        body = self.csv_body([
+            {"customer_email": "customer@example.com", "subject": "Migrated invoice", "description": "From the old CRM", "priority": "high"},
+            {"user_id": self.customer.id, "subject": "Closed one", "description": "Done", "status": "closed"},
+            {"customer_email": "nobody@example.com", "subject": "Orphan", "description": "x"},
+            {"customer_email": "customer@example.com", "subject": "Bad status", "description": "x", "status": "pending"},
+            {"customer_email": "customer@example.com", "description": "No subject"},
+            {"customer_email": "customer@example.com", "subject": "x" * 256, "description": "Subject too long"},
+            {"customer_email": "customer@example.com", "subject": "Odd priority", "description": "x", "priority": "p" * 51},
+        ])
+        response = client.post(
+            "/bulk/import", data={"email": "agent@example.com"},
+            files={"file": ("tickets.csv", body, "text/csv")}
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        report = response.json()
+        self.assertEqual((report["rows_read"], report["imported"], report["rejected"]), (7, 2, 5))
+        self.assertEqual([error["row"] for error in report["errors"]], [3, 4, 5, 6, 7])
+        self.assertIn("subject", report["errors"][2]["error"])
+        self.assertIn("subject: String should have at most 255 characters", report["errors"][3]["error"])
+        self.assertIn("priority: String should have at most 50 characters", report["errors"][4]["error"])
+        # Counters and the search index follow the bulk insert
+        self.assertEqual(counters.reconcile(self.db), {})
+        self.assertEqual(crud.get_ticket_summary(self.db)["by_status"]["closed"], 1)
+        hits, _ = crud.search_tickets(self.db, "migrated", 10)
+        self.assertEqual(len(hits), 1)
+
+    def test_import_requires_agent(self):
+        response = client.post(
+            "/bulk/import", data={"email": "customer@example.com"},
+            files={"file": ("tickets.ndjson", "", "application/x-ndjson")}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_named_job_resumes_after_last_committed_chunk(self):
+        lines = [json.dumps({"user_id": self.customer.id, "subject": f"Ticket {i}", "description": "x"}) for i in range(10)]
+        lines.insert(4, "{not json")
+        text = "\n".join(lines) + "\n"
+        with self.assertRaises(IOError):
+            bulk.import_tickets(self.db, FailingStream(text, fail_after=7), "ndjson", job="legacy", chunk_size=3)
+        self.db.rollback()
+        self.assertEqual(self.db.query(models.Ticket).count(), 5)
+        report = bulk.import_tickets(self.db, io.StringIO(text), "ndjson", job="legacy", chunk_size=3)
+        self.assertEqual((report["rows_read"], report["imported"], report["rejected"]), (11, 10, 1))
+        subjects = sorted(subject for (subject,) in self.db.query(models.Ticket.subject))
+        self.assertEqual(subjects, sorted(f"Ticket {i}" for i in range(10)))
+
+    def test_export_streams_tickets_with_responses(self):
+        ticket = crud.create_ticket(self.db, self.customer.id, "Export me", "Body, with comma", "low")
+        crud.add_ticket_response(self.db, ticket.id, self.agent.id, "Reply")
+        ndjson = client.get("/bulk/export", params={"email_query": "agent@example.com"})
+        self.assertEqual(ndjson.status_code, 200)
+        record = json.loads(ndjson.text.splitlines()[0])
+        self.assertEqual(record["responses"][0]["message"], "Reply")
+        exported = client.get("/bulk/export", params={"email_query": "agent@example.com", "format": "csv"})
+        rows = list(csv.DictReader(io.StringIO(exported.text)))
+        self.assertEqual(rows[0]["description"], "Body, with comma")
+        self.assertEqual(json.loads(rows[0]["responses"])[0]["message"], "Reply")
+        # The export reads back in as an import
+        report = bulk.import_tickets(self.db, io.StringIO(ndjson.text), "ndjson")
+        self.assertEqual(report["imported"], 1)
+
+    def test_export_spans_several_batches(self):
+        for i in range(5):
+            ticket = crud.create_ticket(self.db, self.customer.id, f"Ticket {i}", "x", "low")
+            crud.add_ticket_response(self.db, ticket.id, self.agent.id, f"Reply {i}")
+        chunks = list(bulk.export_chunks(self.db, "ndjson", batch_size=2))
+        self.assertEqual([count for count, _ in chunks], [2, 2, 1])
+        records = [json.loads(line) for _, text in chunks for line in text.splitlines()]
+        self.assertEqual({record["responses"][0]["message"] for record in records}, {f"Reply {i}" for i in range(5)})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import bulk_actions, counters, duplicates
+from core.identity import UserIdentity
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestBulkActions(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.other = models.User(email="other@example.com", name="Other", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer, self.other])
+        self.db.commit()
+        self.tickets = [
+            crud.create_ticket(self.db, user.id, f"Outage report {i}", f"Nothing loads for customer number {i}", priority)
+            for i, (user, priority) in enumerate([(self.customer, "high"), (self.customer, "high"), (self.other, "high"), (self.other, "low")])
+        ]
+        self.ids = [ticket.id for ticket in self.tickets]
+
+    def tearDown(self):
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.Job).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        duplicates.index.clear()
+
+    def assertCountersExact(self):
+        self.assertFalse(any(counters.reconcile(self.db).values()))
+
+    def test_agent_closes_a_set_of_tickets(self):
+        response = client.post("/bulk/tickets/status", params={"email_query": "agent@example.com"},
+                               json={"ticket_ids": self.ids[:3] + [999999], "status": "closed"})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result["matched"], result["status_changed"], result["not_found"]), (self.ids[:3], self.ids[:3], [999999]))
+        self.db.expire_all()
+        closed = self.db.query(models.Ticket).filter(models.Ticket.status == models.TicketStatus.closed).all()
+        self.assertEqual(sorted(ticket.id for ticket in closed), self.ids[:3])
+        self.assertTrue(all(ticket.closed_at is not None for ticket in closed))
+        self.assertCountersExact()
+        # Already closed: matched, but nothing changes
+        again = client.post("/bulk/tickets/status", params={"email_query": "agent@example.com"}, json={"ticket_ids": self.ids[:1], "status": "closed"})
+        self.assertEqual(again.json()["status_changed"], [])
+        reopened = client.post("/bulk/tickets/status", params={"email_query": "agent@example.com"},
+                               json={"filter": {"status": "closed", "priority": "high"}, "status": "open"}).json()
+        self.assertEqual(reopened["status_changed"], self.ids[:3])
+        self.db.expire_all()
+        self.assertIsNone(self.db.get(models.Ticket, self.ids[0]).closed_at)
+        self.assertCountersExact()
+
+    def test_replies_and_status_in_one_transaction(self):
+        jobs_before = self.db.query(models.Job).filter_by(kind="ticket_response").count()
+        result = client.post("/bulk/tickets/responses", params={"email_query": "agent@example.com"},
+                             json={"filter": {"priority": "high"}, "message": "Fixed, sorry for the trouble", "status": "closed"}).json()
+        self.assertEqual((result["matched"], result["responses_added"], result["status_changed"]), (self.ids[:3], 3, self.ids[:3]))
+        replies = self.db.query(models.TicketResponse).order_by(models.TicketResponse.ticket_id).all()
+        self.assertEqual([(r.ticket_id, r.responder_id, r.message) for r in replies], [(i, self.agent.id, "Fixed, sorry for the trouble") for i in self.ids[:3]])
+        # One notification per reply, like the single-ticket route
+        self.assertEqual(self.db.query(models.Job).filter_by(kind="ticket_response").count() - jobs_before, 3)
+        self.assertCountersExact()
+
+    def test_customers_reply_only_to_their_own_tickets(self):
+        result = client.post("/bulk/tickets/responses", params={"email_query": "customer@example.com"},
+                             json={"ticket_ids": self.ids, "message": "Any news?"}).json()
+        self.assertEqual((result["matched"], result["forbidden"], result["responses_added"]), (self.ids[:2], self.ids[2:], 2))
+        filtered = client.post("/bulk/tickets/responses", params={"email_query": "customer@example.com"},
+                               json={"filter": {}, "message": "Still waiting"}).json()
+        self.assertEqual(filtered["matched"], self.ids[:2])
+        denied = client.post("/bulk/tickets/responses", params={"email_query": "customer@example.com"},
+                             json={"ticket_ids": self.ids[:1], "message": "Closing", "status": "closed"})
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(client.post("/bulk/tickets/status", params={"email_query": "customer@example.com"},
+                                     json={"ticket_ids": self.ids[:1], "status": "closed"}).status_code, 403)
+
+    def test_batch_limits(self):
+        agent = UserIdentity.from_user(self.agent)
+        first = bulk_actions.apply(self.db, agent, filters={"status": models.TicketStatus.open}, status=models.TicketStatus.in_progress, limit=3)
+        self.assertEqual((first["status_changed"], first["more"]), (self.ids[:3], True))
+        second = bulk_actions.apply(self.db, agent, filters={"status": models.TicketStatus.open}, status=models.TicketStatus.in_progress, limit=3)
+        self.assertEqual((second["status_changed"], second["more"]), (self.ids[3:], False))
+        with self.assertRaises(ValueError):
+            bulk_actions.apply(self.db, agent, ticket_ids=self.ids, status=models.TicketStatus.closed, limit=3)
+        self.assertEqual(client.post("/bulk/tickets/status", params={"email_query": "agent@example.com"},
+                                     json={"ticket_ids": self.ids, "filter": {}, "status": "closed"}).status_code, 422)
+        self.assertEqual(client.post("/bulk/tickets/responses", params={"email_query": "agent@example.com"},
+                                     json={"ticket_ids": self.ids, "message": ""}).status_code, 400)
+
+    def test_checkbox_form(self):
+        response = client.post("/bulk/tickets", data={"email": "agent@example.com", "ticket_ids": self.ids[1:3], "status": "closed", "message": ""},
+                               headers={"referer": "/support_agent_tickets?user_email=agent@example.com"}, follow_redirects=False)
+        self.assertEqual(response.status_code, 303)
+        self.assertEqual(response.headers["location"], "/support_agent_tickets?user_email=agent@example.com")
+        self.db.expire_all()
+        self.assertEqual([self.db.get(models.Ticket, i).status for i in self.ids],
+                         [models.TicketStatus.open, models.TicketStatus.closed, models.TicketStatus.closed, models.TicketStatus.open])
+        self.assertEqual(self.db.query(models.TicketResponse).count(), 0)
+        page = client.get("/support_agent_tickets", params={"user_email": "agent@example.com"})
+        self.assertIn('id="bulk-actions"', page.text)
+        self.assertIn(f'name="ticket_ids" value="{self.ids[0]}" form="bulk-actions"', page.text)
+
+    def test_checkbox_form_without_an_action_goes_back(self):
+        response = client.post("/bulk/tickets", data={"email": "agent@example.com", "ticket_ids": self.ids[1:3], "status": "", "message": " "},
+                               headers={"referer": "/support_agent_tickets?user_email=agent@example.com"}, follow_redirects=False)
+        self.assertEqual(response.status_code, 303)
+        self.db.expire_all()
+        self.assertTrue(all(self.db.get(models.Ticket, i).status == models.TicketStatus.open for i in self.ids))
+
+if __name__ == "__main__":
+    unittest.main()
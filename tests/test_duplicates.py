@@ -0,0 +1,153 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from core import counters, duplicates
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+ORIGINAL = ("Cannot download my invoice", "When I open the billing page and click download invoice for March nothing happens and the spinner keeps going forever")
+REWORDED = ("Cannot download my invoice", "When I open the billing page and click download invoice for March nothing happens, the spinner keeps going forever!")
+UNRELATED = ("Dark mode", "It would be great to have a dark mode for the dashboard because the white background hurts at night")
+
+class TestDuplicates(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.db.add_all([self.customer, self.agent])
+        self.db.commit()
+
+    def tearDown(self):
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.Job).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        # Tickets were deleted under it and sqlite reuses their ids
+        duplicates.index.clear()
+
+    def insert(self, *rows):
+        self.db.execute(insert(models.Ticket.__table__), [
+            {"id": ticket_id, "user_id": self.customer.id, "subject": subject, "description": description, "priority": "low", "status": models.TicketStatus.open}
+            for ticket_id, (subject, description) in rows
+        ])
+        self.db.commit()
+
+    def test_signatures_estimate_similarity(self):
+        index = duplicates.DuplicateIndex()
+        original, reworded, unrelated, empty = index.sign([duplicates.ticket_text(*t) for t in (ORIGINAL, REWORDED, UNRELATED, ("", "?!"))])
+        self.assertGreaterEqual((original == reworded).mean(), 0.7)
+        self.assertLess((original == unrelated).mean(), 0.1)
+        index.add(np.arange(1, 5), np.stack([original, reworded, unrelated, empty]))
+        self.assertEqual(index.count, 3)
+        self.assertEqual([ticket_id for ticket_id, _ in index.similar(original, exclude_id=1)], [2])
+        self.assertEqual(index.similar(empty), [])
+
+    def test_new_tickets_link_to_earlier_duplicates(self):
+        first = crud.create_ticket(self.db, self.customer.id, *ORIGINAL, "high")
+        other = crud.create_ticket(self.db, self.customer.id, *UNRELATED, "low")
+        again = crud.create_ticket(self.db, self.customer.id, *REWORDED, "high")
+        self.assertEqual((first.duplicate_of_id, other.duplicate_of_id, again.duplicate_of_id), (None, None, first.id))
+        self.assertEqual(duplicates.stats.snapshot()["indexed"], 2)
+        response = client.get(f"/similar_tickets/{first.id}", params={"email_query": "agent@example.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(hit["id"], hit["archived"]) for hit in response.json()], [(again.id, False)])
+        self.assertEqual(client.get(f"/similar_tickets/{first.id}", params={"email_query": "customer@example.com"}).status_code, 403)
+
+    def test_catch_up_finds_tickets_committed_out_of_order(self):
+        self.insert((1, ORIGINAL))
+        self.assertEqual(duplicates.index.catch_up(self.db), 1)
+        self.insert((3, UNRELATED), (4, ORIGINAL))
+        self.assertEqual(duplicates.index.catch_up(self.db), 2)
+        # 2 was skipped over, as if its transaction was still open, so it's watched for a while
+        self.insert((2, REWORDED))
+        self.assertEqual(duplicates.index.catch_up(self.db), 1)
+        self.assertEqual(duplicates.index.catch_up(self.db), 0)
+        self.assertEqual(sorted(duplicates.index.ids[:duplicates.index.count].tolist()), [1, 2, 3, 4])
+
+    def test_concurrent_catch_ups_index_each_ticket_once(self):
+        self.insert((1, ORIGINAL), (2, UNRELATED))
+        duplicates.index.catch_up(self.db)
+        self.insert((3, REWORDED), (4, ORIGINAL))
+        execute, seen = self.db.execute, []
+
+        def interleaved(*args, **kwargs):
+            if not seen:
+                seen.append(True)
+                # The lock is free while the query runs...
+                free = []
+
+                def try_lock():
+                    free.append(duplicates.index.lock.acquire(blocking=False))
+                    if free[0]:
+                        duplicates.index.lock.release()
+
+                thread = threading.Thread(target=try_lock)
+                thread.start()
+                thread.join()
+                self.assertEqual(free, [True])
+                # ...so another request (on this thread, in async mode) catches up meanwhile
+                with TestingSessionLocal() as other:
+                    self.assertEqual(duplicates.index.catch_up(other), 2)
+            return execute(*args, **kwargs)
+
+        with mock.patch.object(self.db, "execute", interleaved):
+            self.assertEqual(duplicates.index.catch_up(self.db), 0)
+        self.assertEqual(duplicates.index.ids[:duplicates.index.count].tolist(), [1, 2, 3, 4])
+
+    def test_save_and_load(self):
+        self.insert((1, ORIGINAL), (2, UNRELATED), (3, REWORDED))
+        duplicates.index.catch_up(self.db)
+        signature = duplicates.index.sign([duplicates.ticket_text(*ORIGINAL)])[0]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.npz")
+            duplicates.index.save(path)
+            loaded = duplicates.DuplicateIndex()
+            self.assertTrue(loaded.load(path))
+            self.assertEqual((loaded.count, loaded.last_id), (3, 3))
+            self.assertEqual(loaded.similar(signature), duplicates.index.similar(signature))
+            self.assertFalse(duplicates.DuplicateIndex(bands=16).load(path))
+            self.assertFalse(loaded.load(os.path.join(tmp, "missing.npz")))
+
+    def test_cluster_links_groups_to_the_oldest_ticket(self):
+        self.insert((1, UNRELATED), (2, ORIGINAL), (3, REWORDED), (4, ORIGINAL), (5, ("Password reset", "The password reset email never arrives in my inbox")))
+        result = duplicates.cluster(self.db)
+        self.assertEqual((result["tickets"], result["groups"], result["linked"]), (5, 1, 2))
+        links = dict(self.db.query(models.Ticket.id, models.Ticket.duplicate_of_id))
+        self.assertEqual(links, {1: None, 2: None, 3: 2, 4: 2, 5: None})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import events
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+def drain(subscription):
+    received = []
+    while not subscription.queue.empty():
+        received.append(subscription.queue.get_nowait())
+    return received
+
+class TestTicketEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.other = models.User(email="other@example.com", name="Other", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer, self.other])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def test_writes_publish_deltas_to_interested_subscribers(self):
+        async def scenario():
+            agent = events.broker.subscribe()
+            customer = events.broker.subscribe(self.customer.id)
+            other = events.broker.subscribe(self.other.id)
+            try:
+                # Writes commit on the threadpool, as they do under run_db
+                def write():
+                    ticket = crud.create_ticket(self.db, self.customer.id, "Broken", "It broke", "high")
+                    crud.add_ticket_response(self.db, ticket.id, self.agent.id, "Looking")
+                    crud.update_ticket_status(self.db, ticket, "closed")
+                    return ticket
+                ticket = await asyncio.to_thread(write)
+                await asyncio.sleep(0)
+                return ticket, drain(agent), drain(customer), drain(other)
+            finally:
+                for subscription in (agent, customer, other):
+                    events.broker.unsubscribe(subscription)
+
+        ticket, agent, customer, other = asyncio.run(scenario())
+        self.assertEqual([e["type"] for e in agent], ["ticket_created", "ticket_response", "ticket_status"])
+        self.assertEqual(customer, agent)
+        self.assertEqual(other, [])
+        self.assertEqual(agent[0]["subject"], "Broken")
+        self.assertEqual(agent[1]["message"], "Looking")
+        self.assertEqual((agent[2]["old_status"], agent[2]["status"]), ("open", "closed"))
+        self.assertTrue(all(e["ticket_id"] == ticket.id for e in agent))
+
+    def test_rolled_back_writes_publish_nothing(self):
+        async def scenario():
+            agent = events.broker.subscribe()
+            try:
+                self.db.add(models.Ticket(user_id=self.customer.id, subject="Draft", description="d", priority="low"))
+                self.db.flush()
+                self.db.rollback()
+                await asyncio.sleep(0)
+                return drain(agent)
+            finally:
+                events.broker.unsubscribe(agent)
+
+        self.assertEqual(asyncio.run(scenario()), [])
+
+    def test_slow_subscriber_is_told_to_resync(self):
+        async def scenario():
+            agent = events.broker.subscribe()
+            try:
+                for i in range(events.EVENTS_QUEUE_SIZE + 5):
+                    events.broker.dispatch({"type": "ticket_status", "ticket_id": i, "customer_id": None})
+                await asyncio.sleep(0)
+                return drain(agent)
+            finally:
+                events.broker.unsubscribe(agent)
+
+        received = asyncio.run(scenario())
+        self.assertIn(events.RESYNC, received)
+        self.assertLessEqual(len(received), events.EVENTS_QUEUE_SIZE)
+
+    def test_stream_formats_events_and_unsubscribes(self):
+        async def scenario():
+            subscription = events.broker.subscribe(self.customer.id)
+            stream = events.stream(subscription, heartbeat=0.01)
+            chunks = [await stream.__anext__(), await stream.__anext__()]
+            events.broker.dispatch({"type": "ticket_status", "ticket_id": 7, "customer_id": self.customer.id, "status": "closed"})
+            chunks.append(await stream.__anext__())
+            subscribed = events.broker.stats()["subscribers"]
+            await stream.aclose()
+            return chunks, subscribed, events.broker.stats()["subscribers"]
+
+        chunks, subscribed, after = asyncio.run(scenario())
+        self.assertTrue(chunks[0].startswith("retry: "))
+        self.assertEqual(chunks[1], ": keep-alive\n\n")
+        event_line, data_line = chunks[2].strip().split("\n")
+        self.assertEqual(event_line, "event: ticket_status")
+        self.assertEqual(json.loads(data_line[len("data: "):])["ticket_id"], 7)
+        self.assertEqual(after, subscribed - 1)
+
+    def test_endpoint_requires_identity_and_caps_subscribers(self):
+        self.assertEqual(client.get("/events").status_code, 401)
+        limit = events.broker.max_subscribers
+        events.broker.max_subscribers = 0
+        try:
+            response = client.get("/events", params={"email_query": "agent@example.com"})
+        finally:
+            events.broker.max_subscribers = limit
+        self.assertEqual(response.status_code, 503)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import re
+import unittest
+from unittest import mock
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from core import instrumentation
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+def server_timing(response):
+    header = response.headers["server-timing"]
+    queries = int(re.search(r'desc="(\d+) queries"', header).group(1))
+    template_ms = float(re.search(r"tpl;dur=([\d.]+)", header).group(1))
+    return queries, template_ms
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customers = [
+            models.User(email=f"customer{i}@example.com", name=f"Customer {i}", role=models.UserRole.customer, password_hash="fakehash")
+            for i in range(8)
+        ]
+        self.db.add_all([self.agent] + self.customers)
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def add_tickets(self, customers):
+        for customer in customers:
+            ticket = crud.create_ticket(self.db, customer.id, "Subject", "Body", "low")
+            crud.add_ticket_response(self.db, ticket.id, self.agent.id, "Reply")
+
+    def test_agent_ticket_page_query_count_does_not_grow_with_rows(self):
+        self.add_tickets(self.customers[:2])
+        # Warm the identity cache so both measured requests do the same lookups
+        client.get("/user_info", params={"user_email": "agent@example.com"})
+        few, template_ms = server_timing(client.get("/support_agent_tickets", params={"user_email": "agent@example.com"}))
+        self.add_tickets(self.customers[2:])
+        many, _ = server_timing(client.get("/support_agent_tickets", params={"user_email": "agent@example.com"}))
+        self.assertEqual(few, many)
+        self.assertGreater(template_ms, 0)
+
+    def test_lazy_loading_loop_is_flagged_as_n_plus_one(self):
+        self.add_tickets(self.customers)
+        with instrumentation.profiled() as profile:
+            for ticket in self.db.scalars(select(models.Ticket)).all():
+                ticket.user.name
+        self.assertEqual(profile.queries, 1 + len(self.customers))
+        [(statement, count)] = profile.suspected_n_plus_one()
+        self.assertIn("FROM users", statement)
+        self.assertEqual(count, len(self.customers))
+
+    def test_prometheus_endpoint(self):
+        client.get("/get_tickets", params={"email_query": "agent@example.com"})
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_requests_total{method="GET",route="/get_tickets",status="200"}', response.text)
+        self.assertIn('db_queries_per_request_bucket{method="GET",route="/get_tickets",le="+Inf"}', response.text)
+        self.assertIn("password_hashing_workers", response.text)
+
+    def test_sampling_off_skips_profiling_but_counts_requests(self):
+        before = instrumentation.metrics.requests[("GET", "/user_info", "200")]
+        with mock.patch.object(instrumentation, "PROFILING_MODE", "off"):
+            response = client.get("/user_info", params={"user_email": "agent@example.com"})
+        self.assertNotIn("server-timing", response.headers)
+        self.assertEqual(instrumentation.metrics.requests[("GET", "/user_info", "200")], before + 1)
+        with mock.patch.object(instrumentation, "PROFILING_MODE", "sample"), mock.patch.object(instrumentation, "PROFILING_SAMPLE_RATE", 1.0):
+            self.assertIn("server-timing", client.get("/user_info", params={"user_email": "agent@example.com"}).headers)
+
+    def test_event_stream_is_not_reported_as_slow(self):
+        # Straight through ASGI: the client listens for a while, then disconnects
+        scope = {
+            "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": "/events",
+            "raw_path": b"/events", "root_path": "", "query_string": b"email_query=agent@example.com",
+            "headers": [], "client": ("testclient", 50000), "server": ("testserver", 80),
+        }
+        messages = []
+        received = []
+
+        async def receive():
+            received.append(None)
+            if len(received) == 1:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.sleep(0.2)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        with mock.patch.object(instrumentation, "SLOW_REQUEST_MS", 100), \
+                self.assertNoLogs("core.instrumentation", "WARNING"):
+            asyncio.run(app(scope, receive, send))
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream; charset=utf-8"), messages[0]["headers"])
+
+if __name__ == "__main__":
+    unittest.main()
+
@@ -0,0 +1,149 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import counters, jobs
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add(self.customer)
+        self.db.commit()
+        self.calls = []
+        jobs.handlers["test_flaky"] = self.flaky
+
+    def tearDown(self):
+        jobs.handlers.pop("test_flaky", None)
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.Job).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+
+    def flaky(self, db, payload):
+        self.calls.append(payload["n"])
+        if len(self.calls) <= payload.get("failures", 0):
+            raise RuntimeError("smtp down")
+
+    def job_rows(self):
+        self.db.expire_all()
+        return self.db.query(models.Job).order_by(models.Job.id).all()
+
+    def test_writes_enqueue_in_their_transaction(self):
+        ticket = crud.create_ticket(self.db, self.customer.id, "Broken", "It broke", "high")
+        crud.add_ticket_response(self.db, ticket.id, self.customer.id, "Any news?")
+        self.db.add(models.Ticket(user_id=self.customer.id, subject="Draft", description="d", priority="low"))
+        jobs.enqueue(self.db, "ticket_created", {"ticket_id": -1})
+        self.db.rollback()
+        rows = self.job_rows()
+        self.assertEqual([row.kind for row in rows], ["ticket_created", "triage", "ticket_response"])
+        with self.assertLogs("core.notifications", "INFO") as logged:
+            self.assertEqual(jobs.run_pending(TestingSessionLocal), 3)
+        self.assertIn(f"[Ticket #{ticket.id}] Broken", logged.output[0])
+        # A customer reply on an unassigned ticket notifies nobody, and still succeeds
+        self.assertEqual(len(logged.output), 1)
+        self.assertEqual({row.status for row in self.job_rows()}, {models.JobStatus.succeeded})
+
+    def test_failures_back_off_then_dead_letter(self):
+        jobs.enqueue(self.db, "test_flaky", {"n": 1, "failures": 99}, max_attempts=3)
+        self.db.commit()
+        with self.assertLogs("core.jobs", "WARNING"):
+            self.assertEqual(jobs.run_pending(TestingSessionLocal), 1)
+        job = self.job_rows()[0]
+        self.assertEqual((job.status, job.attempts), (models.JobStatus.queued, 1))
+        self.assertIn("smtp down", job.last_error)
+        self.assertGreater(job.run_at, datetime.now() + timedelta(seconds=jobs.JOB_BACKOFF_BASE * 0.4))
+        # Not due yet, so nothing runs
+        self.assertEqual(jobs.run_pending(TestingSessionLocal), 0)
+        for _ in range(2):
+            self.db.query(models.Job).update({models.Job.run_at: datetime.now()})
+            self.db.commit()
+            with self.assertLogs("core.jobs", "WARNING"):
+                jobs.run_pending(TestingSessionLocal)
+        job = self.job_rows()[0]
+        self.assertEqual((job.status, job.attempts), (models.JobStatus.dead, 3))
+        self.assertEqual(jobs.queue_stats(self.db)["dead"], {"test_flaky": 1})
+        self.assertEqual(jobs.retry_dead(self.db), 1)
+        self.assertEqual(self.job_rows()[0].status, models.JobStatus.queued)
+
+    def test_retry_succeeds_and_stale_runs_are_requeued(self):
+        jobs.enqueue(self.db, "test_flaky", {"n": 1, "failures": 1})
+        self.db.commit()
+        with self.assertLogs("core.jobs", "WARNING"):
+            jobs.run_pending(TestingSessionLocal)
+        self.db.query(models.Job).update({models.Job.run_at: datetime.now()})
+        self.db.commit()
+        jobs.run_pending(TestingSessionLocal)
+        job = self.job_rows()[0]
+        self.assertEqual((job.status, job.attempts, job.last_error), (models.JobStatus.succeeded, 2, None))
+
+        # A worker that died mid-job leaves it running; the reaper hands it back
+        jobs.enqueue(self.db, "test_flaky", {"n": 2})
+        self.db.commit()
+        claimed = jobs.claim(self.db, "crashed")
+        self.db.query(models.Job).filter(models.Job.id == claimed.id).update(
+            {models.Job.locked_at: datetime.now() - timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 1)})
+        self.db.commit()
+        self.assertEqual(jobs.reap_stale(self.db), 1)
+        # The crashed worker's late result no longer counts
+        self.assertIsNone(jobs.run_job(TestingSessionLocal, claimed, "crashed"))
+        self.assertEqual(jobs.run_pending(TestingSessionLocal), 1)
+        self.assertEqual(self.job_rows()[1].status, models.JobStatus.succeeded)
+
+    def test_worker_threads_run_each_job_once(self):
+        for n in range(60):
+            jobs.enqueue(self.db, "test_flaky", {"n": n})
+        self.db.commit()
+        worker = jobs.Worker(TestingSessionLocal, concurrency=6, poll_interval=0.05)
+        lock = threading.Lock()
+        original = self.flaky
+        def counted(db, payload):
+            with lock:
+                original(db, payload)
+        jobs.handlers["test_flaky"] = counted
+        worker.start()
+        try:
+            deadline = datetime.now() + timedelta(seconds=30)
+            while len(self.calls) < 60 and datetime.now() < deadline:
+                threading.Event().wait(0.05)
+        finally:
+            worker.stop(timeout=10)
+        self.assertEqual(sorted(self.calls), list(range(60)))
+        self.assertEqual(jobs.queue_stats(self.db)["succeeded_last_minute"], 60)
+        metrics = client.get("/metrics").text
+        self.assertIn('jobs_processed_total{kind="test_flaky",outcome="succeeded"}', metrics)
+
+if __name__ == "__main__":
+    unittest.main()
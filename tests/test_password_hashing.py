@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import security
+import models as models
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+# A cheaper cost than BCRYPT_ROUNDS, as if the setting had been raised since
+legacy_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+class TestPasswordHasher(unittest.TestCase):
+
+    def test_process_pool_hashes_and_verifies(self):
+        hasher = security.PasswordHasher(workers=1, max_pending=4)
+        try:
+            hashed = asyncio.run(hasher.run(security.get_password_hash, "secret"))
+            self.assertTrue(security.verify_password("secret", hashed))
+            self.assertEqual(asyncio.run(hasher.run(security.verify_and_update_password, "wrong", hashed)), (False, None))
+            stats = hasher.stats()
+            self.assertEqual(stats["completed"], 2)
+            self.assertEqual(stats["pending"], 0)
+        finally:
+            hasher.shutdown()
+
+    def test_rejects_when_saturated(self):
+        hasher = security.PasswordHasher(workers=0, max_pending=0)
+        with self.assertRaises(security.PasswordHashingBusy):
+            asyncio.run(hasher.run(security.get_password_hash, "secret"))
+        self.assertEqual(hasher.stats()["rejected"], 1)
+
+    def test_unknown_hash_is_invalid(self):
+        self.assertEqual(security.verify_and_update_password("secret", "fakehash"), (False, None))
+
+class TestLoginHashing(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash=legacy_context.hash("correctpassword"))
+        self.db.add(self.customer)
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def login(self, password="correctpassword"):
+        data = {"email": "customer@example.com", "password": password, "role": "customer"}
+        return client.post("/login", data=data, follow_redirects=False)
+
+    def test_login_rehashes_stale_cost(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 302)
+        self.db.expire_all()
+        new_hash = self.db.get(models.User, self.customer.id).password_hash
+        self.assertTrue(new_hash.startswith(f"$2b${security.BCRYPT_ROUNDS:02d}$"))
+        self.assertTrue(security.verify_password("correctpassword", new_hash))
+
+    def test_wrong_password_keeps_hash(self):
+        original = self.customer.password_hash
+        response = self.login("wrongpassword")
+        self.assertEqual(response.status_code, 200)
+        self.db.expire_all()
+        self.assertEqual(self.db.get(models.User, self.customer.id).password_hash, original)
+
+    def test_saturated_pool_sheds_login(self):
+        max_pending = security.password_hasher.max_pending
+        security.password_hasher.max_pending = 0
+        try:
+            response = self.login()
+        finally:
+            security.password_hasher.max_pending = max_pending
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertGreaterEqual(client.get("/metrics/password_hashing").json()["rejected"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
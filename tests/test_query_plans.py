@@ -0,0 +1,163 @@
+import os
+import random
+import re
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert, text
+from setup_db import setup_database
+import models as models
+import crud
+from core import work_queue
+
+# Large enough that the planner prefers indexes over scans once ANALYZE has run
+SEED_USERS = int(os.getenv("QUERY_PLAN_SEED_USERS", "2000"))
+SEED_TICKETS = int(os.getenv("QUERY_PLAN_SEED_TICKETS", "20000"))
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+# "SCAN t" on a base table without an index is a full table scan; an ordered
+# index walk ("SCAN t USING INDEX") is fine for the newest-first listings
+FULL_SCAN = re.compile(r"^SCAN (tickets|ticket_responses|users|archived_tickets|archived_ticket_responses)(_\d+)?$")
+
+def seed(engine):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "name": f"Customer {i}", "email": f"customer{i}@example.com", "password_hash": "x",
+             "role": models.UserRole.support_agent if i % 100 == 0 else models.UserRole.customer}
+            for i in range(1, SEED_USERS + 1)
+        ])
+        conn.execute(insert(models.Ticket), [
+            {"id": i, "user_id": rng.randint(1, SEED_USERS), "subject": f"Subject {i}", "description": "Details",
+             "priority": rng.choice(["low", "medium", "high"]), "status": rng.choice(list(models.TicketStatus)),
+             "created_at": start + timedelta(minutes=i)}
+            for i in range(1, SEED_TICKETS + 1)
+        ])
+        conn.execute(insert(models.TicketResponse), [
+            {"ticket_id": rng.randint(1, SEED_TICKETS), "responder_id": 100, "message": "Reply", "timestamp": start}
+            for _ in range(SEED_TICKETS // 2)
+        ])
+        # Older history already moved to the archive tables
+        conn.execute(insert(models.ArchivedTicket), [
+            {"id": SEED_TICKETS + i, "user_id": rng.randint(1, SEED_USERS), "subject": f"Subject {i}", "description": "Details",
+             "priority": rng.choice(["low", "medium", "high"]), "status": models.TicketStatus.closed,
+             "created_at": start - timedelta(minutes=i), "closed_at": start, "archived_at": start}
+            for i in range(1, SEED_TICKETS + 1)
+        ])
+
+def listing_queries(dialect_name):
+    # Every query the dashboards and /get_tickets issue, with representative filters
+    return {
+        "customer_dashboard": crud.dashboard_tickets_query(user_id=7),
+        "support_agent_dashboard": crud.dashboard_tickets_query(),
+        "customer_tickets": crud.customer_tickets_query(7),
+        "support_agent_tickets": crud.agent_tickets_query(dialect_name),
+        "support_agent_tickets_by_status": crud.agent_tickets_query(dialect_name, status="open"),
+        "support_agent_tickets_by_priority": crud.agent_tickets_query(dialect_name, priority="high"),
+        "support_agent_tickets_by_customer_name": crud.agent_tickets_query(dialect_name, customer_name="omer 12"),
+        "get_tickets_page": crud.ticket_listing_query(status=models.TicketStatus.open).limit(101),
+        "get_tickets_next_page": crud.ticket_listing_query(customer_id=7, after=(datetime(2024, 1, 5), 500)).limit(101),
+        "search_tickets": crud.ticket_search_query(dialect_name, "subject 123").limit(21),
+        "work_queue_claim": work_queue.queue_query().limit(1),
+        "customer_archived_tickets": crud.customer_tickets_query(7, archived=True),
+        "get_tickets_archived_page": crud.ticket_listing_query(customer_id=7, archived=True).limit(101),
+    }
+
+class TestSQLiteQueryPlans(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.engine = create_engine(f"sqlite:///{cls.tmpdir.name}/plans.db")
+        setup_database(cls.engine)
+        seed(cls.engine)
+        with cls.engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+        cls.tmpdir.cleanup()
+
+    def explain(self, query):
+        compiled = query.compile(self.engine, compile_kwargs={"literal_binds": True})
+        with self.engine.connect() as conn:
+            return [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+    def test_listing_queries_use_indexes(self):
+        for name, query in listing_queries("sqlite").items():
+            with self.subTest(query=name):
+                plan = self.explain(query)
+                self.assertEqual([step for step in plan if FULL_SCAN.match(step)], [], f"{name} plan regressed: {plan}")
+                # Walking all of tickets and then sorting means the index order was
+                # lost. Sorting a seeked subset is fine, as is the dashboards' re-sort
+                # of their 3-row LIMIT subquery after the eager-load join
+                walks_tickets = any(step.startswith("SCAN tickets") for step in plan)
+                if walks_tickets and not any(step.startswith("CO-ROUTINE") for step in plan):
+                    self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan, f"{name} sorts in memory: {plan}")
+
+    def test_filtered_listings_seek_on_their_index(self):
+        expectations = {
+            "customer_tickets": "ix_tickets_user_id_created_at",
+            "support_agent_tickets_by_status": "ix_tickets_status_created_at",
+            "support_agent_tickets_by_priority": "ix_tickets_priority_created_at",
+            "get_tickets_next_page": "ix_tickets_user_id_created_at",
+            "customer_archived_tickets": "ix_archived_tickets_user_id_created_at",
+            "get_tickets_archived_page": "ix_archived_tickets_user_id_created_at",
+        }
+        queries = listing_queries("sqlite")
+        for name, index in expectations.items():
+            with self.subTest(query=name):
+                plan = self.explain(queries[name])
+                self.assertTrue(any(step.startswith("SEARCH") and index in step for step in plan), f"{name} plan: {plan}")
+
+    def test_work_queue_walks_its_partial_index(self):
+        plan = self.explain(listing_queries("sqlite")["work_queue_claim"])
+        self.assertTrue(any("ix_tickets_work_queue" in step for step in plan), plan)
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_customer_name_search_uses_trigram_table(self):
+        plan = self.explain(listing_queries("sqlite")["support_agent_tickets_by_customer_name"])
+        self.assertTrue(any("users_name_trgm VIRTUAL TABLE INDEX" in step for step in plan), plan)
+
+    def test_ticket_search_uses_fts_table(self):
+        plan = self.explain(listing_queries("sqlite")["search_tickets"])
+        self.assertTrue(any("ticket_search VIRTUAL TABLE INDEX" in step for step in plan), plan)
+
+@unittest.skipUnless(POSTGRES_URL, "set TEST_POSTGRES_URL to check Postgres plans")
+class TestPostgresQueryPlans(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_engine(POSTGRES_URL)
+        with cls.engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        setup_database(cls.engine)
+        seed(cls.engine)
+        with cls.engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def seq_scans(self, node):
+        found = [node["Relation Name"]] if node.get("Node Type") == "Seq Scan" else []
+        for child in node.get("Plans", []):
+            found.extend(self.seq_scans(child))
+        return found
+
+    def test_listing_queries_avoid_seq_scans(self):
+        for name, query in listing_queries("postgresql").items():
+            if name == "support_agent_tickets":
+                # Unfiltered and unbounded: reading every row is the point
+                continue
+            with self.subTest(query=name):
+                compiled = query.compile(self.engine, compile_kwargs={"literal_binds": True})
+                with self.engine.connect() as conn:
+                    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()[0]["Plan"]
+                self.assertEqual([t for t in self.seq_scans(plan) if t in ("tickets", "ticket_responses", "archived_tickets", "archived_ticket_responses")], [], f"{name} plan regressed: {plan}")
+
+if __name__ == "__main__":
+    unittest.main()
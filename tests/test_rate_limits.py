@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import ratelimit
+from core.cache import LocalRedis
+import models as models
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestRateLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.User).delete()
+        self.db.add_all([
+            models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash"),
+            models.User(email="agent2@example.com", name="Agent 2", role=models.UserRole.support_agent, password_hash="fakehash"),
+        ])
+        self.db.commit()
+        self.saved = ratelimit.limiter
+        policies = ratelimit.load_rate_policies("POST /login=ip:2/60;GET /support_agent_tickets=user:3/60")
+        ratelimit.limiter = ratelimit.RateLimiter(ratelimit.MemoryBuckets(), policies, {"GET /support_agent_tickets": 1}, max_wait=0.05, max_queue=1)
+
+    def tearDown(self):
+        ratelimit.limiter = self.saved
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def login(self):
+        return client.post("/login", data={"email": "nobody@example.com", "password": "x", "role": "customer"})
+
+    def test_login_is_limited_per_ip_with_retry_after(self):
+        self.assertEqual([self.login().status_code for _ in range(2)], [200, 200])
+        limited = self.login()
+        self.assertEqual(limited.status_code, 429)
+        # 2 per minute refills a token every 30 seconds
+        self.assertTrue(1 <= int(limited.headers["retry-after"]) <= 30)
+        # Routes without a policy are untouched
+        self.assertEqual(client.get("/login").status_code, 200)
+
+    def test_agent_listing_is_limited_per_user(self):
+        def listing(email):
+            return client.get("/support_agent_tickets", params={"user_email": email}).status_code
+        self.assertEqual([listing("agent@example.com") for _ in range(4)], [200, 200, 200, 429])
+        self.assertEqual(listing("agent2@example.com"), 200)
+        outcomes = {(o["route"], o["outcome"]): o["count"] for o in client.get("/metrics/rate_limits").json()["outcomes"]}
+        self.assertEqual(outcomes[("GET /support_agent_tickets", "limited")], 1)
+
+    def test_shared_buckets_are_seen_by_every_worker(self):
+        store = LocalRedis()
+        workers = [ratelimit.RedisBuckets(store), ratelimit.RedisBuckets(store)]
+        results = [workers[i % 2].take("POST /login:ip:1.2.3.4", 1 / 60, 3)[0] for i in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        self.assertTrue(workers[0].take("POST /login:ip:5.6.7.8", 1 / 60, 3)[0])
+
+    def test_requests_queued_too_long_are_shed(self):
+        async def scenario():
+            gate = ratelimit.AdmissionGate(limit=1, max_wait=0.05, max_queue=1)
+            self.assertTrue(await gate.acquire())
+            # One waiter times out; with the queue full another is refused outright
+            waiter = asyncio.ensure_future(gate.acquire())
+            await asyncio.sleep(0)
+            refused = await gate.acquire()
+            timed_out = await waiter
+            gate.release()
+            return refused, timed_out, await gate.acquire()
+
+        self.assertEqual(asyncio.run(scenario()), (False, False, True))
+
+    def test_shed_requests_get_503_with_retry_after(self):
+        gate = ratelimit.limiter.gates["GET /support_agent_tickets"]
+
+        async def hold():
+            await gate.acquire()
+        asyncio.run(hold())
+        try:
+            response = client.get("/support_agent_tickets", params={"user_email": "agent@example.com"})
+        finally:
+            gate.running -= 1
+            gate._semaphore = None
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("retry-after", response.headers)
+
+if __name__ == "__main__":
+    unittest.main()
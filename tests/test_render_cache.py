@@ -0,0 +1,114 @@
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core.render_cache import render_cache
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.other = models.User(email="other@example.com", name="Other", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer, self.other])
+        self.db.commit()
+        self.ticket = crud.create_ticket(self.db, self.customer.id, "Printer on fire", "Smoke everywhere", "high")
+
+    def tearDown(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def get(self, path, email, etag=None, **params):
+        headers = {"If-None-Match": etag} if etag else {}
+        return client.get(path, params=dict(params, user_email=email), headers=headers)
+
+    def test_unchanged_page_is_not_modified(self):
+        first = self.get("/customer_tickets", "customer@example.com")
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Printer on fire", first.text)
+        self.assertEqual(first.headers["cache-control"], "private, no-cache")
+        hits = render_cache.hits
+        again = self.get("/customer_tickets", "customer@example.com")
+        self.assertEqual(again.text, first.text)
+        self.assertEqual(render_cache.hits, hits + 1)
+        revalidated = self.get("/customer_tickets", "customer@example.com", etag=first.headers["etag"])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+
+    def test_ticket_writes_invalidate(self):
+        etag = self.get("/customer_tickets", "customer@example.com").headers["etag"]
+        client.post(f"/add_ticket_response/{self.ticket.id}/responses", data={"message": "Extinguisher sent", "email": "agent@example.com"})
+        page = self.get("/customer_tickets", "customer@example.com", etag=etag)
+        self.assertEqual(page.status_code, 200)
+        self.assertIn("Extinguisher sent", page.text)
+        etag = page.headers["etag"]
+        client.post(f"/update_ticket_status/{self.ticket.id}", data={"status": "closed", "email": "agent@example.com"})
+        page = self.get("/customer_tickets", "customer@example.com", etag=etag)
+        self.assertEqual(page.status_code, 200)
+        self.assertIn("status-closed", page.text)
+        etag = page.headers["etag"]
+        client.post("/create_ticket", data={"subject": "Second one", "description": "d", "priority": "low", "email": "customer@example.com"})
+        page = self.get("/customer_tickets", "customer@example.com", etag=etag)
+        self.assertEqual(page.status_code, 200)
+        self.assertIn("Second one", page.text)
+
+    def test_other_customers_pages_survive_a_write(self):
+        crud.create_ticket(self.db, self.other.id, "Other's ticket", "d", "low")
+        etag = self.get("/customer_tickets", "other@example.com").headers["etag"]
+        crud.add_ticket_response(self.db, self.ticket.id, self.agent.id, "Unrelated")
+        self.assertEqual(self.get("/customer_tickets", "other@example.com", etag=etag).status_code, 304)
+        # Agents see every ticket, so their pages do change
+        agent_etag = self.get("/support_agent_tickets", "agent@example.com").headers["etag"]
+        crud.add_ticket_response(self.db, self.ticket.id, self.agent.id, "Another")
+        self.assertEqual(self.get("/support_agent_tickets", "agent@example.com", etag=agent_etag).status_code, 200)
+
+    def test_etag_depends_on_viewer_and_filters(self):
+        customer = self.get("/customer_dashboard", "customer@example.com").headers["etag"]
+        other = self.get("/customer_dashboard", "other@example.com").headers["etag"]
+        self.assertNotEqual(customer, other)
+        self.assertEqual(self.get("/customer_dashboard", "other@example.com", etag=customer).status_code, 200)
+        unfiltered = self.get("/support_agent_tickets", "agent@example.com")
+        closed = self.get("/support_agent_tickets", "agent@example.com", status="closed")
+        self.assertNotEqual(unfiltered.headers["etag"], closed.headers["etag"])
+        self.assertIn("Printer on fire", unfiltered.text)
+        self.assertNotIn("Printer on fire", closed.text)
+
+    def test_ticket_cards_are_reused_across_pages(self):
+        self.get("/support_agent_tickets", "agent@example.com")
+        hits = render_cache.fragment_hits
+        # A new filter set is a page miss, but the card itself is unchanged
+        self.get("/support_agent_tickets", "agent@example.com", priority="high")
+        self.assertEqual(render_cache.fragment_hits, hits + 1)
+
+if __name__ == "__main__":
+    unittest.main()
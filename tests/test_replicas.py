@@ -0,0 +1,114 @@
+import tempfile
+import time
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+import database
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import counters
+import models as models
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+def users():
+    return [
+        models.User(id=1, email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash"),
+        models.User(id=2, email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash"),
+    ]
+
+class TestReplicaRouting(unittest.TestCase):
+    """Two SQLite files stand in for replicas that haven't caught up with the primary."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.replica_sessions = []
+        for name in ("replica1", "replica2"):
+            replica = create_engine(f"sqlite:///{cls.tmpdir.name}/{name}.db", connect_args={"check_same_thread": False})
+            setup_database(replica)
+            factory = sessionmaker(autoflush=False, expire_on_commit=False, bind=replica)
+            with factory() as db:
+                db.add_all(users())
+                db.add(models.Ticket(user_id=2, subject=f"from {name}", description="d", priority="low"))
+                db.commit()
+            cls.replica_sessions.append(factory)
+
+    @classmethod
+    def tearDownClass(cls):
+        for factory in cls.replica_sessions:
+            factory.kw["bind"].dispose()
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.db.add_all(users())
+        self.db.commit()
+        self.saved = database.replicas
+        database.replicas = database.ReplicaSet(self.replica_sessions)
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        database.replicas = self.saved
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+
+    def subjects(self, **headers):
+        response = self.client.get("/get_tickets", params={"email_query": "agent@example.com"}, headers=headers)
+        return [ticket["subject"] for ticket in response.json()]
+
+    def test_reads_rotate_over_replicas(self):
+        seen = [self.subjects() for _ in range(4)]
+        self.assertEqual(seen, [["from replica1"], ["from replica2"], ["from replica1"], ["from replica2"]])
+
+    def test_client_reads_its_own_writes_after_a_post(self):
+        created = self.client.post("/create_ticket", data={"email": "customer@example.com", "subject": "new", "description": "d", "priority": "high"}, follow_redirects=False)
+        self.assertEqual(created.status_code, 303)
+        self.assertIn(database.READ_PRIMARY_COOKIE, created.cookies)
+        until = int(created.headers["x-read-primary-until"])
+        self.assertAlmostEqual(until, time.time() + database.REPLICA_STICKY_SECONDS, delta=2)
+        # The cookie now routes this client's reads to the primary
+        self.assertEqual(self.subjects(), ["new"])
+        # Another client, and this one once the window has passed, go back to replicas
+        self.client.cookies.clear()
+        self.assertTrue(self.subjects()[0].startswith("from replica"))
+        self.assertTrue(self.subjects(**{"x-read-primary-until": str(int(time.time()) - 1)})[0].startswith("from replica"))
+        self.assertEqual(self.subjects(**{"x-read-primary-until": str(until)}), ["new"])
+
+    def test_without_replicas_everything_uses_the_primary(self):
+        database.replicas = database.ReplicaSet([])
+        created = self.client.post("/create_ticket", data={"email": "customer@example.com", "subject": "new", "description": "d", "priority": "high"}, follow_redirects=False)
+        self.assertNotIn(database.READ_PRIMARY_COOKIE, created.cookies)
+        self.assertEqual(self.subjects(), ["new"])
+
+    def test_pool_stats_report_saturation(self):
+        stats = self.client.get("/metrics/db_pools").json()
+        self.assertEqual(stats["primary"]["size"], database.DB_POOL_SIZE)
+        self.assertLessEqual(stats["primary"]["saturation"], 1.0)
+        self.assertIn('db_pool_saturation{engine="primary"}', self.client.get("/metrics").text)
+
+if __name__ == "__main__":
+    unittest.main()
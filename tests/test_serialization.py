@@ -0,0 +1,95 @@
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import counters, serialization
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestFastSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer])
+        self.db.commit()
+        for i in range(5):
+            ticket = crud.create_ticket(self.db, self.customer.id, f"Ticket {i} – ünïcode \"quoted\"", "Line one\nline two", None if i == 2 else "high")
+            if i != 3:
+                crud.add_ticket_response(self.db, ticket.id, self.agent.id, f"Reply {i}")
+                crud.add_ticket_response(self.db, ticket.id, self.customer.id, "Thanks")
+            if i == 4:
+                crud.update_ticket_status(self.db, ticket, "in_progress")
+        # One timestamp without microseconds, which ISO formatting drops
+        self.db.query(models.Ticket).filter(models.Ticket.subject.like("Ticket 0%")).update({models.Ticket.created_at: datetime(2024, 1, 1, 9, 30)}, synchronize_session=False)
+        self.db.commit()
+
+    def tearDown(self):
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+
+    def get(self, mode, **params):
+        with mock.patch.object(serialization, "API_SERIALIZATION", mode):
+            return client.get("/get_tickets", params={"email_query": "agent@example.com", **params})
+
+    def test_fast_path_matches_the_schema_contract(self):
+        for params in ({}, {"limit": 2}, {"status": "in_progress"}, {"archived": "true"}):
+            with self.subTest(params=params):
+                fast, slow = self.get("fast", **params), self.get("pydantic", **params)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+                self.assertEqual(fast.headers.get("x-next-cursor"), slow.headers.get("x-next-cursor"))
+        page = json.loads(self.get("fast", limit=2).content)
+        self.assertEqual(list(page[0]), ["subject", "description", "priority", "id", "user_id", "status", "created_at", "category", "suggested_priority", "duplicate_of_id", "responses"])
+        self.assertEqual([r["message"] for r in page[0]["responses"]], ["Reply 4", "Thanks"])
+
+    def test_cursor_pages_cover_every_ticket_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.get("fast", limit=2, **({"cursor": cursor} if cursor else {}))
+            seen += [ticket["id"] for ticket in response.json()]
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(ticket.id for ticket in self.db.query(models.Ticket)))
+
+    def test_stdlib_fallback_encodes_like_orjson(self):
+        payloads, _ = crud.get_ticket_payload_page(self.db, 10)
+        fast = serialization.dumps(payloads)
+        with mock.patch.object(serialization, "orjson", None):
+            self.assertEqual(json.loads(serialization.dumps(payloads)), json.loads(fast))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import security, sessions
+from core.identity import UserIdentity
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+class TestSessionTokens(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash=security.get_password_hash("password"))
+        self.db.add(self.customer)
+        self.db.commit()
+        self.identity = UserIdentity.from_user(self.customer)
+
+    def tearDown(self):
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def test_login_sets_cookie_and_dashboard_skips_user_lookup(self):
+        response = self.client.post("/login", data={"email": "customer@example.com", "password": "password", "role": "customer"}, follow_redirects=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(sessions.SESSION_COOKIE_NAME, response.cookies)
+        with mock.patch.object(crud, "get_user_identity", side_effect=AssertionError("users table lookup")):
+            response = self.client.get("/customer_dashboard")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Customer", response.text)
+            self.assertEqual(self.client.get("/user_info").json()["email"], "customer@example.com")
+        self.client.get("/logout", follow_redirects=False)
+        self.assertEqual(self.client.get("/user_info").status_code, 401)
+
+    def test_bearer_token_from_auth_login(self):
+        response = self.client.post("/auth/login", data={"username": "customer@example.com", "password": "password"})
+        self.assertEqual(response.status_code, 200)
+        token = response.json()["access_token"]
+        with mock.patch.object(crud, "get_user_identity", side_effect=AssertionError("users table lookup")):
+            response = self.client.get("/get_tickets", headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post("/auth/login", data={"username": "customer@example.com", "password": "wrong"}).status_code, 401)
+
+    def test_key_rotation(self):
+        old_token = sessions.create_session_token(self.identity)
+        rotated = {"new": "new-secret", sessions.ACTIVE_KEY_ID: sessions.SIGNING_KEYS[sessions.ACTIVE_KEY_ID]}
+        with mock.patch.object(sessions, "SIGNING_KEYS", rotated), mock.patch.object(sessions, "ACTIVE_KEY_ID", "new"):
+            new_token = sessions.create_session_token(self.identity)
+            self.assertEqual(sessions.identity_from_token(old_token), self.identity)
+            self.assertEqual(sessions.identity_from_token(new_token), self.identity)
+        # Once the new key is retired, its tokens are rejected
+        self.assertIsNone(sessions.identity_from_token(new_token))
+
+    def test_expired_and_tampered_tokens_are_rejected(self):
+        expired = sessions.create_access_token({"sub": str(self.identity.id), "email": self.identity.email, "name": self.identity.name, "role": "support_agent"}, expires_in=-10)
+        self.assertIsNone(sessions.identity_from_token(expired))
+        header, payload, signature = sessions.create_session_token(self.identity).split(".")
+        self.assertIsNone(sessions.identity_from_token(f"{header}.{payload}.{signature[:-2]}xx"))
+        self.assertEqual(self.client.get("/get_tickets", headers={"Authorization": f"Bearer {expired}"}).status_code, 401)
+
+    def test_legacy_email_auth_can_be_disabled(self):
+        self.assertEqual(self.client.get("/user_info", params={"user_email": "customer@example.com"}).status_code, 200)
+        with mock.patch.object(sessions, "LEGACY_EMAIL_AUTH", False):
+            self.assertEqual(self.client.get("/user_info", params={"user_email": "customer@example.com"}).status_code, 401)
+            self.assertEqual(self.client.get("/get_tickets", params={"email_query": "customer@example.com"}).status_code, 401)
+
+if __name__ == "__main__":
+    unittest.main()
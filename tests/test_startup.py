@@ -0,0 +1,57 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import main
+from setup_db import setup_database
+from core import security, templating
+from routers import frontend
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+setup_database(engine)
+
+class TestStartup(unittest.TestCase):
+
+    def test_one_template_environment(self):
+        self.assertIs(frontend.templates, templating.templates)
+        self.assertIn("asset_url", templating.templates.env.globals)
+        self.assertIn("url_for", templating.templates.env.globals)
+
+    def test_compiled_templates_persist_across_processes(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = templating.environment(cache_dir=cache_dir)
+            self.assertEqual(templating.warm(first), len(first.list_templates(extensions=["html"])))
+            self.assertEqual(len(os.listdir(cache_dir)), len(first.list_templates(extensions=["html"])))
+            # A new environment, as in a new process, loads the compiled code instead of compiling
+            second = templating.environment(cache_dir=cache_dir)
+            with mock.patch.object(second, "compile", wraps=second.compile) as compile:
+                templating.warm(second)
+                self.assertEqual(compile.call_count, 0)
+            html = second.get_template("login.html").render(request=None, asset_url=lambda name: f"/static/{name}")
+            self.assertIn("/static/style.css", html)
+            # An edited template is compiled again rather than served stale
+            with tempfile.TemporaryDirectory() as source:
+                with open(os.path.join(source, "page.html"), "w") as f:
+                    f.write("one")
+                self.assertEqual(templating.environment(source, cache_dir).get_template("page.html").render(), "one")
+                with open(os.path.join(source, "page.html"), "w") as f:
+                    f.write("two")
+                self.assertEqual(templating.environment(source, cache_dir).get_template("page.html").render(), "two")
+
+    def test_warm_up_before_traffic(self):
+        templating.templates.env.cache.clear()
+        with mock.patch.object(security.password_hasher, "warm_up") as hashing:
+            asyncio.run(main.warm_up(TestingSessionLocal, [engine]))
+        hashing.assert_called_once()
+        loaded = {name for _, name in templating.templates.env.cache.keys()}
+        self.assertEqual(loaded, set(templating.templates.env.list_templates(extensions=["html"])))
+        self.assertGreaterEqual(engine.pool.checkedin(), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 from fastapi.testclient import TestClient
 from main import app
-from database import get_db, Base
+from database import get_db
+from setup_db import setup_database
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import models as models
@@ -18,7 +19,7 @@ def override_get_db():
         db.close()
 
 # Create the test database schema
-Base.metadata.create_all(bind=engine)
+setup_database(engine)
 
 app.dependency_overrides[get_db] = override_get_db
 
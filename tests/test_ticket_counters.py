@@ -0,0 +1,103 @@
+import unittest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from core import counters
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestTicketCounters(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        self.db.close()
+
+    def summary(self):
+        return crud.get_ticket_summary(self.db)
+
+    def test_writes_keep_counters_in_step(self):
+        high = crud.create_ticket(self.db, self.customer.id, "A", "a", "high")
+        crud.create_ticket(self.db, self.customer.id, "B", "b", "low")
+        crud.create_ticket(self.db, self.customer.id, "C", "c", None)
+        crud.add_ticket_response(self.db, high.id, self.agent.id, "On it")
+        crud.update_ticket_status(self.db, high, "closed")
+        summary = self.summary()
+        self.assertEqual(summary["total_tickets"], 3)
+        self.assertEqual(summary["total_responses"], 1)
+        self.assertEqual(summary["by_status"], {"open": 2, "in_progress": 0, "closed": 1})
+        self.assertEqual(summary["by_priority"], {"high": 1, "low": 1, "none": 1})
+        self.assertEqual(summary["backlog"], 2)
+        # Nothing to correct: the maintained values match a full recount
+        self.assertEqual(counters.reconcile(self.db), {})
+
+    def test_backlog_age_follows_reopen_and_close(self):
+        ticket = crud.create_ticket(self.db, self.customer.id, "Old", "x", "high")
+        ticket.created_at = datetime.now() - timedelta(hours=10)
+        self.db.commit()
+        counters.reconcile(self.db)
+        self.assertAlmostEqual(self.summary()["backlog_avg_age_hours"], 10, delta=0.1)
+        crud.update_ticket_status(self.db, ticket, "closed")
+        self.assertIsNone(self.summary()["backlog_avg_age_hours"])
+        crud.update_ticket_status(self.db, ticket, "in_progress")
+        self.assertAlmostEqual(self.summary()["backlog_avg_age_hours"], 10, delta=0.1)
+        self.assertEqual(counters.reconcile(self.db), {})
+
+    def test_reconcile_repairs_drift(self):
+        crud.create_ticket(self.db, self.customer.id, "A", "a", "high")
+        self.db.execute(text("UPDATE tickets SET status = 'closed'"))
+        self.db.execute(text("UPDATE ticket_counters SET value = 99 WHERE name = 'tickets'"))
+        self.db.commit()
+        corrections = counters.reconcile(self.db)
+        self.assertEqual(corrections["tickets"], -98)
+        self.assertEqual(self.summary()["by_status"], {"open": 0, "in_progress": 0, "closed": 1})
+        self.assertEqual(self.summary()["total_tickets"], 1)
+
+    def test_summary_endpoint_and_dashboard(self):
+        crud.create_ticket(self.db, self.customer.id, "A", "a", "medium")
+        response = client.get("/ticket_summary", params={"email_query": "agent@example.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["by_priority"], {"medium": 1})
+        self.assertEqual(client.get("/ticket_summary", params={"email_query": "customer@example.com"}).status_code, 403)
+        page = client.get("/support_agent_dashboard", params={"user_email": "agent@example.com"})
+        self.assertEqual(page.status_code, 200)
+        self.assertIn("Open Backlog", page.text)
+
+if __name__ == "__main__":
+    unittest.main()
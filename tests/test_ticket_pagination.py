@@ -0,0 +1,103 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import models as models
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestTicketPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+
+        self.support_agent = models.User(email="support_agent@example.com", name="Support Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.other_customer = models.User(email="other@example.com", name="Other", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.support_agent, self.customer, self.other_customer])
+        self.db.commit()
+
+        # Two tickets share a timestamp so the id tie-breaker is exercised
+        base = datetime(2025, 1, 1, 12, 0, 0)
+        stamps = [base, base, base + timedelta(hours=1), base + timedelta(hours=2), base + timedelta(hours=3)]
+        for i, stamp in enumerate(stamps):
+            owner = self.customer if i % 2 == 0 else self.other_customer
+            status = models.TicketStatus.closed if i == 4 else models.TicketStatus.open
+            self.db.add(models.Ticket(user_id=owner.id, subject=f"Ticket {i}", description="Details", priority="high" if i < 2 else "low", status=status, created_at=stamp))
+        self.db.commit()
+        first = self.db.query(models.Ticket).order_by(models.Ticket.id).first()
+        self.db.add(models.TicketResponse(ticket_id=first.id, responder_id=self.support_agent.id, message="On it"))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def fetch_all_pages(self, **params):
+        seen, cursor = [], None
+        while True:
+            query = dict(params, email_query="support_agent@example.com", limit=2)
+            if cursor:
+                query["cursor"] = cursor
+            response = client.get("/get_tickets", params=query)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return seen
+
+    def test_keyset_pages_cover_every_ticket_once_newest_first(self):
+        tickets = self.fetch_all_pages()
+        self.assertEqual([t["subject"] for t in tickets], ["Ticket 4", "Ticket 3", "Ticket 2", "Ticket 1", "Ticket 0"])
+        self.assertEqual(len(tickets[-1]["responses"]), 1)
+
+    def test_filters_are_applied(self):
+        tickets = self.fetch_all_pages(status="open", priority="low")
+        self.assertEqual([t["subject"] for t in tickets], ["Ticket 3", "Ticket 2"])
+
+    def test_customer_is_scoped_to_own_tickets(self):
+        response = client.get("/get_tickets", params={"email_query": "customer@example.com", "customer_id": self.other_customer.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(t["user_id"] == self.customer.id for t in response.json()))
+        self.assertEqual(len(response.json()), 3)
+
+    def test_invalid_cursor(self):
+        response = client.get("/get_tickets", params={"email_query": "support_agent@example.com", "cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_ndjson(self):
+        response = client.get("/get_tickets/stream", params={"email_query": "support_agent@example.com", "status": "open"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([r["subject"] for r in rows], ["Ticket 3", "Ticket 2", "Ticket 1", "Ticket 0"])
+
+if __name__ == "__main__":
+    unittest.main()
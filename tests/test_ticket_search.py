@@ -0,0 +1,93 @@
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestTicketSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.other = models.User(email="other@example.com", name="Other", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.customer, self.other])
+        self.db.commit()
+        self.invoice = crud.create_ticket(self.db, self.customer.id, "Invoice is wrong", "Charged twice this month", "high")
+        self.login = crud.create_ticket(self.db, self.customer.id, "Cannot log in", "Password reset email never arrives", "medium")
+        self.mention = crud.create_ticket(self.db, self.other.id, "Question", "Where do I find my invoice?", "low")
+
+    def tearDown(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def search(self, q, user="agent@example.com", **params):
+        return client.get("/search_tickets", params=dict(params, q=q, email_query=user))
+
+    def test_ranks_subject_matches_first_and_stems(self):
+        response = self.search("invoices")
+        self.assertEqual(response.status_code, 200)
+        hits = response.json()
+        self.assertEqual([hit["id"] for hit in hits], [self.invoice.id, self.mention.id])
+        self.assertGreater(hits[0]["rank"], hits[1]["rank"])
+
+    def test_responses_are_indexed_on_write(self):
+        self.assertEqual(self.search("refund").json(), [])
+        response = crud.add_ticket_response(self.db, self.login.id, self.agent.id, "A refund has been issued")
+        self.assertEqual([hit["id"] for hit in self.search("refund").json()], [self.login.id])
+        self.db.delete(response)
+        self.db.commit()
+        self.assertEqual(self.search("refund").json(), [])
+
+    def test_edits_and_deletes_update_the_index(self):
+        ticket = crud.get_ticket(self.db, self.login.id)
+        ticket.subject = "Two factor prompt loops"
+        self.db.commit()
+        self.assertEqual([hit["id"] for hit in self.search("factor").json()], [self.login.id])
+        self.db.delete(ticket)
+        self.db.commit()
+        self.assertEqual(self.search("factor").json(), [])
+
+    def test_customers_only_search_their_tickets(self):
+        hits = self.search("invoice", user="customer@example.com", customer_id=self.other.id).json()
+        self.assertEqual([hit["id"] for hit in hits], [self.invoice.id])
+
+    def test_pagination_and_query_syntax_is_inert(self):
+        first = self.search("invoice", limit=1)
+        self.assertEqual(first.headers["X-Next-Offset"], "1")
+        second = self.search("invoice", limit=1, offset=1)
+        self.assertNotIn("X-Next-Offset", second.headers)
+        self.assertEqual([first.json()[0]["id"], second.json()[0]["id"]], [self.invoice.id, self.mention.id])
+        self.assertEqual(self.search('invoice" OR "*').status_code, 200)
+        self.assertEqual(self.search("***").json(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import counters, jobs, triage
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+HISTORY = [
+    ("VAT missing on invoice", "The invoice has no VAT number", "medium"),
+    ("Refund VAT", "I was charged VAT twice", "medium"),
+    ("Site down", "Production outage, nothing loads, urgent", "high"),
+    ("Checkout down", "Outage at checkout, customers blocked", "high"),
+    ("Dark mode", "Small idea: a dark mode would be nice", "low"),
+    ("Typo", "Minor typo in the footer", "Low"),
+]
+
+class TestTriage(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.clear()
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add(self.customer)
+        self.db.commit()
+
+    def tearDown(self):
+        self.clear()
+        self.db.close()
+
+    def clear(self):
+        self.db.query(models.Job).delete()
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+
+    def test_keyword_model_categorizes_and_suggests_priority(self):
+        predictions = triage.TriageModel.from_keywords().predict([
+            "Refund\nI was charged twice on my card",
+            "Can't log in\nPassword reset email never arrives, urgent",
+            "Hello\nJust saying hi",
+        ])
+        self.assertEqual(predictions[0]["category"], "billing")
+        self.assertEqual(predictions[1], {"category": "account", "suggested_priority": "high"})
+        self.assertEqual(predictions[2], {"category": "general", "suggested_priority": None})
+
+    def test_trained_model_learns_from_history_and_round_trips(self):
+        texts = [triage.ticket_text(subject, description) for subject, description, _ in HISTORY]
+        model = triage.train(texts, [priority for _, _, priority in HISTORY], min_df=1)
+        # "VAT" is no keyword, but it kept company with invoices and refunds
+        unseen = ["VAT question\nWhere do I find the VAT?", "Everything is down\nOutage again"]
+        predictions = model.predict(unseen)
+        self.assertEqual(predictions[0]["category"], "billing")
+        self.assertEqual(predictions[1]["suggested_priority"], "high")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.npz")
+            model.save(path)
+            loaded = triage.current_model(path)
+            self.assertEqual(loaded.source, "trained")
+            self.assertEqual(loaded.predict(unseen), predictions)
+            self.assertIs(triage.current_model(path), loaded)
+            self.assertGreater(triage.stats.snapshot()["model_loads"], 0)
+        # Back to the keyword model once the file is gone
+        self.assertEqual(triage.current_model().source, "keywords")
+
+    def test_new_tickets_are_triaged_by_one_batched_job(self):
+        first = crud.create_ticket(self.db, self.customer.id, "Charged twice", "Please refund the second payment", "low")
+        second = crud.create_ticket(self.db, self.customer.id, "App crashes", "It crashes on start, urgent", "low")
+        self.assertEqual(triage.untriaged_count(self.db), 2)
+        self.assertEqual(jobs.run_pending(TestingSessionLocal, kinds=["triage"]), 2)
+        self.db.expire_all()
+        first, second = self.db.get(models.Ticket, first.id), self.db.get(models.Ticket, second.id)
+        self.assertEqual((first.category, second.category, second.suggested_priority), ("billing", "bug", "high"))
+        # The customer's priority stands; the suggestion sits beside it
+        self.assertEqual(second.priority, "low")
+        self.assertEqual(triage.untriaged_count(self.db), 0)
+        listed = client.get("/get_tickets", params={"email_query": "customer@example.com"}).json()
+        self.assertEqual({t["id"]: t["category"] for t in listed}, {first.id: "billing", second.id: "bug"})
+
+    def test_rescore_covers_the_backlog_and_reports_throughput(self):
+        self.db.add_all([
+            models.Ticket(user_id=self.customer.id, subject=f"Invoice {i}", description="Wrong amount billed", priority="medium")
+            for i in range(25)
+        ])
+        self.db.commit()
+        before = triage.stats.snapshot()["tickets"]
+        self.assertEqual(triage.rescore(self.db, batch_size=10, pending_only=True), 25)
+        self.assertEqual(triage.rescore(self.db, batch_size=10, pending_only=True), 0)
+        self.assertEqual({t.category for t in self.db.query(models.Ticket)}, {"billing"})
+        report = client.get("/metrics/triage").json()
+        self.assertEqual(report["tickets"] - before, 25)
+        self.assertEqual(report["untriaged"], 0)
+        self.assertIn("model_load_seconds", report)
+        self.assertIn("triage_tickets_per_second", client.get("/metrics").text)
+
+if __name__ == "__main__":
+    unittest.main()
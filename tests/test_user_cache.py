@@ -0,0 +1,119 @@
+import time
+import unittest
+from unittest import mock
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from core.cache import TTLCache, RedisCache, LocalRedis, UserCache, user_cache, NOT_FOUND
+from core.identity import UserIdentity
+import models as models
+import crud
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestCacheBackends(unittest.TestCase):
+
+    def test_ttl_cache_expires_and_evicts_lru(self):
+        cache = TTLCache(max_entries=2, ttl=0.05)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(len(cache), 2)
+        time.sleep(0.06)
+        self.assertNotEqual(cache.get("a"), 1)
+
+    def test_redis_backend_round_trip_and_clear(self):
+        cache = UserCache(RedisCache(LocalRedis(), ttl=60, prefix="test"))
+        identity = UserIdentity(id=1, name="A", email="a@example.com", role=models.UserRole.customer)
+        cache.store("a@example.com", identity)
+        cache.store("missing@example.com", None)
+        self.assertEqual(cache.get_by_email("a@example.com"), identity)
+        self.assertEqual(cache.get_by_id(1), identity)
+        self.assertIs(cache.get_by_email("missing@example.com"), NOT_FOUND)
+        cache.clear()
+        self.assertIsNone(cache.get_by_email("a@example.com"))
+        self.assertEqual(cache.stats()["hits"], 3)
+
+class TestUserCacheInvalidation(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add(self.customer)
+        self.db.commit()
+        user_cache.clear()
+
+    def tearDown(self):
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.db.close()
+
+    def test_repeat_lookups_hit_the_cache(self):
+        before = user_cache.stats()
+        for _ in range(3):
+            response = client.get("/user_info", params={"user_email": "customer@example.com"})
+            self.assertEqual(response.json()["role"], "customer")
+        after = client.get("/metrics/user_cache").json()
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 2)
+
+    def test_registration_replaces_cached_absence(self):
+        cache = UserCache(RedisCache(LocalRedis(), ttl=60, prefix="test"))
+        with mock.patch("crud.user_cache", cache), mock.patch("core.cache.user_cache", cache):
+            self.assertEqual(client.get("/user_info", params={"user_email": "new@example.com"}).status_code, 404)
+            self.assertIs(cache.get_by_email("new@example.com"), NOT_FOUND)
+            crud.create_user(self.db, "New", "new@example.com", "fakehash", "customer")
+            self.assertEqual(client.get("/user_info", params={"user_email": "new@example.com"}).status_code, 200)
+
+    def test_per_process_cache_does_not_remember_absence(self):
+        self.assertEqual(client.get("/user_info", params={"user_email": "new@example.com"}).status_code, 404)
+        self.assertIsNone(user_cache.get_by_email("new@example.com"))
+        # As if registered on another worker: no hook here sees the write
+        self.db.execute(insert(models.User.__table__).values(name="New", email="new@example.com", password_hash="fakehash", role=models.UserRole.customer))
+        self.db.commit()
+        self.assertEqual(client.get("/user_info", params={"user_email": "new@example.com"}).status_code, 200)
+
+    def test_role_change_invalidates(self):
+        self.assertEqual(client.get("/user_info", params={"user_email": "customer@example.com"}).json()["role"], "customer")
+        # No route changes roles; any Session write is caught by core.cache's hooks
+        self.customer.role = models.UserRole.support_agent
+        self.db.commit()
+        self.assertEqual(client.get("/user_info", params={"user_email": "customer@example.com"}).json()["role"], "support_agent")
+
+    def test_password_change_keeps_entry(self):
+        client.get("/user_info", params={"user_email": "customer@example.com"})
+        crud.update_password_hash(self.db, self.customer.id, "otherhash")
+        self.assertIsInstance(user_cache.get_by_email("customer@example.com"), UserIdentity)
+
+    def test_bulk_delete_clears(self):
+        client.get("/user_info", params={"user_email": "customer@example.com"})
+        self.db.query(models.User).delete()
+        self.db.commit()
+        self.assertEqual(client.get("/user_info", params={"user_email": "customer@example.com"}).status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
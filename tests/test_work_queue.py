@@ -0,0 +1,120 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from setup_db import setup_database
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core import counters, work_queue
+import models as models
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+setup_database(engine)
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.db = next(override_get_db())
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        self.agent = models.User(email="agent@example.com", name="Agent", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.other_agent = models.User(email="agent2@example.com", name="Agent 2", role=models.UserRole.support_agent, password_hash="fakehash")
+        self.customer = models.User(email="customer@example.com", name="Customer", role=models.UserRole.customer, password_hash="fakehash")
+        self.db.add_all([self.agent, self.other_agent, self.customer])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.query(models.TicketResponse).delete()
+        self.db.query(models.Ticket).delete()
+        self.db.query(models.User).delete()
+        self.db.commit()
+        counters.reconcile(self.db)
+        self.db.close()
+
+    def add_ticket(self, subject, priority, hours_ago):
+        ticket = models.Ticket(user_id=self.customer.id, subject=subject, description="d", priority=priority,
+                               created_at=datetime.now() - timedelta(hours=hours_ago))
+        self.db.add(ticket)
+        self.db.commit()
+        # Added directly rather than through crud, so count it in
+        counters.reconcile(self.db)
+        return ticket
+
+    def test_order_blends_priority_and_age(self):
+        self.add_ticket("fresh high", "high", 1)
+        self.add_ticket("old low", "low", 30)
+        self.add_ticket("day-old low", "low", 20)
+        self.add_ticket("medium", "Medium", 10)
+        self.add_ticket("fresh low", "low", 0)
+        order = [ticket.subject for ticket in work_queue.peek(self.db, 10)]
+        # high is boosted 24h, medium 8h: effective ages 30, 25, 20, 18, 0
+        self.assertEqual(order, ["old low", "fresh high", "day-old low", "medium", "fresh low"])
+
+    def test_claim_assigns_in_order_until_empty(self):
+        first = self.add_ticket("first", "high", 2)
+        second = self.add_ticket("second", "low", 2)
+        claimed = client.post("/work_queue/claim", data={"email": "agent@example.com"})
+        self.assertEqual(claimed.status_code, 200)
+        self.assertEqual(claimed.json()["id"], first.id)
+        self.assertEqual(claimed.json()["assignee_id"], self.agent.id)
+        self.assertEqual(claimed.json()["status"], "in_progress")
+        self.assertEqual(client.post("/work_queue/claim", data={"email": "agent2@example.com"}).json()["id"], second.id)
+        self.assertEqual(client.post("/work_queue/claim", data={"email": "agent@example.com"}).status_code, 204)
+        mine = client.get("/work_queue/mine", params={"email_query": "agent@example.com"}).json()
+        self.assertEqual([ticket["id"] for ticket in mine], [first.id])
+        # Claims move tickets through the maintained counters like any status change
+        self.assertEqual(counters.reconcile(self.db), {})
+
+    def test_release_returns_ticket_to_its_place(self):
+        ticket = self.add_ticket("only", "medium", 1)
+        client.post("/work_queue/claim", data={"email": "agent@example.com"})
+        self.assertEqual(client.post(f"/work_queue/{ticket.id}/release", data={"email": "agent2@example.com"}).status_code, 409)
+        released = client.post(f"/work_queue/{ticket.id}/release", data={"email": "agent@example.com"})
+        self.assertEqual(released.status_code, 200)
+        self.assertIsNone(released.json()["assignee_id"])
+        self.assertEqual(released.json()["status"], "open")
+        queue = client.get("/work_queue", params={"email_query": "agent@example.com"}).json()
+        self.assertEqual([t["id"] for t in queue], [ticket.id])
+        self.assertEqual(client.post("/work_queue/claim", data={"email": "customer@example.com"}).status_code, 403)
+
+    def test_concurrent_claims_never_double_assign(self):
+        tickets = [self.add_ticket(f"t{i}", "low", i) for i in range(40)]
+        claims, errors = [], []
+
+        def agent_loop():
+            with TestingSessionLocal() as db:
+                try:
+                    while (ticket := work_queue.claim_next(db, self.agent.id)) is not None:
+                        claims.append(ticket.id)
+                except Exception as exc:
+                    errors.append(exc)
+
+        threads = [threading.Thread(target=agent_loop) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(claims), sorted(ticket.id for ticket in tickets))
+
+if __name__ == "__main__":
+    unittest.main()